@@ -0,0 +1,220 @@
+import json
+import re
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+import requests
+
+
+class HLSError(Exception):
+    pass
+
+
+@dataclass
+class Variant:
+    url: str
+    bandwidth: int
+    height: Optional[int]
+
+
+@dataclass
+class Segment:
+    index: int
+    url: str
+    init: bool = False  # an fMP4 init section (EXT-X-MAP)
+
+
+def _attributes(line: str) -> dict:
+    """Parse an attribute list such as 'BANDWIDTH=800000,RESOLUTION=854x480'."""
+    return {key: value.strip('"') for key, value in re.findall(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)', line)}
+
+
+def is_master(text: str) -> bool:
+    return "#EXT-X-STREAM-INF" in text
+
+
+def parse_master(text: str, base_url: str) -> List[Variant]:
+    variants = []
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    for i, line in enumerate(lines):
+        if line.startswith("#EXT-X-STREAM-INF") and i + 1 < len(lines):
+            attributes = _attributes(line.split(":", 1)[1])
+            resolution = attributes.get("RESOLUTION", "")
+            height = int(resolution.split("x")[1]) if "x" in resolution else None
+            variants.append(Variant(urljoin(base_url, lines[i + 1]), int(attributes.get("BANDWIDTH", 0)), height))
+    if not variants:
+        raise HLSError("Master playlist has no variants")
+    return variants
+
+
+def parse_media(text: str, base_url: str) -> List[Segment]:
+    """Segment URLs in playback order; an fMP4 init section (EXT-X-MAP) comes first."""
+    if not text.startswith("#EXTM3U"):
+        raise HLSError("Not an HLS playlist")
+
+    uris = []  # (uri, is an init section)
+    for line in (line.strip() for line in text.splitlines()):
+        if line.startswith("#EXT-X-KEY"):
+            if _attributes(line.split(":", 1)[1]).get("METHOD", "NONE") != "NONE":
+                raise HLSError("Encrypted HLS playlists are not supported")
+        elif line.startswith("#EXT-X-BYTERANGE"):
+            raise HLSError("Byte-range HLS playlists are not supported")
+        elif line.startswith("#EXT-X-MAP"):
+            uris.append((_attributes(line.split(":", 1)[1])["URI"], True))
+        elif line and not line.startswith("#"):
+            uris.append((line, False))
+
+    if not uris:
+        raise HLSError("Media playlist has no segments")
+    return [Segment(index, urljoin(base_url, uri), init) for index, (uri, init) in enumerate(uris)]
+
+
+def pick_variant(variants: List[Variant], quality: int) -> Variant:
+    """
+    The rendition matching `quality` (vertical resolution), else the best
+    one below it, else the smallest one above it.
+    """
+    known = [variant for variant in variants if variant.height]
+    if not known:
+        return max(variants, key=lambda variant: variant.bandwidth)
+    exact = [variant for variant in known if variant.height == quality]
+    if exact:
+        return max(exact, key=lambda variant: variant.bandwidth)
+    below = [variant for variant in known if variant.height < quality]
+    if below:
+        return max(below, key=lambda variant: (variant.height, variant.bandwidth))
+    return min(known, key=lambda variant: (variant.height, variant.bandwidth))
+
+
+def find_stream_pages(episode_html: str) -> List[str]:
+    """Embed URLs of the streaming servers listed on an episode page."""
+    soup = BeautifulSoup(episode_html, "html.parser")
+    pages = []
+    for a in soup.select("div.anime_muti_link a[data-video]"):
+        url = a.get("data-video")
+        if url:
+            pages.append(f"https:{url}" if url.startswith("//") else url)
+    return pages
+
+
+def find_playlists(embed_html: str) -> List[str]:
+    """Playlist URLs referenced in plain text by an embed page."""
+    return list(dict.fromkeys(re.findall(r"""https?://[^\s"'<>]+?\.m3u8[^\s"'<>]*""", embed_html)))
+
+
+class HLSDownloader:
+    """
+    Downloads an HLS stream into a single file.
+
+    Segments are fetched concurrently into `<file>.parts/` and concatenated
+    in playlist order once all of them are present. Fragmented MP4 streams
+    are saved as .mp4 and MPEG-TS streams as .ts, since plain TS segments
+    joined together are not an MP4 file. `<file>.hls.json` records
+    which segments are complete, so an interrupted download only fetches the
+    missing ones when it is run again.
+    """
+
+    def __init__(self, scheduler=None, workers: int = 8, session: Optional[requests.Session] = None):
+        self.scheduler = scheduler  # Optional HostScheduler for per-host limits
+        self.workers = workers
+        self.session = session or requests.Session()
+
+    def _get(self, url: str, kind: str) -> bytes:
+        if self.scheduler is not None:
+            with self.scheduler.open("GET", url, kind, self.session, timeout=30) as response:
+                response.raise_for_status()
+                return response.content
+        response = self.session.get(url, timeout=30)
+        response.raise_for_status()
+        return response.content
+
+    def resolve(self, playlist_url: str, quality: int):
+        """Return (media playlist url, segments, chosen height) for a master or media playlist."""
+        text = self._get(playlist_url, "scrape").decode("utf-8", "replace")
+        height = None
+        if is_master(text):
+            variant = pick_variant(parse_master(text, playlist_url), quality)
+            playlist_url, height = variant.url, variant.height
+            text = self._get(playlist_url, "scrape").decode("utf-8", "replace")
+        if "#EXT-X-ENDLIST" not in text:
+            raise HLSError("Live playlists are not supported")
+        return playlist_url, parse_media(text, playlist_url), height
+
+    def download(self, playlist_url: str, file_path, quality: int,
+                 progress: Optional[Callable[[int, int], None]] = None) -> Tuple[Path, Optional[int]]:
+        """
+        Download the stream to `file_path`, with the suffix of its container;
+        returns the file written and the chosen rendition height if known.
+        """
+        media_url, segments, height = self.resolve(playlist_url, quality)
+        fragmented = any(segment.init for segment in segments)
+        file_path = Path(file_path).with_suffix(".mp4" if fragmented else ".ts")
+
+        parts_dir = file_path.with_name(file_path.name + ".parts")
+        resume_path = file_path.with_name(file_path.name + ".hls.json")
+        parts_dir.mkdir(parents=True, exist_ok=True)
+
+        done = set()
+        if resume_path.exists():
+            state = json.loads(resume_path.read_text())
+            if state.get("playlist") == media_url and state.get("segments") == len(segments):
+                done = {index for index in state["done"] if (parts_dir / f"{index:05d}").exists()}
+
+        lock = threading.Lock()
+
+        def save_state():
+            resume_path.write_text(json.dumps({"playlist": media_url, "segments": len(segments),
+                                               "done": sorted(done)}))
+
+        def fetch(segment: Segment):
+            data = self._get(segment.url, "cdn")
+            part = parts_dir / f"{segment.index:05d}"
+            part.with_suffix(".tmp").write_bytes(data)
+            part.with_suffix(".tmp").replace(part)
+            with lock:
+                done.add(segment.index)
+                save_state()
+                if progress:
+                    progress(len(done), len(segments))
+
+        pending = [segment for segment in segments if segment.index not in done]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            # list() re-raises the first failed segment; finished ones stay in the resume map
+            list(pool.map(fetch, pending))
+
+        with open(file_path, "wb") as output:
+            for segment in segments:
+                with open(parts_dir / f"{segment.index:05d}", "rb") as part:
+                    shutil.copyfileobj(part, output)
+
+        shutil.rmtree(parts_dir)
+        resume_path.unlink()
+        return file_path, height
+
+
+def download_from_episode(episode_url: str, file_path, quality: int, scheduler=None,
+                          workers: int = 8) -> Tuple[Path, Optional[int]]:
+    """
+    Fallback for episodes whose direct download links fail: try each
+    streaming server on the episode page that exposes a plain playlist.
+    """
+    downloader = HLSDownloader(scheduler, workers, scheduler.session if scheduler is not None else None)
+    errors = []
+    for page in find_stream_pages(downloader._get(episode_url, "scrape").decode("utf-8", "replace")):
+        try:
+            playlists = find_playlists(downloader._get(page, "scrape").decode("utf-8", "replace"))
+        except requests.RequestException as e:
+            errors.append(f"{page}: {e}")
+            continue
+        for playlist in playlists:
+            try:
+                return downloader.download(playlist, file_path, quality)
+            except (HLSError, requests.RequestException) as e:
+                errors.append(f"{playlist}: {e}")
+    raise HLSError("No usable HLS source found" + (": " + "; ".join(errors) if errors else ""))
@@ -1,116 +1,547 @@
-import requests
 from colorama import Fore, Style, init
 from typing import List, Dict
 import json
 import os
-from bs4 import BeautifulSoup
 import re
+import sys
 import threading
-import queue
+import time
 from pathlib import Path
-
-f = open("../CommandLineUI/setup.json", "r")
-setup = json.load(f)
-f.close()
-base_url = setup["gogoanime_main"]
-download_folder = setup["downloads"]
-print(download_folder)
-captcha_v3 = setup["captcha_v3"]
-download_quality = int(setup["download_quality"])
-max_threads = setup["max_threads"]
-init(autoreset=True)  # Initialize colorama
-
-
-def download(links, folder):
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the shared core package
+from core.links import LinkExpired, check_expired, link_is_stale
+from core.politeness import HostScheduler, host_policies
+from core.config import load_config
+from core.sources import (ParsePool, SlowSource, ThroughputMonitor, parse_download_page, parse_episode_page,
+                          rank_sources)
+from core.metrics import (ACTIVE_WORKERS, BYTES_DOWNLOADED, CACHE_REQUESTS, DOWNLOAD_THROUGHPUT, DOWNLOADS,
+                          QUEUE_DEPTH, RESOLVE_SECONDS, RETRIES, MetricsServer)
+from core.manifest import COMPLETE, CORRUPT, PARTIAL, get_manifest
+from core.preflight import BatchProgress, DiskAdmission, check_space, format_size
+from planner import QUALITY_RATIOS, fill_sizes, plan_qualities
+from core.scheduler import PriorityTaskQueue, WATCH_NEXT_PRIORITY, probe_size, probe_sizes
+from core.tracing import TRACER, span
+
+SETUP_PATH = "../CommandLineUI/setup.json"
+# Everything below is set by configure(): importing this module, as the spawned parser processes
+# and the benchmarks do, reads no settings and starts nothing
+setup = polite = disk = parsers = fault_plan = cassette = None
+
+
+def configure(path: str = SETUP_PATH):
+    """Read setup.json and build the per-host scheduler, parsers, fault plan, cassette and tracer."""
+    global setup, base_url, download_folder, captcha_v3, download_quality, max_threads, queue_policy, fault_plan
+    global cassette, polite, hls_fallback, hls_segment_workers, link_max_age, max_link_refreshes, max_retries
+    global min_quality, max_quality, min_speed, source_error_limit, disk_budget_mb, target_minutes, bandwidth_kbps
+    global episode_size_estimate, disk, parsers, metrics_port, trace_file
+    setup = load_config(path)
+    base_url = setup.base_url
+    download_folder = setup.download_folder
+    captcha_v3 = setup["captcha_v3"]
+    download_quality = setup.download_quality
+    max_threads = setup.max_threads
+    queue_policy = setup.get("queue_policy", "fifo")  # "fifo" or "sjf" (shortest job first)
+    fault_plan = cassette = transport = None
+    if setup.get("fault_plan"):  # for resilience testing
+        from core.faults import faulty_session, load_fault_plan
+        fault_plan = load_fault_plan(setup["fault_plan"])
+        transport = faulty_session(fault_plan)
+    # Recorded scraping traffic for offline profiling; cassette_mode is "once", "record" or "replay"
+    if setup.get("cassette"):
+        from core.cassettes import cassette_session, load_cassette
+        cassette = load_cassette(setup["cassette"], setup.get("cassette_mode", "once"))
+        transport = cassette_session(cassette, transport)
+    polite = HostScheduler(host_policies(setup), session=transport)
+    hls_fallback = setup.get("hls_fallback", True)  # use streaming servers when direct links fail
+    hls_segment_workers = setup.get("hls_segment_workers", 8)
+    link_max_age = setup.link_max_age  # seconds before an unsigned CDN link is resolved again
+    max_link_refreshes = setup.max_link_refreshes
+    max_retries = setup.get("max_retries", 3)
+    min_quality = setup.min_quality  # bounds for falling back to other qualities
+    max_quality = setup.max_quality
+    min_speed = setup.min_speed  # switch sources below this speed, 0 to never switch
+    source_error_limit = setup.source_error_limit
+    disk_budget_mb = setup.get("disk_budget_mb")  # plan qualities so a batch fits this size
+    target_minutes = setup.get("target_minutes")  # ...or finishes in this time at bandwidth_kbps
+    bandwidth_kbps = setup.get("bandwidth_kbps")
+    episode_size_estimate = setup.get("episode_size_mb", 300) * 1024 * 1024  # for episodes not probed yet
+    disk = DiskAdmission(setup.get("disk_margin_mb", 512) * 1024 * 1024)
+    # Page parsing holds the GIL; "process" keeps it off the threads streaming episodes ("thread" or "off")
+    parsers = ParsePool(setup.get("parse_mode", "process"), setup.get("parse_workers", 2))
+    metrics_port = setup.get("metrics_port")  # serve /metrics and /metrics.json on this port, off when unset
+    trace_file = setup.get("trace_file")  # write a Chrome/Perfetto trace of every download here, off when unset
+    if trace_file:
+        TRACER.enable()
+
+
+def download(links, folder, watch_next=None, batch=None, interactive=False):
     if not os.path.exists(folder):
         os.makedirs(folder)
-    task_queue = queue.Queue()
+    if batch is None:
+        batch = preflight({folder: links})
+    task_queue = PriorityTaskQueue(queue_policy)
+    QUEUE_DEPTH.set_function(task_queue.qsize)
+    for item in links:
+        if watch_next and item["episode"] in watch_next:
+            item["priority"] = WATCH_NEXT_PRIORITY
+        if TRACER.enabled:
+            item["queued_at"] = TRACER.now()
+        task_queue.put(item)
     threads = []
     for i in range(max_threads):
-        t = threading.Thread(target=threaded_download, args=(task_queue, folder))
+        t = threading.Thread(target=threaded_download, args=(task_queue, folder, batch))
         t.start()
         threads.append(t)
-    for item in links:
-        task_queue.put(item)
+    if queue_policy == "sjf":
+        threading.Thread(target=probe_queue_sizes, args=(task_queue, links), daemon=True).start()
+    if interactive:
+        read_watch_next(task_queue)
     task_queue.join()
     for i in range(max_threads):
         task_queue.put(None)
     for t in threads:
         t.join()
+    TRACER.save(trace_file)  # rewritten after every batch so it can be opened while the app runs
+
+
+def read_watch_next(task_queue):
+    """
+    Read episode numbers while the queue drains and move them to the front,
+    so the "watch next" episodes can change without queueing anything again.
+    Returns once every episode is done and Enter was pressed.
+    """
+    done = threading.Event()
+
+    def wait():
+        task_queue.join()
+        done.set()
+        print(f"{Fore.GREEN}All episodes are done, press Enter to continue{Style.RESET_ALL}")
+
+    threading.Thread(target=wait, daemon=True).start()
+    print(f"{Fore.MAGENTA}Type episode numbers and Enter at any time to download them next (e.g. 7 8){Style.RESET_ALL}")
+    while not done.is_set():
+        try:
+            numbers = input().split()
+        except EOFError:
+            return
+        if numbers and not done.is_set():
+            moved = task_queue.promote(lambda item: item["episode"] in numbers)
+            print(f"{Fore.CYAN}Moved {moved} queued episode{'s' if moved != 1 else ''} to the front{Style.RESET_ALL}")
+
+
+def probe_queue_sizes(task_queue, links):
+    """
+    Resolve queued episodes and HEAD their files so the queue can run shortest
+    first. Episodes a worker has taken are skipped, and results are attached
+    under the queue lock only while the episode is still queued, so a worker
+    never sees its item change.
+    """
+    def probe(item):
+        if not task_queue.queued(lambda queued: queued is item):
+            return
+        changes = {}
+        try:
+            resolved = item.get("resolved")  # a quality plan may have resolved it already
+            if resolved is None:
+                resolved = resolve_sources(item["url"], item.get("title"), item.get("quality_cap"))
+                changes.update(resolved=resolved, resolved_at=time.time())
+            size = probe_size(resolved[0][0].url, polite)
+        except Exception:
+            return
+        if size:
+            changes["size"] = size
+        if changes:
+            task_queue.update(lambda queued: queued is item, **changes)
+
+    with ThreadPoolExecutor(max_workers=max_threads) as pool:
+        list(pool.map(probe, links))
+
+
+def resolve(item):
+    """
+    The episode's ranked sources and title, resolved just before its download
+    starts. Sources resolved earlier (by the size probe) are reused only while fresh.
+    """
+    resolved = item.pop("resolved", None)
+    if resolved and not link_is_stale(resolved[0][0].url, item.pop("resolved_at", 0), link_max_age):
+        CACHE_REQUESTS.inc(cache="resolved_links", result="hit")
+        TRACER.instant("resolve_cached", task=item["url"])
+        return resolved
+    CACHE_REQUESTS.inc(cache="resolved_links", result="miss")
+    with span("resolve", task=item["url"]):
+        return resolve_sources(item["url"], item.get("title"), item.get("quality_cap"))
 
 
-def threaded_download(task_queue, folder):
+def preflight(folders) -> BatchProgress:
+    """
+    Check that every target drive can hold the episodes queued for it
+    (folder -> episode items). Sizes come from earlier probes or plans, or
+    episode_size_mb. A shortfall is only a warning: downloads wait for space
+    at run time instead of failing halfway.
+    """
+    # Episodes the folder's manifest already has complete are not counted
+    folders = {folder: [item for item in links if get_manifest(folder).check(item["url"])[0] != COMPLETE]
+               for folder, links in folders.items()}
+    sizes = {folder: sum(item.get("size") or episode_size_estimate for item in links)
+             for folder, links in folders.items()}
+    jobs = sum(len(links) for links in folders.values())
+    print(f"{Fore.CYAN}Pre-flight: ~{format_size(sum(sizes.values()))} for {jobs} episodes.{Style.RESET_ALL}")
+    for folder, needed, free in check_space(sizes, disk.margin):
+        print(f"{Fore.RED}{folder} needs ~{format_size(needed)} but its drive only has {format_size(free)} free; "
+              f"downloads will wait for space.{Style.RESET_ALL}")
+
+    batch = BatchProgress(jobs, episode_size_estimate)
+    for links in folders.values():
+        for item in links:
+            if item.get("size"):
+                batch.expect(item["url"], item["size"])
+    return batch
+
+
+def threaded_download(task_queue, folder, batch):
     while True:
         item = task_queue.get()
         if item is None:
             break
 
+        if "queued_at" in item:
+            TRACER.complete("queue_wait", item.pop("queued_at"), TRACER.now(),
+                            task=item["url"], episode=item["episode"])
+        ACTIVE_WORKERS.inc()
         try:
-            episode = item["episode"]
-            download = download_link(item["url"])
-            url = download[0]
-            title = download[1]
-            file_path = Path(folder) / title
-            file_path = file_path.with_suffix('.mp4')
+            with span("episode", task=item["url"], episode=item["episode"], attempt=item.get("attempts", 0)):
+                episode = item["episode"]
+                manifest = get_manifest(folder)
+                with span("manifest_check"):
+                    state, entry = manifest.check(item["url"])
+                CACHE_REQUESTS.inc(cache="manifest", result="hit" if state == COMPLETE else "miss")
+                if state == COMPLETE:
+                    print(f"{Fore.GREEN}Episode {episode} is already downloaded: {entry['file']}{Style.RESET_ALL}")
+                    DOWNLOADS.inc(result="skipped")
+                    continue
+                if state == PARTIAL and "file_path" not in item:
+                    print(f"{Fore.YELLOW}Resuming episode {episode} from {entry['file']}{Style.RESET_ALL}")
+                    item["file_path"] = Path(folder) / entry["file"]
+                    item["quality"] = entry["quality"]
+                elif state == CORRUPT:
+                    print(f"{Fore.RED}{entry['file']} does not match its recorded digest, downloading it again{Style.RESET_ALL}")
+                    (Path(folder) / entry["file"]).unlink(missing_ok=True)
+                    manifest.forget(item["url"])
+
+                try:
+                    sources, title = resolve(item)
+                except Exception as e:
+                    if not hls_fallback:
+                        raise
+                    print(f"{Fore.YELLOW}Direct links failed for episode {episode} ({e}), trying streaming servers...{Style.RESET_ALL}")
+                    hls_download(item, folder, manifest, batch, item.get("title"))
+                    continue
+
+                if item.get("quality") is not None:
+                    # Keep resuming the quality already on disk if it is still offered
+                    sources = sorted(sources, key=lambda source: source.quality != item["quality"])
+                known_size = item.get("size")
+                if not known_size:
+                    with span("probe_size", cat="network"):
+                        known_size = probe_size(sources[0].url, polite)
+
+                # A retried or resumed episode keeps its file so the download can resume
+                file_path = item.get("file_path")
+                if file_path is None:
+                    file_path = Path(folder) / title
+                    file_path = file_path.with_suffix('.mp4')
+
+                    # Create all parent directories if they don't exist
+                    file_path.parent.mkdir(parents=True, exist_ok=True)
+
+                    if file_path.exists():
+                        # Copied into the folder or downloaded before it had a manifest
+                        with span("hash", cat="disk"):
+                            adopted = known_size and manifest.adopt(item["url"], str(file_path), known_size,
+                                                                    sources[0].quality)
+                        if adopted:
+                            print(f"{Fore.GREEN}Episode {episode} is already downloaded: {file_path}{Style.RESET_ALL}")
+                            DOWNLOADS.inc(result="skipped")
+                            continue
+                        print(f"File already exists, going to override current data: {file_path}")
+                        file_path.unlink()
+
+                    file_path.touch()
+                    print(f"Created new file: {title}.mp4")
+                    item["file_path"] = file_path
+
+                size = known_size or episode_size_estimate
+                batch.expect(item["url"], size)
+                # Waits here while the drive is short on space
+                with span("disk_wait", cat="disk"):
+                    reservation = disk.reserve(folder, max(size - file_path.stat().st_size, 0))
+
+                def on_chunk(written):
+                    reservation.consume(written)
+                    batch.add(written)
+                    if written > 0:
+                        BYTES_DOWNLOADED.inc(written)
+
+                started = time.monotonic()
+                try:
+                    print(f"{Fore.WHITE}Started downloading {title}, episode {episode} to {file_path}.{Style.RESET_ALL}")
+                    source = download_sources(
+                        item, sources, file_path, on_chunk,
+                        lambda source: manifest.started(item["url"], str(file_path), source.quality,
+                                                        known_size if source is sources[0] else None))
+                except Exception as e:
+                    if not hls_fallback:
+                        raise
+                    print(f"{Fore.YELLOW}Direct links failed for episode {episode} ({e}), trying streaming servers...{Style.RESET_ALL}")
+                    # The stream replaces the partial direct download
+                    on_chunk(-file_path.stat().st_size)
+                    file_path.unlink()
+                    manifest.forget(item["url"])
+                    del item["file_path"]
+                    hls_download(item, folder, manifest, batch, title)
+                    continue
+                finally:
+                    reservation.release()
+
+                if file_path.stat().st_size == 0:
+                    raise Exception("Downloaded file is empty")
+                with span("hash", cat="disk"):
+                    manifest.completed(item["url"], str(file_path), source.quality)
+                DOWNLOADS.inc(result="completed")
+                DOWNLOAD_THROUGHPUT.observe(file_path.stat().st_size / max(time.monotonic() - started, 1e-3))
+                batch.expect(item["url"], file_path.stat().st_size)
+                print(f"{Fore.GREEN}Finished downloading {title}, episode {episode} in {source.quality}p to {file_path}. "
+                      f"Batch: {batch.summary()}{Style.RESET_ALL}")
+
+        except Exception as e:
+            RETRIES.inc(error=type(e).__name__)
+            item["attempts"] = item.get("attempts", 0) + 1
+            if item["attempts"] > max_retries:
+                DOWNLOADS.inc(result="failed")
+                print(f"{Fore.RED}Giving up on {item.get('url', 'unknown URL')} after {max_retries} retries: {str(e)}{Style.RESET_ALL}")
+            else:
+                print(f"{Fore.RED}Error downloading {item.get('url', 'unknown URL')}: {str(e)}, retrying... {Style.RESET_ALL}")
+                if TRACER.enabled:
+                    item["queued_at"] = TRACER.now()
+                task_queue.put(item)  # Retry the failed download
+
+        finally:
+            ACTIVE_WORKERS.dec()
+            task_queue.task_done()
 
-            # Create all parent directories if they don't exist
-            file_path.parent.mkdir(parents=True, exist_ok=True)
 
-            if file_path.exists():
-                print(f"File already exists, going to override current data: {file_path}")
-                file_path.unlink()
+def download_sources(item, sources, file_path, on_chunk=None, on_source=None):
+    """
+    Try the ranked sources in order and return the one that was saved.
 
-            file_path.touch()
-            print(f"Created new file: {title}.mp4")
+    A source is abandoned for the next one when it stays below min_speed or
+    fails source_error_limit times in a row. Expired links are resolved
+    again without giving up the source. `on_source` is called with each
+    source before its first attempt.
+    """
+    errors = []
+    for index, source in enumerate(sources):
+        if item.get("quality") != source.quality:
+            if on_chunk and file_path.stat().st_size:
+                on_chunk(-file_path.stat().st_size)
+            file_path.write_bytes(b"")  # The partial file belongs to another quality
+            item["quality"] = source.quality
+        if on_source:
+            on_source(source)
+        failures = refreshes = 0
+        while True:
+            try:
+                fetch_to_file(source.url, file_path, ThroughputMonitor(min_speed), on_chunk)
+                return source
+            except LinkExpired:
+                RETRIES.inc(error="LinkExpired")
+                if refreshes == max_link_refreshes:
+                    errors.append(f"{source.quality}p: link kept expiring")
+                    break
+                refreshes += 1
+                print(f"{Fore.YELLOW}Link for episode {item['episode']} expired, resolving it again...{Style.RESET_ALL}")
+                try:
+                    fresh = resolve_sources(item["url"], item.get("title"), item.get("quality_cap"))[0]
+                except Exception as e:
+                    errors.append(f"{source.quality}p: {e}")
+                    break
+                fresh = [s for s in fresh if s.quality == source.quality]
+                if not fresh:
+                    errors.append(f"{source.quality}p: no longer offered")
+                    break
+                source = fresh[0]
+            except SlowSource as e:
+                RETRIES.inc(error="SlowSource")
+                errors.append(f"{source.quality}p: {e}")
+                break
+            except Exception as e:
+                RETRIES.inc(error=type(e).__name__)
+                failures += 1
+                if failures >= source_error_limit:
+                    errors.append(f"{source.quality}p: {e}")
+                    break
+        if index + 1 < len(sources):
+            print(f"{Fore.YELLOW}Switching episode {item['episode']} away from {errors[-1]}{Style.RESET_ALL}")
+    raise Exception("No usable source: " + "; ".join(errors))
 
-            r = requests.get(url, stream=True)
-            print(f"{Fore.WHITE}Started downloading {title}, episode {episode} to {file_path}.{Style.RESET_ALL}")
 
-            with open(file_path, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=512 * 512):
-                    if chunk:
+def fetch_to_file(url, file_path, monitor=None, on_chunk=None):
+    """
+    Download `url` into `file_path`, continuing from the bytes already in
+    the file when the server honours Range requests. `on_chunk` is called
+    with the size of every chunk written.
+    """
+    offset = file_path.stat().st_size if file_path.exists() else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    with span("transfer", cat="network", offset=offset) as transfer, \
+            polite.open("GET", url, "cdn", stream=True, headers=headers, timeout=30) as r:
+        check_expired(r.status_code, url)
+        if r.status_code == 416:
+            return  # The file was already complete
+        r.raise_for_status()
+        if r.status_code != 206:
+            offset = 0  # Range ignored, start over
+
+        downloaded = 0
+        timed = TRACER.enabled  # disk time is only measured for the trace
+        write_time = 0.0
+        with open(file_path, 'ab' if offset else 'wb') as f:
+            for chunk in r.iter_content(chunk_size=512 * 512):
+                if chunk:
+                    if timed:
+                        write_started = time.perf_counter()
+                        f.write(chunk)
+                        write_time += time.perf_counter() - write_started
+                    else:
                         f.write(chunk)
+                    downloaded += len(chunk)
+                    if on_chunk:
+                        on_chunk(len(chunk))
+                    if monitor:
+                        monitor.update(downloaded)
+        transfer.set(bytes=downloaded, status=r.status_code, disk_write_ms=round(write_time * 1000, 1))
 
-            if file_path.stat().st_size == 0:
-                print(f"{Fore.RED}Something went wrong while downloading {title}, retrying... {Style.RESET_ALL}")
-                task_queue.put(item)
-            else:
-                print(f"{Fore.GREEN}Finished downloading {title}, episode {episode} to {file_path}.{Style.RESET_ALL}")
 
-        except Exception as e:
-            print(f"{Fore.RED}Error downloading {item.get('url', 'unknown URL')}: {str(e)}{Style.RESET_ALL}")
-            task_queue.put(item)  # Retry the failed download
+def plan_budget():
+    """Byte budget from disk_budget_mb and/or target_minutes, or None when neither is set."""
+    budgets = []
+    if disk_budget_mb:
+        budgets.append(disk_budget_mb * 1024 * 1024)
+    if target_minutes and bandwidth_kbps:
+        budgets.append(target_minutes * 60 * bandwidth_kbps * 1024)
+    return min(budgets) if budgets else None
 
-        finally:
-            task_queue.task_done()
 
+def plan_download(links, budget) -> bool:
+    """
+    Pick a quality per episode so the batch fits `budget` bytes.
+
+    Every episode is resolved and each of its sources probed with a HEAD
+    request; sizes the CDN does not report are estimated from the other
+    qualities. The plan is shown before anything is downloaded and each
+    episode is capped at its planned quality. Returns False if declined.
+    """
+    print(f"{Fore.CYAN}Planning qualities for {len(links)} episodes...{Style.RESET_ALL}")
+
+    def resolve_item(item):
+        try:
+            return resolve_sources(item["url"], item.get("title"))
+        except Exception:
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_threads) as pool:
+        resolved = list(pool.map(resolve_item, links))
+    sizes = probe_sizes([source.url for result in resolved if result for source in result[0]], max_threads * 2, polite)
+
+    # The preferred quality is the ceiling; the budget only ever lowers it
+    probed = [{source.quality: sizes.get(source.url)
+               for source in [s for s in result[0] if s.quality <= download_quality] or result[0]}
+              if result else {} for result in resolved]
+    plan = plan_qualities(fill_sizes(probed), budget)
+
+    total = 0
+    for item, result, option in zip(links, resolved, plan):
+        if option is None:
+            print(f"{Fore.YELLOW}Episode {item['episode']}: {Fore.RED}size unknown, "
+                  f"will use {download_quality}p{Style.RESET_ALL}")
+            continue
+        total += option.size
+        item["quality_cap"] = option.quality
+        item["size"] = option.size
+        item["resolved"] = (rank_sources(result[0], option.quality, min_quality, option.quality), result[1])
+        item["resolved_at"] = time.time()
+        marker = "~" if option.estimated else ""
+        print(f"{Fore.YELLOW}Episode {item['episode']}: {Fore.BLUE}{option.quality}p "
+              f"{marker}{option.size / 1024 / 1024:.1f} MB{Style.RESET_ALL}")
+
+    colour = Fore.GREEN if total <= budget else Fore.RED
+    print(f"{colour}Planned total: {total / 1024 / 1024:.1f} MB of a {budget / 1024 / 1024:.1f} MB budget "
+          f"(~ estimated){Style.RESET_ALL}")
+    return input(f"{Fore.CYAN}Start download? (y/n): {Style.RESET_ALL}").strip().lower() != "n"
+
+
+def hls_download(item, folder, manifest, batch, title=None):
+    """
+    Download an episode from a streaming server's playlist after its direct
+    links failed, and record it in the manifest and metrics like any other
+    download. The file is named after the episode title (or the page URL)
+    and gets the suffix of the stream's container.
+    """
+    title = title or clean_filename(item["url"].rstrip("/").split("/")[-1])
+    file_path = (Path(folder) / title).with_suffix('.mp4')
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+
+    print(f"{Fore.WHITE}Started streaming download of {title}, episode {item['episode']}.{Style.RESET_ALL}")
+    from hls import download_from_episode  # only needed when direct links fail
+    started = time.monotonic()
+    with span("hls", task=item["url"], cat="network"):
+        file_path, height = download_from_episode(item["url"], file_path, download_quality, polite,
+                                                  hls_segment_workers)
+    size = file_path.stat().st_size
+    if size == 0:
+        raise Exception("Downloaded file is empty")
+    with span("hash", cat="disk"):
+        manifest.completed(item["url"], str(file_path), height)
+    DOWNLOADS.inc(result="completed")
+    BYTES_DOWNLOADED.inc(size)
+    DOWNLOAD_THROUGHPUT.observe(size / max(time.monotonic() - started, 1e-3))
+    batch.expect(item["url"], size)
+    batch.add(size)
+    quality = f" in {height}p" if height else ""
+    print(f"{Fore.GREEN}Finished downloading {title}{quality} to {file_path}. Batch: {batch.summary()}{Style.RESET_ALL}")
+
+
+def resolve_sources(link, title=None, quality_cap=None):
+    """
+    Resolve an episode page to (ranked sources, title) in two requests.
 
-def download_link(link):
-    soup = BeautifulSoup(requests.get(link).text, "html.parser")
-    base_download_url = BeautifulSoup(str(soup.find("li", {"class": "dowloads"})), "html.parser").a.get("href")  #typo in the webcode?
+    The title comes from the captcha response that also carries the links,
+    falling back to the title from the episode list and then the episode page.
+    `quality_cap` (from a quality plan) replaces the preferred quality and
+    keeps fallbacks at or below it.
+    """
+    with RESOLVE_SECONDS.time(stage="episode_page"), span("episode_page", cat="resolve"):
+        page = polite.get_text(link)
+    with span("parse", cat="resolve"):
+        base_download_url, page_title = parsers.run(parse_episode_page, page)
     id = base_download_url[base_download_url.find("id=") + 3:base_download_url.find("&typesub")]
     base_download_url = base_download_url[:base_download_url.find("id=")]
-    title = BeautifulSoup(requests.post(f"{base_download_url}&id={id}").text, "html.parser")
-    title = clean_filename(title.find("span", {"id": "title"}).text)
-    response = requests.post(f"{base_download_url}&id={id}&captcha_v3={captcha_v3}")  #will this captcha work for long?
-    soup = BeautifulSoup(response.text, "html.parser")
-    backup_link = []
-    for i in soup.find_all("div", {"class": "dowload"}):
-        if str(BeautifulSoup(str(i), "html.parser").a).__contains__('download=""'):
-            link = (BeautifulSoup(str(i), "html.parser").a.get("href"))
-            quality = BeautifulSoup(str(i), "html.parser").a.string.replace(" ", "").replace("Download", "")
-            try:
-                quality = int(quality[2:quality.find("P")])
-            except ValueError:
-                print("Failed to parse quality information. Using default quality.")
-                quality = 0
-            if quality == download_quality:
-                print(f"Downloading in {quality}p")
-                return [link, title]
-            backup_link = [link, quality]
-    print(f"Downloading in {backup_link[1]}p")
-    return [backup_link[0],
-            title]  #if the prefered download quality is not available the highest quality will automaticly be chosen
+    with RESOLVE_SECONDS.time(stage="captcha_post"), span("captcha_post", cat="resolve"):
+        response = polite.post_text(f"{base_download_url}&id={id}&captcha_v3={captcha_v3}")  #will this captcha work for long?
+    with span("parse", cat="resolve"):
+        links, links_title = parsers.run(parse_download_page, response)
+    title = clean_title(links_title) or title or clean_title(page_title)
+    if quality_cap:
+        sources = rank_sources(links, quality_cap, min_quality, quality_cap)
+    else:
+        sources = rank_sources(links, download_quality, min_quality, max_quality)
+    if not sources:
+        raise Exception(f"No download links between {min_quality or 0}p and {max_quality or 'any'}p")
+    return sources, title
+
+
+def clean_title(title):
+    return clean_filename(title) if title else None
 
 
 def clean_filename(filename):
@@ -119,14 +550,8 @@ def clean_filename(filename):
 
 
 def estimate_chunks(size, quality):
-    if quality == 360:
-        return (size * 0.162).__round__()
-    elif quality == 480:
-        return (size * 0.244).__round__()
-    elif quality == 720:
-        return (size * 0.526).__round__()
-    elif quality == 1080:
-        return size
+    if quality in QUALITY_RATIOS:
+        return (size * QUALITY_RATIOS[quality]).__round__()
 
 
 def get_names(response):
@@ -146,16 +571,20 @@ def search() -> List[Dict[str, str]]:
     Returns:
         List[Dict[str, str]]: List of dictionaries containing episode information and download links.
     """
+    from bs4 import BeautifulSoup
+
     while True:
         name = input(f"\n{Fore.YELLOW}Anime name: {Style.RESET_ALL}")
-        response = BeautifulSoup(requests.get(f"{base_url}/search.html?keyword={name}").text, "html.parser")
+        with span("search", keyword=name) as search_span:
+            response = BeautifulSoup(polite.get_text(f"{base_url}/search.html?keyword={name}"), "html.parser")
 
-        try:
-            pages = response.find("ul", {"class": "pagination-list"}).find_all("li")
-            animes = [anime for page in pages for anime in get_names(
-                BeautifulSoup(requests.get(f"{base_url}/search.html{page.a.get('href')}").text, "html.parser"))]
-        except AttributeError:
-            animes = get_names(response)
+            try:
+                pages = response.find("ul", {"class": "pagination-list"}).find_all("li")
+                animes = [anime for page in pages for anime in get_names(
+                    BeautifulSoup(polite.get_text(f"{base_url}/search.html{page.a.get('href')}"), "html.parser"))]
+                search_span.set(pages=len(pages))
+            except AttributeError:
+                animes = get_names(response)
 
         if not animes:
             print(f"{Fore.RED}No results found. Try again.{Style.RESET_ALL}")
@@ -187,23 +616,28 @@ def create_links(anime: tuple) -> List[Dict[str, str]]:
     Returns:
         List[Dict[str, str]]: List of dictionaries containing episode information and download links.
     """
-    response = BeautifulSoup(requests.get(f"{base_url}{anime[1]}").text, "html.parser")
+    from bs4 import BeautifulSoup
+
+    with span("create_links", anime=anime[1]) as links_span:
+        response = BeautifulSoup(polite.get_text(f"{base_url}{anime[1]}"), "html.parser")
 
-    base_url_cdn_api = re.search(r"base_url_cdn_api\s*=\s*'([^']*)'", str(response.find("script", {"src": ""}))).group(1)
-    movie_id = response.find("input", {"id": "movie_id"}).get("value")
-    last_ep = response.find("ul", {"id": "episode_page"}).find_all("a")[-1].get("ep_end")
+        base_url_cdn_api = re.search(r"base_url_cdn_api\s*=\s*'([^']*)'", str(response.find("script", {"src": ""}))).group(1)
+        movie_id = response.find("input", {"id": "movie_id"}).get("value")
+        last_ep = response.find("ul", {"id": "episode_page"}).find_all("a")[-1].get("ep_end")
 
-    episodes_response = BeautifulSoup(
-        requests.get(f"{base_url_cdn_api}ajax/load-list-episode?ep_start=0&ep_end={last_ep}&id={movie_id}").text,
-        "html.parser").find_all("a")
+        episodes_response = BeautifulSoup(
+            polite.get_text(f"{base_url_cdn_api}ajax/load-list-episode?ep_start=0&ep_end={last_ep}&id={movie_id}"),
+            "html.parser").find_all("a")
 
-    episodes = [
-        {
-            "episode": re.search(r"</span>(.*?)</div", str(ep.find("div"))).group(1),
-            "url": f'{base_url}{ep.get("href").replace(" ", "")}'
-        }
-        for ep in reversed(episodes_response)
-    ]
+        episodes = []
+        for ep in reversed(episodes_response):
+            number = re.search(r"</span>(.*?)</div", str(ep.find("div"))).group(1).strip()
+            episodes.append({
+                "episode": number,
+                "url": f'{base_url}{ep.get("href").replace(" ", "")}',
+                "title": clean_filename(f"{anime[0]} Episode {number}")  # used when the download page has no title
+            })
+        links_span.set(episodes=len(episodes))
 
     print(f"{Fore.GREEN}Found {Fore.YELLOW}{len(episodes)}{Fore.GREEN} episodes.{Style.RESET_ALL}")
 
@@ -331,6 +765,16 @@ def batch_download_manager():
 
 
 def start_batch_download(batch_list: List[Dict]):
+    budget = plan_budget()
+    # One plan for the whole batch so the budget covers every anime
+    if budget and not plan_download([episode for item in batch_list for episode in item['anime']], budget):
+        return
+
+    folders = {}
+    for item in batch_list:
+        folders.setdefault(item['save_folder'], []).extend(item['anime'])
+    batch = preflight(folders)
+
     for item in batch_list:
         anime_info = item['anime']
         save_folder = item['save_folder']
@@ -338,15 +782,19 @@ def start_batch_download(batch_list: List[Dict]):
         print(
             f"\n{Fore.GREEN}Starting download for {Fore.YELLOW}{anime_info[0]['url'].split('/')[-1]}{Style.RESET_ALL}")
 
-        download(anime_info, save_folder)
+        download(anime_info, save_folder, batch=batch)
 
     print(f"\n{Fore.GREEN}Batch download completed!{Style.RESET_ALL}")
 
 
 def save_batch_list(batch_list: List[Dict]):
     filename = input(f"{Fore.CYAN}Enter filename to save batch list: {Style.RESET_ALL}")
+    # Only the episode list is saved, not state added while downloading
+    saved = [{"anime": [{key: episode[key] for key in ("episode", "url", "title") if key in episode}
+                        for episode in item['anime']],
+              "save_folder": item['save_folder']} for item in batch_list]
     with open(filename, 'w') as f:
-        json.dump(batch_list, f)
+        json.dump(saved, f)
     print(f"{Fore.GREEN}Batch list saved to {filename}{Style.RESET_ALL}")
 
 
@@ -363,27 +811,39 @@ def load_batch_list() -> List[Dict]:
 
 
 def main():
+    init(autoreset=True)  # Initialize colorama
+    configure()
     print(f"{Fore.GREEN}Welcome to the Anime Downloader!{Style.RESET_ALL}")
+    if metrics_port:
+        print(f"{Fore.CYAN}Metrics: {MetricsServer(port=metrics_port).url}{Style.RESET_ALL}")
 
-    while True:
-        print(f"\n{Fore.GREEN}Main Menu{Style.RESET_ALL}")
-        print(f"{Fore.YELLOW}1: {Fore.BLUE}Download a single anime{Style.RESET_ALL}")
-        print(f"{Fore.YELLOW}2: {Fore.BLUE}Batch Download Manager{Style.RESET_ALL}")
-        print(f"{Fore.YELLOW}3: {Fore.BLUE}Exit{Style.RESET_ALL}")
-
-        choice = input(f"{Fore.MAGENTA}Enter your choice: {Style.RESET_ALL}")
-
-        if choice == '1':
-            links = search()
-            save_folder = input(f"{Fore.MAGENTA}Enter save folder for this anime: {Style.RESET_ALL}")
-            download(links, save_folder)
-        elif choice == '2':
-            batch_download_manager()
-        elif choice == '3':
-            print(f"{Fore.GREEN}Thank you for using the Anime Downloader. Goodbye!{Style.RESET_ALL}")
-            break
-        else:
-            print(f"{Fore.RED}Invalid choice. Please try again.{Style.RESET_ALL}")
+    try:
+        while True:
+            print(f"\n{Fore.GREEN}Main Menu{Style.RESET_ALL}")
+            print(f"{Fore.YELLOW}1: {Fore.BLUE}Download a single anime{Style.RESET_ALL}")
+            print(f"{Fore.YELLOW}2: {Fore.BLUE}Batch Download Manager{Style.RESET_ALL}")
+            print(f"{Fore.YELLOW}3: {Fore.BLUE}Exit{Style.RESET_ALL}")
+
+            choice = input(f"{Fore.MAGENTA}Enter your choice: {Style.RESET_ALL}")
+
+            if choice == '1':
+                links = search()
+                save_folder = input(f"{Fore.MAGENTA}Enter save folder for this anime: {Style.RESET_ALL}")
+                watch_next = input(
+                    f"{Fore.MAGENTA}Episodes to download first (optional, e.g. 3 4): {Style.RESET_ALL}").split()
+                budget = plan_budget()
+                if budget and not plan_download(links, budget):
+                    continue
+                download(links, save_folder, watch_next, interactive=True)
+            elif choice == '2':
+                batch_download_manager()
+            elif choice == '3':
+                print(f"{Fore.GREEN}Thank you for using the Anime Downloader. Goodbye!{Style.RESET_ALL}")
+                break
+            else:
+                print(f"{Fore.RED}Invalid choice. Please try again.{Style.RESET_ALL}")
+    finally:
+        TRACER.save(trace_file)  # the last batch's spans, also when the menu is left with Ctrl+C
 
 
 if __name__ == "__main__":
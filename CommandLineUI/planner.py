@@ -0,0 +1,72 @@
+from dataclasses import dataclass
+from statistics import median
+from typing import Dict, List, Optional
+
+# Typical file size of each quality relative to 1080p
+QUALITY_RATIOS = {360: 0.162, 480: 0.244, 720: 0.526, 1080: 1.0}
+
+
+@dataclass
+class Option:
+    quality: int
+    size: int
+    estimated: bool  # size derived from QUALITY_RATIOS rather than a HEAD request
+
+
+def fill_sizes(probed: List[Dict[int, Optional[int]]]) -> List[List[Option]]:
+    """
+    Complete the probed quality -> size maps of a batch, lowest quality first.
+
+    A missing size is scaled from another quality of the same episode using
+    QUALITY_RATIOS; an episode without any known size borrows the median of
+    the other episodes. Qualities that cannot be estimated are left out.
+    """
+    known_by_quality: Dict[int, List[int]] = {}
+    for sizes in probed:
+        for quality, size in sizes.items():
+            if size:
+                known_by_quality.setdefault(quality, []).append(size)
+    medians = {quality: median(sizes) for quality, sizes in known_by_quality.items()}
+
+    options = []
+    for sizes in probed:
+        known = {quality: size for quality, size in sizes.items() if size}
+        episode = []
+        for quality in sorted(sizes):
+            if quality in known:
+                episode.append(Option(quality, known[quality], False))
+                continue
+            reference = next((q for q in sorted(known, reverse=True) if q in QUALITY_RATIOS), None)
+            if reference is not None and quality in QUALITY_RATIOS:
+                size = known[reference] * QUALITY_RATIOS[quality] / QUALITY_RATIOS[reference]
+            elif quality in medians:
+                size = medians[quality]
+            else:
+                continue
+            episode.append(Option(quality, round(size), True))
+        options.append(episode)
+    return options
+
+
+def plan_qualities(options: List[List[Option]], budget: float) -> List[Optional[Option]]:
+    """
+    Pick one option per episode so the total size fits `budget` bytes.
+
+    Every episode starts at its lowest quality; the episode currently at the
+    lowest quality is then upgraded one step at a time while the total still
+    fits, so qualities stay as even as possible across the batch. Episodes
+    without options get None.
+    """
+    chosen = [0] * len(options)
+    total = sum(episode[0].size for episode in options if episode)
+    while True:
+        upgradable = sorted((i for i, episode in enumerate(options) if chosen[i] + 1 < len(episode)),
+                            key=lambda i: (options[i][chosen[i]].quality, i))
+        for i in upgradable:
+            extra = options[i][chosen[i] + 1].size - options[i][chosen[i]].size
+            if total + extra <= budget:
+                chosen[i] += 1
+                total += extra
+                break
+        else:
+            return [episode[chosen[i]] if episode else None for i, episode in enumerate(options)]
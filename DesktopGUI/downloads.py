@@ -0,0 +1,200 @@
+import queue
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from core.politeness import BandwidthLimiter, HostScheduler
+from core.sources import parse_download_page, parse_episode_page, rank_sources
+
+
+class JobState:
+    QUEUED = "Queued"
+    RESOLVING = "Resolving"
+    DOWNLOADING = "Downloading"
+    COMPLETED = "Completed"
+    ERROR = "Error"
+
+
+def clean_filename(filename):
+    cleaned_filename = re.sub(r'[\\/*?:"<>|]', '§', filename)
+    return cleaned_filename
+
+
+def get_text(url: str, polite: Optional[HostScheduler] = None) -> str:
+    """GET a site page, inside the per-host limits when a scheduler is given."""
+    if polite is not None:
+        return polite.get_text(url)
+    import requests
+    return requests.get(url).text
+
+
+def get_episodes(base_url: str, anime_url: str, polite: Optional[HostScheduler] = None) -> List[Dict[str, str]]:
+    """Return every episode of an anime as {"episode", "url"} dicts, oldest first."""
+    from bs4 import BeautifulSoup
+
+    response = BeautifulSoup(get_text(f"{base_url}{anime_url}", polite), "html.parser")
+
+    base_url_cdn_api = re.search(r"base_url_cdn_api\s*=\s*'([^']*)'", str(response.find("script", {"src": ""}))).group(1)
+    movie_id = response.find("input", {"id": "movie_id"}).get("value")
+    last_ep = response.find("ul", {"id": "episode_page"}).find_all("a")[-1].get("ep_end")
+
+    episodes_response = BeautifulSoup(
+        get_text(f"{base_url_cdn_api}ajax/load-list-episode?ep_start=0&ep_end={last_ep}&id={movie_id}", polite),
+        "html.parser").find_all("a")
+
+    return [
+        {
+            "episode": re.search(r"</span>(.*?)</div", str(ep.find("div"))).group(1).strip(),
+            "url": f'{base_url}{ep.get("href").replace(" ", "")}'
+        }
+        for ep in reversed(episodes_response)
+    ]
+
+
+def download_link(link, captcha_v3, download_quality, title=None, polite: Optional[HostScheduler] = None):
+    """Resolve an episode page to [download url, title] in two requests."""
+    import requests
+
+    base_download_url, page_title = parse_episode_page(get_text(link, polite))
+    id = base_download_url[base_download_url.find("id=") + 3:base_download_url.find("&typesub")]
+    base_download_url = base_download_url[:base_download_url.find("id=")]
+    post_url = f"{base_download_url}&id={id}&captcha_v3={captcha_v3}"
+    page = polite.post_text(post_url) if polite is not None else requests.post(post_url).text
+    sources, download_title = parse_download_page(page)
+    if not sources:
+        raise Exception("No download links on the download page")
+    title = download_title or title or page_title
+    return [rank_sources(sources, download_quality)[0].url, clean_filename(title) if title else title]
+
+
+class DownloadEngine(QObject):
+    """
+    Downloads episodes on plain worker threads, never on the GUI thread.
+
+    Workers only record their latest progress in a shared dict. A flusher
+    thread emits whatever changed since the last flush at most every
+    `flush_interval` seconds, so the GUI receives one batch per interval no
+    matter how many rows are downloading or how small the chunks are.
+
+    With a HostScheduler, pages and video bytes share the per-host limits
+    of the other UIs ("scrape" and "cdn"); with a BandwidthLimiter, all
+    downloads together stay under its cap.
+    """
+    jobsAdded = pyqtSignal(list)  # list of job dicts, in row order
+    progressBatch = pyqtSignal(dict)  # row -> {"state", "downloaded", "total", "speed", "message"}
+
+    def __init__(self, folder: str, captcha_v3: str, download_quality: int,
+                 max_threads: int = 3, flush_interval: float = 0.25,
+                 polite: Optional[HostScheduler] = None, bandwidth: Optional[BandwidthLimiter] = None):
+        super().__init__()
+        self.polite = polite
+        self.bandwidth = bandwidth
+        self.folder = folder
+        self.captcha_v3 = captcha_v3
+        self.download_quality = download_quality
+        self.max_threads = max_threads
+        self.flush_interval = flush_interval
+
+        self.task_queue = queue.Queue()
+        self.row_count = 0
+        self.pending: Dict[int, dict] = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.threads: List[threading.Thread] = []
+
+    def start(self):
+        if self.threads:
+            return
+        for _ in range(self.max_threads):
+            t = threading.Thread(target=self._worker, daemon=True)
+            t.start()
+            self.threads.append(t)
+        flusher = threading.Thread(target=self._flusher, daemon=True)
+        flusher.start()
+        self.threads.append(flusher)
+
+    def stop(self):
+        self.stop_event.set()
+        for _ in range(self.max_threads):
+            self.task_queue.put(None)
+
+    def add_jobs(self, anime_name: str, episodes: List[Dict[str, str]]):
+        """Queue episodes for download; rows are appended to the model in the same order."""
+        jobs = []
+        with self.lock:
+            for episode in episodes:
+                jobs.append({
+                    "row": self.row_count,
+                    "anime": anime_name,
+                    "episode": episode["episode"],
+                    "url": episode["url"],
+                })
+                self.row_count += 1
+        self.jobsAdded.emit(jobs)
+        for job in jobs:
+            self.task_queue.put(job)
+        self.start()
+
+    def _report(self, row: int, **changes):
+        with self.lock:
+            self.pending.setdefault(row, {}).update(changes)
+
+    def _flusher(self):
+        while not self.stop_event.wait(self.flush_interval):
+            with self.lock:
+                batch, self.pending = self.pending, {}
+            if batch:
+                self.progressBatch.emit(batch)
+
+    def _worker(self):
+        while not self.stop_event.is_set():
+            job = self.task_queue.get()
+            if job is None:
+                break
+            try:
+                self._download(job)
+            except Exception as e:
+                self._report(job["row"], state=JobState.ERROR, message=str(e))
+            finally:
+                self.task_queue.task_done()
+
+    def _download(self, job: dict):
+        import requests
+
+        row = job["row"]
+        self._report(row, state=JobState.RESOLVING)
+        url, title = download_link(job["url"], self.captcha_v3, self.download_quality,
+                                   clean_filename(f"{job['anime']} Episode {job['episode']}"), self.polite)
+
+        file_path = (Path(self.folder) / clean_filename(job["anime"]) / title).with_suffix(".mp4")
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+
+        request = (self.polite.open("GET", url, "cdn", stream=True) if self.polite is not None
+                   else requests.get(url, stream=True))
+        with request as r:
+            r.raise_for_status()
+            total = int(r.headers.get("content-length", 0))
+            self._report(row, state=JobState.DOWNLOADING, total=total, downloaded=0, speed=0.0)
+
+            downloaded = 0
+            start = time.monotonic()
+            with open(file_path, "wb") as f:
+                for chunk in r.iter_content(chunk_size=512 * 512):
+                    if self.stop_event.is_set():
+                        return
+                    if chunk:
+                        if self.bandwidth is not None:
+                            self.stop_event.wait(self.bandwidth.reserve(len(chunk)))
+                        f.write(chunk)
+                        downloaded += len(chunk)
+                        elapsed = time.monotonic() - start
+                        self._report(row, downloaded=downloaded,
+                                     speed=downloaded / elapsed if elapsed > 0 else 0.0)
+
+        if downloaded == 0:
+            raise Exception("Downloaded file is empty")
+        self._report(row, state=JobState.COMPLETED, downloaded=downloaded, speed=0.0)
@@ -8,19 +8,35 @@
 # run again.  Do not edit this file unless you know what you are doing.
 
 
+import os
+import sys
+
 from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtWidgets import QButtonGroup,QListView,QTableView
 from PyQt5.QtGui import QStandardItemModel,QStandardItem
-from PyQt5.QtCore import Qt,QModelIndex
-from bs4 import BeautifulSoup
-import requests
-import json
+from PyQt5.QtCore import Qt,QModelIndex,QThreadPool
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the shared core package
+from core.config import load_config
+from core.politeness import BandwidthLimiter, HostScheduler, host_policies
+from downloads import DownloadEngine
+from models import DownloadTableModel
+from workers import EpisodeListWorker, SearchWorker
+
+
+SETUP_PATH = "setup.json"
+# Set by configure() from main(): importing this module reads no settings
+setup = None
 
 
-f = open("setup.json", "r")
-setup = json.load(f)
-f.close()
-base_url = setup["gogoanime_main"]
+def configure(path: str = SETUP_PATH):
+    """Read setup.json."""
+    global setup, base_url, download_folder, captcha_v3, download_quality, max_threads
+    setup = load_config(path)
+    base_url = setup.base_url
+    download_folder = setup.download_folder
+    captcha_v3 = setup["captcha_v3"]
+    download_quality = setup.download_quality
+    max_threads = setup.max_threads
 
 
 class Ui_MainWindow(object):
@@ -92,6 +108,11 @@ class Ui_MainWindow(object):
         self.AnimeBatchList.setGeometry(QtCore.QRect(10, 480, 760, 200))
         self.AnimeBatchList.setObjectName("AnimeBatchList")
         self.AnimeBatchList.setVisible(False)  # Hide initially
+        self.AnimeBatchList.verticalHeader().setVisible(False)
+
+        self.download_model = DownloadTableModel(self.AnimeBatchList)
+        self.AnimeBatchList.setModel(self.download_model)
+        self.AnimeBatchList.horizontalHeader().setStretchLastSection(True)
 
         # Download button
         self.downloadButton = QtWidgets.QPushButton(self.centralwidget)
@@ -121,73 +142,112 @@ class Ui_MainWindow(object):
         self.retranslateUi(MainWindow)
         QtCore.QMetaObject.connectSlotsByName(MainWindow)
 
+        self.thread_pool = QThreadPool.globalInstance()
+        self.search_worker = None
+        self.search_workers = set()  # running searches, superseded ones too, until they finish
+
+        # Per-host limits and the bandwidth cap (max_download_kbps) from setup.json, as in the other UIs
+        self.polite = HostScheduler(host_policies(setup))
+        # Progress reaches the model in throttled batches from the engine's threads
+        self.download_engine = DownloadEngine(download_folder, captcha_v3, download_quality, max_threads,
+                                              polite=self.polite, bandwidth=BandwidthLimiter(setup.bandwidth_cap))
+        self.download_engine.jobsAdded.connect(self.download_model.add_jobs)
+        self.download_engine.progressBatch.connect(self.download_model.apply_progress)
+
         # Signal connections
         self.mode_group.buttonClicked.connect(self.switch_mode)
         self.searchButton.clicked.connect(self.perform_search)
+        self.lineEdit.returnPressed.connect(self.perform_search)
         self.downloadButton.clicked.connect(self.perform_download)
 
 
     def perform_search(self):
-        print("Search")
-
-        def get_names(response):
-            titles = response.find("ul", {"class": "items"}).find_all("li")
-            names = []
-            for i in titles:
-                name = i.p.a.get("title")
-                url = i.p.a.get("href")
-                names.append([name, url])
-            return names
-
-        def search():
-
-            """
-            Search for anime and return download links for selected episodes.
-            Returns:
-                List[Dict[str, str]]: List of dictionaries containing episode information and download links.
-            """
-            while True:
-                name = self.searchLabel.text
-                print(f"Searching {name}")
-                response = BeautifulSoup(requests.get(f"{base_url}/search.html?keyword={name}").text, "html.parser")
-
-                try:
-                    pages = response.find("ul", {"class": "pagination-list"}).find_all("li")
-                    animes = [anime for page in pages for anime in get_names(BeautifulSoup(requests.get(f"{base_url}/search.html{page.a.get('href')}").text, "html.parser"))]
-                except AttributeError:
-                    animes = get_names(response)
-
-                if not animes:
-                    self.warningLabel.setText("No results found. Try again.")
-                    self.warningLabel.setVisible(True)
-
-                self.model.clear()
-                # for i, (name, *_) in enumerate(animes, 1):
-                #     print(name)
-                #     item = QStandardItem(f"{i}: {name}")
-                #     item.setData(name, Qt.UserRole + 1)  # Store anime name for later use
-                #     self.model.appendRow(item)
-
-                # while True:
-                #     try:
-                #         selected_anime = int(input(f"{Fore.YELLOW}Select anime number: {Style.RESET_ALL}")) - 1
-                #         if 0 <= selected_anime < len(animes):
-                #             break
-                #         raise ValueError
-                #     except ValueError:
-                #         print(f"{Fore.RED}Invalid selection. Try again.{Style.RESET_ALL}")
-                #
-                # return create_links(animes[selected_anime])
-
-        search()
+        """Start a background search; results are appended to the model page by page."""
+        name = self.lineEdit.text()
+        print(f"Searching {name}")
+
+        if self.search_worker is not None:
+            self.search_worker.cancel()
+
+        self.model.clear()
+        self.warningLabel.setVisible(False)
+        self.statusbar.showMessage(f"Searching {name}...")
+
+        worker = SearchWorker(base_url, name, self.polite)
+        worker.signals.batch.connect(lambda animes: self.add_results(worker, animes))
+        worker.signals.finished.connect(lambda total: self.search_finished(worker, total))
+        worker.signals.error.connect(lambda message: self.search_failed(worker, message))
+        self.search_worker = worker
+        self.search_workers.add(worker)
+        self.thread_pool.start(worker)
+
+    def add_results(self, worker, animes):
+        if worker is not self.search_worker:
+            return  # Late batch from a superseded search
+
+        offset = self.model.rowCount()
+        for i, (name, url) in enumerate(animes, offset + 1):
+            item = QStandardItem(f"{i}: {name}")
+            item.setData(url, Qt.UserRole)
+            item.setData(name, Qt.UserRole + 1)  # Store anime name for later use
+            item.setEditable(False)
+            self.model.appendRow(item)
+
+        self.statusbar.showMessage(f"{self.model.rowCount()} results so far...")
+
+    def search_finished(self, worker, total):
+        self.search_workers.discard(worker)
+        if worker is not self.search_worker:
+            return
+
+        self.statusbar.showMessage(f"Found {total} results", 5000)
+        if not total:
+            self.warningLabel.setText("No results found. Try again.")
+            self.warningLabel.setVisible(True)
+
+    def search_failed(self, worker, message):
+        self.search_workers.discard(worker)
+        if worker is not self.search_worker:
+            return
+
+        self.statusbar.clearMessage()
+        self.warningLabel.setText(f"Search failed: {message}")
+        self.warningLabel.setVisible(True)
 
     def handle_anime_selection(self, index):
         # Get the anime name that was stored in UserRole
         selected_anime = index.data(Qt.UserRole)
         print(f"Selected anime: {selected_anime}")  #
 
+    def switch_mode(self, button):
+        # Batch mode allows queueing several search results at once
+        if button is self.radioButton_batch:
+            self.AnimeSearchResults.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+        else:
+            self.AnimeSearchResults.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+
     def perform_download(self):
-       print("Download")
+        indexes = self.AnimeSearchResults.selectionModel().selectedIndexes()
+        if not indexes:
+            self.warningLabel.setText("Select an anime to download first.")
+            self.warningLabel.setVisible(True)
+            return
+
+        self.warningLabel.setVisible(False)
+        for index in indexes:
+            worker = EpisodeListWorker(base_url, index.data(Qt.UserRole + 1), index.data(Qt.UserRole), self.polite)
+            worker.signals.loaded.connect(self.queue_episodes)
+            worker.signals.error.connect(self.show_download_error)
+            self.thread_pool.start(worker)
+
+    def queue_episodes(self, anime_name, episodes):
+        self.AnimeBatchList.setVisible(True)
+        self.download_engine.add_jobs(anime_name, episodes)
+        self.statusbar.showMessage(f"Queued {len(episodes)} episodes of {anime_name}", 5000)
+
+    def show_download_error(self, message):
+        self.warningLabel.setText(f"Could not load episodes: {message}")
+        self.warningLabel.setVisible(True)
 
     def retranslateUi(self, MainWindow):
         _translate = QtCore.QCoreApplication.translate
@@ -199,12 +259,16 @@ class Ui_MainWindow(object):
         self.searchButton.setText(_translate("MainWindow", "Search"))
         self.downloadButton.setText(_translate("MainWindow", "Download"))
 
-if __name__ == "__main__":
-    import sys
-
+def main():
+    configure()
     app = QtWidgets.QApplication(sys.argv)
     MainWindow = QtWidgets.QMainWindow()
     ui = Ui_MainWindow()
     ui.setupUi(MainWindow)
     MainWindow.show()
+    app.aboutToQuit.connect(ui.download_engine.stop)
     sys.exit(app.exec_())
+
+
+if __name__ == "__main__":
+    main()
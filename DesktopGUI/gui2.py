@@ -8,19 +8,29 @@
 # run again.  Do not edit this file unless you know what you are doing.
 
 
+import os
+import sys
+
 from PyQt5 import QtCore, QtGui, QtWidgets
-from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QListWidget, QListWidgetItem
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QListView
 from PyQt5.QtGui import QStandardItemModel,QStandardItem
-from PyQt5.QtCore import Qt,QModelIndex
-from bs4 import BeautifulSoup
-import requests
-import json
+from PyQt5.QtCore import Qt,QModelIndex,QThreadPool
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the shared core package
+from core.config import load_config
+from core.politeness import HostScheduler, host_policies
+from workers import SearchWorker
+
+
+SETUP_PATH = "setup.json"
+# Set by configure() from main(): importing this module reads no settings
+setup = None
 
 
-f = open("setup.json", "r")
-setup = json.load(f)
-f.close()
-base_url = setup["gogoanime_main"]
+def configure(path: str = SETUP_PATH):
+    """Read setup.json."""
+    global setup, base_url
+    setup = load_config(path)
+    base_url = setup.base_url
 
 
 
@@ -69,9 +79,12 @@ class Ui_MainWindow(object):
         self.SearchInput.setGeometry(QtCore.QRect(10, 210, 251, 31))
         self.SearchInput.setClearButtonEnabled(True)
         self.SearchInput.setObjectName("SearchInput")
-        self.listWidget = QtWidgets.QListWidget(self.centralwidget)
-        self.listWidget.setGeometry(QtCore.QRect(10, 290, 371, 301))
-        self.listWidget.setObjectName("listWidget")
+        self.listView = QListView(self.centralwidget)
+        self.listView.setGeometry(QtCore.QRect(10, 290, 371, 301))
+        self.listView.setObjectName("listView")
+        self.listView.setUniformItemSizes(True)
+        self.model = QStandardItemModel()
+        self.listView.setModel(self.model)
         self.SearchLabel_2 = QtWidgets.QLabel(self.centralwidget)
         self.SearchLabel_2.setGeometry(QtCore.QRect(10, 260, 221, 41))
         font = QtGui.QFont()
@@ -138,86 +151,78 @@ class Ui_MainWindow(object):
         self.retranslateUi(MainWindow)
         QtCore.QMetaObject.connectSlotsByName(MainWindow)
 
-        self.searchButton.clicked.connect( self.perform_search)
-
-
-    async def perform_search(self):
-        print("Search")
+        self.thread_pool = QThreadPool.globalInstance()
+        self.search_worker = None
+        self.search_workers = set()  # running searches, superseded ones too, until they finish
+        # Searches share the per-host limits from setup.json, as in the other UIs
+        self.polite = HostScheduler(host_policies(setup))
 
-        async def update_list_widget(links):
-            """Clear the list and add new links."""
-            self.listWidget.clear()
-            for link in links:
-                item = QListWidgetItem(link)
-                self.listWidget.addItem(item)
+        self.searchButton.clicked.connect(self.perform_search)
+        self.SearchInput.returnPressed.connect(self.perform_search)
 
-        async def get_names(response):
-            titles = response.find("ul", {"class": "items"}).find_all("li")
-            names = []
-            for i in titles:
-                name = i.p.a.get("title")
-                url = i.p.a.get("href")
-                names.append([name, url])
-            return names
 
-        async def search():
-            """
-            Search for anime and return download links for selected episodes.
-            Returns:
-                List[Dict[str, str]]: List of dictionaries containing episode information and download links.
-            """
-            # while True:
-            name = self.SearchInput.text()
-            print(f"Searching {name}")
-            response = BeautifulSoup(requests.get(f"{base_url}/search.html?keyword={name}").text, "html.parser")
+    def perform_search(self):
+        """Start a background search; results are appended to the model page by page."""
+        name = self.SearchInput.text()
+        print(f"Searching {name}")
 
-            try:
-                print(1)
-                pages = response.find("ul", {"class": "pagination-list"}).find_all("li")
-                animes = [anime for page in pages for anime in get_names(BeautifulSoup(requests.get(f"{base_url}/search.html{page.a.get('href')}").text,"html.parser"))]
-            except AttributeError:
-                print(2)
-                animes = get_names(response)
+        if self.search_worker is not None:
+            self.search_worker.cancel()
 
-            print(animes[0], animes[0][0])
+        self.model.clear()
+        self.warningLabel.setVisible(False)
+        self.statusbar.showMessage(f"Searching {name}...")
 
-            if not animes:
-                print("No results found. try again")
-                self.warningLabel.setText("No results found. Try again.")
-                self.warningLabel.setVisible(True)
+        worker = SearchWorker(base_url, name, self.polite)
+        worker.signals.batch.connect(lambda animes: self.add_results(worker, animes))
+        worker.signals.finished.connect(lambda total: self.search_finished(worker, total))
+        worker.signals.error.connect(lambda message: self.search_failed(worker, message))
+        self.search_worker = worker
+        self.search_workers.add(worker)
+        self.thread_pool.start(worker)
 
+    def add_results(self, worker, animes):
+        if worker is not self.search_worker:
+            return  # Late batch from a superseded search
 
-            self.listWidget.clear()
-            for anime_link in animes:
-                item = QListWidgetItem(anime_link[0])
-                self.listWidget.addItem(item)
+        for name, url in animes:
+            item = QStandardItem(name)
+            item.setData(url, Qt.UserRole)
+            item.setEditable(False)
+            self.model.appendRow(item)
 
-                await resize_list_widget()
+        self.resize_list_view()
+        self.statusbar.showMessage(f"{self.model.rowCount()} results so far...")
 
-        async def resize_list_widget():
-            item_count = self.listWidget.count()
-            item_height = self.listWidget.sizeHintForRow(0)
+    def search_finished(self, worker, total):
+        self.search_workers.discard(worker)
+        if worker is not self.search_worker:
+            return
 
-            max_display_items = 15
-            visible_items = min(item_count, max_display_items)
-            total_height = visible_items * item_height + 10 # 10 px padding
+        self.statusbar.showMessage(f"Found {total} results", 5000)
+        if not total:
+            print("No results found. try again")
+            self.warningLabel.setText("No results found. Try again.")
+            self.warningLabel.setVisible(True)
 
-            self.listWidget.setFixedHeight(total_height)
+    def search_failed(self, worker, message):
+        self.search_workers.discard(worker)
+        if worker is not self.search_worker:
+            return
 
+        self.statusbar.clearMessage()
+        self.warningLabel.setText(f"Search failed: {message}")
+        self.warningLabel.setVisible(True)
 
+    def resize_list_view(self):
+        item_count = self.model.rowCount()
+        item_height = self.listView.sizeHintForRow(0)
 
-            # while True:
-            #     try:
-            #         selected_anime = int(input(f"{Fore.YELLOW}Select anime number: {Style.RESET_ALL}")) - 1
-            #         if 0 <= selected_anime < len(animes):
-            #             break
-            #         raise ValueError
-            #     except ValueError:
-            #         print(f"{Fore.RED}Invalid selection. Try again.{Style.RESET_ALL}")
-            #
-            # return create_links(animes[selected_anime])
+        max_display_items = 15
+        visible_items = min(item_count, max_display_items)
+        total_height = visible_items * item_height + 10 # 10 px padding
 
-        await search()
+        self.listView.setFixedHeight(total_height)
 
     def retranslateUi(self, MainWindow):
         _translate = QtCore.QCoreApplication.translate
@@ -245,11 +250,15 @@ class Ui_MainWindow(object):
         self.actionLoad_BatchList.setText(_translate("MainWindow", "Load BatchList"))
 
 
-if __name__ == "__main__":
-    import sys
+def main():
+    configure()
     app = QtWidgets.QApplication(sys.argv)
     MainWindow = QtWidgets.QMainWindow()
     ui = Ui_MainWindow()
     ui.setupUi(MainWindow)
     MainWindow.show()
     sys.exit(app.exec_())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+from typing import Dict, List
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+
+class DownloadTableModel(QAbstractTableModel):
+    """Table model for the download queue, fed in batches by DownloadEngine."""
+    COLUMNS = ["Anime", "Episode", "Status", "Progress", "Size", "Speed"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows: List[dict] = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        column = index.column()
+
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return row["anime"]
+            if column == 1:
+                return row["episode"]
+            if column == 2:
+                return row["state"]
+            if column == 3:
+                return f"{row['downloaded'] / row['total'] * 100:.1f}%" if row["total"] else ""
+            if column == 4:
+                return f"{row['downloaded'] / 1024 / 1024:.1f} / {row['total'] / 1024 / 1024:.1f} MB" if row["total"] else ""
+            if column == 5:
+                return f"{row['speed'] / 1024 / 1024:.1f} MB/s" if row["speed"] else ""
+        elif role == Qt.ToolTipRole and row.get("message"):
+            return row["message"]
+        return None
+
+    def add_jobs(self, jobs: List[dict]):
+        if not jobs:
+            return
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(jobs) - 1)
+        for job in jobs:
+            self.rows.append({
+                "anime": job["anime"],
+                "episode": job["episode"],
+                "state": "Queued",
+                "downloaded": 0,
+                "total": 0,
+                "speed": 0.0,
+                "message": "",
+            })
+        self.endInsertRows()
+
+    def apply_progress(self, batch: Dict[int, dict]):
+        """
+        Apply one progress batch and notify views.
+
+        Changed rows are merged into contiguous runs so a batch touching
+        hundreds of neighbouring rows costs a handful of dataChanged signals.
+        """
+        changed = sorted(row for row in batch if 0 <= row < len(self.rows))
+        if not changed:
+            return
+        for row in changed:
+            self.rows[row].update(batch[row])
+
+        last_column = len(self.COLUMNS) - 1
+        run_start = previous = changed[0]
+        for row in changed[1:] + [None]:
+            if row is not None and row == previous + 1:
+                previous = row
+                continue
+            self.dataChanged.emit(self.index(run_start, 0), self.index(previous, last_column),
+                                  [Qt.DisplayRole, Qt.ToolTipRole])
+            if row is not None:
+                run_start = previous = row
@@ -0,0 +1,125 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Optional
+
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal, pyqtSlot
+
+if TYPE_CHECKING:
+    import requests
+
+    from core.politeness import HostScheduler
+
+from downloads import get_episodes
+
+
+def get_names(response):
+    titles = response.find("ul", {"class": "items"}).find_all("li")
+    names = []
+    for i in titles:
+        name = i.p.a.get("title")
+        url = i.p.a.get("href")
+        names.append([name, url])
+    return names
+
+
+class SearchSignals(QObject):
+    """Signals emitted by a SearchWorker, delivered on the GUI thread."""
+    batch = pyqtSignal(list)  # list of [name, url] for one results page
+    finished = pyqtSignal(int)  # total number of results
+    error = pyqtSignal(str)
+
+
+class SearchWorker(QRunnable):
+    """
+    Runs a multi-page search off the Qt main thread.
+
+    The first results page is emitted as soon as it is parsed, the remaining
+    pagination pages are fetched in parallel and emitted in page order.
+    finished or error is always emitted last, also after cancel(), so the
+    GUI knows when it can drop its reference to the worker. With a scheduler
+    every page is a "scrape" request inside the per-host limits, so the
+    parallel pagination fetches cannot outrun the politeness budget.
+    """
+
+    def __init__(self, base_url: str, name: str, polite: Optional["HostScheduler"] = None, page_workers: int = 4):
+        super().__init__()
+        self.base_url = base_url
+        self.name = name
+        self.polite = polite
+        self.page_workers = page_workers
+        self.signals = SearchSignals()
+        self.cancelled = False
+        # The GUI keeps a reference until finished or error, to cancel superseded searches
+        self.setAutoDelete(False)
+
+    def cancel(self):
+        """Stop emitting results; pages already in flight are discarded."""
+        self.cancelled = True
+
+    def _fetch(self, session: "requests.Session", url: str):
+        from bs4 import BeautifulSoup
+
+        text = self.polite.get_text(url, session) if self.polite is not None else session.get(url).text
+        return BeautifulSoup(text, "html.parser")
+
+    def _emit(self, animes: List[list], seen: set) -> int:
+        fresh = [anime for anime in animes if anime[1] not in seen]
+        seen.update(anime[1] for anime in fresh)
+        if fresh and not self.cancelled:
+            self.signals.batch.emit(fresh)
+        return len(fresh)
+
+    @pyqtSlot()
+    def run(self):
+        import requests
+
+        total = 0
+        seen = set()
+        try:
+            with requests.Session() as session:
+                response = self._fetch(session, f"{self.base_url}/search.html?keyword={self.name}")
+                total += self._emit(get_names(response), seen)
+
+                pagination = response.find("ul", {"class": "pagination-list"})
+                if pagination is not None and not self.cancelled:
+                    # The "selected" entry is the page we already have
+                    page_urls = [f"{self.base_url}/search.html{page.a.get('href')}"
+                                 for page in pagination.find_all("li")
+                                 if "selected" not in (page.get("class") or [])]
+                    with ThreadPoolExecutor(max_workers=self.page_workers) as pool:
+                        # map() yields in submission order, so results stay sorted by page
+                        for page in pool.map(lambda url: self._fetch(session, url), page_urls):
+                            if self.cancelled:
+                                break
+                            total += self._emit(get_names(page), seen)
+        except Exception as e:
+            self.signals.error.emit(str(e))
+            return
+
+        self.signals.finished.emit(total)
+
+
+class EpisodeSignals(QObject):
+    """Signals emitted by an EpisodeListWorker, delivered on the GUI thread."""
+    loaded = pyqtSignal(str, list)  # anime name, list of {"episode", "url"}
+    error = pyqtSignal(str)
+
+
+class EpisodeListWorker(QRunnable):
+    """Fetches the episode list of one anime off the Qt main thread."""
+
+    def __init__(self, base_url: str, name: str, anime_url: str, polite: Optional["HostScheduler"] = None):
+        super().__init__()
+        self.base_url = base_url
+        self.name = name
+        self.anime_url = anime_url
+        self.polite = polite
+        self.signals = EpisodeSignals()
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            episodes = get_episodes(self.base_url, self.anime_url, self.polite)
+        except Exception as e:
+            self.signals.error.emit(f"{self.name}: {e}")
+            return
+        self.signals.loaded.emit(self.name, episodes)
@@ -0,0 +1,269 @@
+import bisect
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+Interval = Tuple[int, int]  # inclusive (first, last) episode numbers
+
+
+class EpisodeSet:
+    """
+    Sorted, de-duplicated episode numbers kept as inclusive intervals, so
+    "1-1000" is one pair instead of a thousand integers. Iterating yields the
+    episodes in order; len() and `in` never expand the ranges.
+    """
+
+    def __init__(self, episodes: Iterable[int] = ()):
+        self.intervals: List[Interval] = []
+        if isinstance(episodes, EpisodeSet):
+            self.intervals, self.count = list(episodes.intervals), episodes.count
+            return
+        for episode in sorted(set(episodes)):
+            if self.intervals and self.intervals[-1][1] == episode - 1:
+                self.intervals[-1] = (self.intervals[-1][0], episode)
+            else:
+                self.intervals.append((episode, episode))
+        self.count = sum(last - first + 1 for first, last in self.intervals)
+
+    @classmethod
+    def parse(cls, text: str) -> "EpisodeSet":
+        """'1-12,15' -> episodes 1 to 12 and 15."""
+        episodes = cls()
+        for part in filter(None, text.replace(" ", "").split(",")):
+            first, _, last = part.partition("-")
+            episodes.add_range(int(first), int(last or first))
+        return episodes
+
+    def add_range(self, first: int, last: int):
+        """Add first..last, merging with neighbouring intervals."""
+        start = bisect.bisect_left(self.intervals, (first, first))
+        if start and self.intervals[start - 1][1] >= first - 1:
+            start -= 1
+        end = start
+        while end < len(self.intervals) and self.intervals[end][0] <= last + 1:
+            first = min(first, self.intervals[end][0])
+            last = max(last, self.intervals[end][1])
+            end += 1
+        self.intervals[start:end] = [(first, last)]
+        self.count = sum(high - low + 1 for low, high in self.intervals)
+
+    def __str__(self) -> str:
+        return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in self.intervals)
+
+    def __repr__(self) -> str:
+        return f"EpisodeSet('{self}')"
+
+    def __iter__(self) -> Iterator[int]:
+        for first, last in self.intervals:
+            yield from range(first, last + 1)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __bool__(self) -> bool:
+        return bool(self.intervals)
+
+    def __contains__(self, episode: int) -> bool:
+        index = bisect.bisect_right(self.intervals, (episode, float("inf"))) - 1
+        return index >= 0 and self.intervals[index][1] >= episode
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, EpisodeSet):
+            return self.intervals == other.intervals
+        return NotImplemented
+
+
+class BatchStore:
+    """
+    Every saved batch list in one SQLite database.
+
+    A list is a row in `lists` and one row per anime in `items`, keyed by
+    (list, name), so saving writes only the anime that changed, duplicate
+    checks are a primary-key lookup and the saved lists are listed newest
+    first from an index instead of a directory scan. Episode selections
+    are stored as EpisodeSet text ("1-12,15").
+
+    The JSON files earlier versions wrote to `legacy_dir` are imported in
+    one transaction when the store is opened; a file is imported again only
+    if it changes. Files that cannot be read are listed in `skipped`.
+    """
+
+    def __init__(self, db_path: str = "batch_lists.db", legacy_dir: Optional[str] = "batch_lists"):
+        self.lock = threading.Lock()
+        self.skipped: List[str] = []  # why each unreadable JSON file was not imported
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.executescript("""
+            PRAGMA foreign_keys = ON;
+            CREATE TABLE IF NOT EXISTS lists (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS lists_updated ON lists (updated_at);
+            CREATE TABLE IF NOT EXISTS items (
+                list_id INTEGER NOT NULL REFERENCES lists (id) ON DELETE CASCADE,
+                name TEXT NOT NULL,
+                url TEXT NOT NULL,
+                episodes TEXT NOT NULL,
+                total_episodes INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                PRIMARY KEY (list_id, name)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS imported (
+                file TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL
+            );
+        """)
+        if legacy_dir:
+            self.import_json(legacy_dir)
+
+    # Lists
+
+    def names(self) -> List[str]:
+        """Saved list names, most recently saved first."""
+        with self.lock:
+            return [name for name, in self.db.execute("SELECT name FROM lists ORDER BY updated_at DESC")]
+
+    def exists(self, name: str) -> bool:
+        with self.lock:
+            return self._list_id(name) is not None
+
+    def _list_id(self, name: str) -> Optional[int]:
+        row = self.db.execute("SELECT id FROM lists WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _touch(self, name: str, at: Optional[float] = None) -> int:
+        """Create the list if needed and mark it as saved `at` (now by default); returns its id."""
+        at = at or time.time()
+        self.db.execute(
+            "INSERT INTO lists (name, created_at, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET updated_at = excluded.updated_at",
+            (name, at, at))
+        return self._list_id(name)
+
+    def load(self, name: str) -> List[dict]:
+        """The items of a saved list in their saved order; KeyError when there is no such list."""
+        with self.lock:
+            list_id = self._list_id(name)
+            if list_id is None:
+                raise KeyError(f"No saved list named '{name}'")
+            rows = self.db.execute(
+                "SELECT name, url, episodes, total_episodes FROM items WHERE list_id = ? ORDER BY position",
+                (list_id,)).fetchall()
+        return [{"name": item, "url": url, "episodes": EpisodeSet.parse(episodes), "total_episodes": total}
+                for item, url, episodes, total in rows]
+
+    def save(self, name: str, items: List[dict]) -> int:
+        """
+        Make the saved list `name` hold exactly `items`. Rows that did not
+        change are left alone; returns the number of rows written or removed.
+        """
+        rows = [(item["name"], item["url"], str(EpisodeSet(item["episodes"])), item["total_episodes"], position)
+                for position, item in enumerate(items)]
+        with self.lock, self.db:
+            list_id = self._touch(name)
+            before = self.db.total_changes
+            self.db.executemany(
+                "INSERT INTO items (list_id, name, url, episodes, total_episodes, position) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(list_id, name) DO UPDATE SET "
+                "url = excluded.url, episodes = excluded.episodes, total_episodes = excluded.total_episodes, "
+                "position = excluded.position WHERE (url, episodes, total_episodes, position) IS NOT "
+                "(excluded.url, excluded.episodes, excluded.total_episodes, excluded.position)",
+                [(list_id, *row) for row in rows])
+            kept = {row[0] for row in rows}
+            self.db.executemany(
+                "DELETE FROM items WHERE list_id = ? AND name = ?",
+                [(list_id, item) for item, in self.db.execute("SELECT name FROM items WHERE list_id = ?", (list_id,))
+                 if item not in kept])
+            return self.db.total_changes - before
+
+    def rename(self, name: str, new_name: str) -> bool:
+        """Give a saved list another name (used for backups); False if `new_name` is taken."""
+        with self.lock, self.db:
+            try:
+                cursor = self.db.execute("UPDATE lists SET name = ? WHERE name = ?", (new_name, name))
+            except sqlite3.IntegrityError:
+                return False
+            return cursor.rowcount > 0
+
+    def delete(self, name: str) -> bool:
+        with self.lock, self.db:
+            return self.db.execute("DELETE FROM lists WHERE name = ?", (name,)).rowcount > 0
+
+    # Single items, for editing a saved list in place
+
+    def put_item(self, name: str, item: dict):
+        """Add or replace one anime in a saved list (created if needed)."""
+        with self.lock, self.db:
+            list_id = self._touch(name)
+            self.db.execute(
+                "INSERT INTO items (list_id, name, url, episodes, total_episodes, position) "
+                "VALUES (?, ?, ?, ?, ?, (SELECT COALESCE(MAX(position) + 1, 0) FROM items WHERE list_id = ?)) "
+                "ON CONFLICT(list_id, name) DO UPDATE SET url = excluded.url, episodes = excluded.episodes, "
+                "total_episodes = excluded.total_episodes",
+                (list_id, item["name"], item["url"], str(EpisodeSet(item["episodes"])), item["total_episodes"],
+                 list_id))
+
+    def remove_item(self, name: str, item_name: str) -> bool:
+        with self.lock, self.db:
+            list_id = self._list_id(name)
+            if list_id is None:
+                return False
+            removed = self.db.execute("DELETE FROM items WHERE list_id = ? AND name = ?",
+                                      (list_id, item_name)).rowcount > 0
+            if removed:
+                self._touch(name)
+            return removed
+
+    def has_item(self, name: str, item_name: str) -> bool:
+        with self.lock:
+            return self.db.execute(
+                "SELECT 1 FROM items JOIN lists ON lists.id = items.list_id WHERE lists.name = ? AND items.name = ?",
+                (name, item_name)).fetchone() is not None
+
+    # Import
+
+    def import_json(self, directory: str) -> int:
+        """
+        Import the batch list JSON files in `directory` that are new or changed
+        since the last import, all in one transaction. Returns the number of
+        lists imported; unreadable files are skipped and reported in `skipped`.
+        """
+        self.skipped = []
+        files = sorted(Path(directory).glob("*.json"))
+        if not files:
+            return 0
+        with self.lock:
+            seen: Dict[str, int] = dict(self.db.execute("SELECT file, mtime_ns FROM imported"))
+
+        lists = []
+        for path in files:
+            mtime_ns = path.stat().st_mtime_ns
+            if seen.get(str(path.resolve())) == mtime_ns:
+                continue
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+                items = [(item["name"], item["url"], str(EpisodeSet(item["episodes"])), int(item["total_episodes"]))
+                         for item in data["items"]]
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                self.skipped.append(f"Skipping batch list {path.name}: {e}")
+                continue
+            lists.append((path, mtime_ns, items))
+
+        with self.lock, self.db:
+            for path, mtime_ns, items in lists:
+                self.db.execute("DELETE FROM lists WHERE name = ?", (path.stem,))
+                list_id = self._touch(path.stem, at=mtime_ns / 1e9)
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO items (list_id, name, url, episodes, total_episodes, position) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(list_id, *item, position) for position, item in enumerate(items)])
+                self.db.execute("INSERT OR REPLACE INTO imported (file, mtime_ns) VALUES (?, ?)",
+                                (str(path.resolve()), mtime_ns))
+        return len(lists)
@@ -0,0 +1,259 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    import requests
+
+
+def normalize(text: str) -> str:
+    """Lowercase and strip punctuation so 'Re:Zero' and 're zero' compare equal."""
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", text.lower()).split())
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {normalize(text)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AnimeCatalog:
+    """
+    Local index of every title on the site's anime list.
+
+    Titles are stored in SQLite and mirrored in an in-memory trigram index,
+    so a search is a dictionary lookup instead of a paginated network crawl.
+    Substring matches rank first; otherwise titles are ranked by trigram
+    overlap, which tolerates typos and missing words. Only a substring match
+    or a typo match scoring STRONG_SCORE counts as a hit; below that the
+    title may simply be missing from the catalog (see match()).
+    """
+    LIST_PAGE = "/anime-list.html?page={page}"
+    RECENT_PAGE = "/new-season.html?page={page}"
+    STRONG_SCORE = 0.6  # e.g. one typo in a short title; "naruto" vs "Boruto" scores 0.43
+
+    def __init__(self, base_url: str, db_path: str = "catalog.db", workers: int = 8, scheduler=None):
+        self.base_url = base_url
+        self.workers = workers
+        self.scheduler = scheduler  # Optional HostScheduler shared with the rest of the app
+        self.lock = threading.Lock()
+        self.refreshing = threading.Lock()
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS anime (
+                url TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                page INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS anime_page ON anime (page);
+            CREATE TABLE IF NOT EXISTS pages (
+                page INTEGER PRIMARY KEY,
+                digest TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+
+        self.names: Dict[str, str] = {}
+        self.normalized: Dict[str, str] = {}
+        self.gram_counts: Dict[str, int] = {}
+        self.index: Dict[str, Set[str]] = defaultdict(set)
+        for url, name in self.db.execute("SELECT url, name FROM anime"):
+            self._index(url, name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _index(self, url: str, name: str):
+        previous = self.names.get(url)
+        if previous == name:
+            return
+        if previous is not None:
+            for gram in trigrams(previous):
+                self.index[gram].discard(url)
+        grams = trigrams(name)
+        self.names[url] = name
+        self.normalized[url] = normalize(name)
+        self.gram_counts[url] = len(grams)
+        for gram in grams:
+            self.index[gram].add(url)
+
+    # Lookup
+
+    def search(self, query: str, limit: int = 50, min_score: float = 0.3) -> List[List[str]]:
+        """Return up to `limit` [name, url] pairs, best match first."""
+        return self.match(query, limit, min_score)[0]
+
+    def match(self, query: str, limit: int = 50, min_score: float = 0.3) -> Tuple[List[List[str]], bool]:
+        """search() plus whether the best result is a strong match (a substring or STRONG_SCORE)."""
+        needle = normalize(query)
+        if not needle:
+            return [], False
+        query_grams = trigrams(query)
+
+        with self.lock:
+            postings = sorted((self.index.get(gram, set()) for gram in query_grams), key=len)
+
+            # Fast path: a substring match contains every unpadded trigram of the
+            # query (the padded ones only occur where a title starts), so
+            # intersecting from the rarest trigram keeps the candidate set tiny
+            inner = sorted((self.index.get(needle[i:i + 3], set()) for i in range(len(needle) - 2)), key=len)
+            candidates = set(inner[0]) if inner else set(self.names)  # too short for a trigram
+            for posting in inner[1:]:
+                if not candidates:
+                    break
+                candidates &= posting
+            matches = [url for url in candidates if needle in self.normalized[url]]
+            if matches:
+                matches.sort(key=lambda url: (self.gram_counts[url], self.names[url]))
+                return [[self.names[url], url] for url in matches[:limit]], True
+
+            # Typo path: rank by shared trigrams, skipping grams so common they carry no signal
+            common = max(len(self.names) // 5, 50)
+            counts: Dict[str, int] = defaultdict(int)
+            for posting in postings:
+                if len(posting) > common:
+                    break
+                for url in posting:
+                    counts[url] += 1
+
+            scored = []
+            for url, shared in counts.items():
+                # Dice coefficient over trigrams
+                score = 2 * shared / (len(query_grams) + self.gram_counts[url])
+                if score >= min_score:
+                    scored.append((score, self.names[url], url))
+
+        scored.sort(key=lambda match: (-match[0], match[1]))
+        strong = bool(scored) and scored[0][0] >= self.STRONG_SCORE
+        return [[name, url] for _, name, url in scored[:limit]], strong
+
+    def add(self, animes: List[List[str]]):
+        """Add [name, url] pairs found by a live search so the next lookup is local."""
+        with self.lock:
+            self.db.executemany(
+                "INSERT INTO anime (url, name) VALUES (?, ?) ON CONFLICT(url) DO UPDATE SET name = excluded.name",
+                [(url, name) for name, url in animes])
+            self.db.commit()
+            for name, url in animes:
+                self._index(url, name)
+
+    # Crawling
+
+    def last_refresh(self) -> Optional[float]:
+        with self.lock:
+            row = self.db.execute("SELECT value FROM meta WHERE key = 'refreshed_at'").fetchone()
+        return float(row[0]) if row else None
+
+    def is_stale(self, max_age: float = 24 * 3600) -> bool:
+        refreshed_at = self.last_refresh()
+        return refreshed_at is None or time.time() - refreshed_at > max_age
+
+    def _fetch_list_page(self, session: "requests.Session", template: str, page: int) -> List[List[str]]:
+        from bs4 import BeautifulSoup
+
+        url = f"{self.base_url}{template.format(page=page)}"
+        text = self.scheduler.get_text(url, session) if self.scheduler else session.get(url).text
+        response = BeautifulSoup(text, "html.parser")
+        listing = response.find("ul", {"class": "listing"})
+        if listing is not None:
+            return [[a.get_text(strip=True), a.get("href")] for a in listing.select("li a")]
+        items = response.find("ul", {"class": "items"})
+        if items is not None:
+            return [[li.p.a.get("title"), li.p.a.get("href")] for li in items.find_all("li")]
+        return []
+
+    def _store_page(self, page: int, animes: List[List[str]]) -> bool:
+        """Replace the titles of one list page; returns False when the page is unchanged."""
+        digest = hashlib.sha1(repr(animes).encode()).hexdigest()
+        with self.lock:
+            row = self.db.execute("SELECT digest FROM pages WHERE page = ?", (page,)).fetchone()
+            if row and row[0] == digest:
+                return False
+            self.db.executemany(
+                "INSERT INTO anime (url, name, page) VALUES (?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET name = excluded.name, page = excluded.page",
+                [(url, name, page) for name, url in animes])
+            self.db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?)", (page, digest, time.time()))
+            self.db.commit()
+            for name, url in animes:
+                self._index(url, name)
+        return True
+
+    def _mark_refreshed(self):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('refreshed_at', ?)", (str(time.time()),))
+            self.db.commit()
+
+    def rebuild(self) -> int:
+        """
+        Crawl the full anime list in parallel, `workers` pages at a time,
+        until a batch contains an empty page. Returns the number of changed pages.
+        """
+        import requests
+
+        if not self.refreshing.acquire(blocking=False):
+            return 0
+        try:
+            changed = 0
+            page = 1
+            with requests.Session() as session, ThreadPoolExecutor(max_workers=self.workers) as pool:
+                while True:
+                    batch = list(range(page, page + self.workers))
+                    results = list(pool.map(lambda p: self._fetch_list_page(session, self.LIST_PAGE, p), batch))
+                    for number, animes in zip(batch, results):
+                        if animes and self._store_page(number, animes):
+                            changed += 1
+                    if not all(results):
+                        break
+                    page += self.workers
+            self._mark_refreshed()
+            return changed
+        finally:
+            self.refreshing.release()
+
+    def refresh(self, max_pages: int = 10) -> int:
+        """
+        Incremental refresh: walk the site's recently added listing and stop at
+        the first page that brings no unseen titles. Falls back to a full
+        rebuild when the catalog is empty. Returns the number of new titles.
+        """
+        if not self.names:
+            self.rebuild()
+            return len(self.names)
+        import requests
+
+        if not self.refreshing.acquire(blocking=False):
+            return 0
+        try:
+            added = 0
+            with requests.Session() as session:
+                for page in range(1, max_pages + 1):
+                    animes = self._fetch_list_page(session, self.RECENT_PAGE, page)
+                    fresh = [anime for anime in animes if self.names.get(anime[1]) != anime[0]]
+                    if not fresh:
+                        break
+                    self.add(fresh)
+                    added += len(fresh)
+            self._mark_refreshed()
+            return added
+        finally:
+            self.refreshing.release()
+
+    def refresh_in_background(self, max_age: float = 24 * 3600) -> Optional[threading.Thread]:
+        """Start a refresh thread if the catalog is stale; never blocks the caller."""
+        if not self.is_stale(max_age) or self.refreshing.locked():
+            return None
+        thread = threading.Thread(target=self.refresh, daemon=True)
+        thread.start()
+        return thread
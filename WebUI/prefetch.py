@@ -0,0 +1,128 @@
+import hashlib
+import io
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Optional
+
+if TYPE_CHECKING:
+    from core.politeness import HostScheduler
+
+
+class ThumbnailCache:
+    """
+    Downscaled poster images on local disk.
+
+    Files are named after the SHA-1 of the downscaled image, so posters shared
+    by several titles are stored once. `index.json` maps remote URLs to files.
+    """
+
+    def __init__(self, directory: str = "thumbnails", max_size=(300, 420), quality: int = 85):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.quality = quality
+        self.lock = threading.Lock()
+        self.index_path = self.directory / "index.json"
+        try:
+            self.index: Dict[str, str] = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.index = {}
+
+    def get(self, url: str) -> Optional[str]:
+        """Return the local path of a cached poster, or None."""
+        with self.lock:
+            name = self.index.get(url)
+        if name and (self.directory / name).exists():
+            return str(self.directory / name)
+        return None
+
+    def fetch(self, url: str, polite: Optional["HostScheduler"] = None) -> str:
+        """
+        Download, downscale and store a poster; returns its local path. With
+        `polite` the download is a "scrape" request within the per-host limits.
+        """
+        import requests
+        from PIL import Image
+
+        cached = self.get(url)
+        if cached:
+            return cached
+
+        if polite is not None:
+            with polite.open("GET", url, "scrape", timeout=15) as response:
+                response.raise_for_status()
+                content = response.content
+        else:
+            response = requests.get(url, timeout=15)
+            response.raise_for_status()
+            content = response.content
+
+        image = Image.open(io.BytesIO(content))
+        image.thumbnail(self.max_size)
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, format="JPEG", quality=self.quality, optimize=True)
+        data = buffer.getvalue()
+
+        name = f"{hashlib.sha1(data).hexdigest()}.jpg"
+        path = self.directory / name
+        if not path.exists():
+            path.write_bytes(data)
+
+        with self.lock:
+            self.index[url] = name
+            self.index_path.write_text(json.dumps(self.index), encoding="utf-8")
+        return str(path)
+
+
+class PreviewPrefetcher:
+    """
+    Warms anime previews (metadata plus local poster) on a thread pool.
+
+    `prefetch` is fire-and-forget for the top search results; `get` returns
+    the cached preview, waiting only if that preview is still in flight.
+    Failed fetches are dropped from the cache so the next call retries them.
+    Posters are downloaded through `polite`, the shared per-host limits.
+    """
+
+    def __init__(self, fetch_preview: Callable[[str], dict], thumbnails: ThumbnailCache,
+                 polite: Optional["HostScheduler"] = None, workers: int = 4, max_entries: int = 256):
+        self.fetch_preview = fetch_preview
+        self.thumbnails = thumbnails
+        self.polite = polite
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preview")
+        self.max_entries = max_entries
+        self.futures: "OrderedDict[str, Future]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _load(self, link: str) -> dict:
+        anime = self.fetch_preview(link)
+        if anime.get("image_link"):
+            try:
+                anime["image_path"] = self.thumbnails.fetch(anime["image_link"], self.polite)
+            except Exception:
+                anime["image_path"] = None  # Fall back to the remote poster
+        return anime
+
+    def _submit(self, link: str) -> Future:
+        with self.lock:
+            future = self.futures.get(link)
+            if future is not None and not (future.done() and future.exception()):
+                self.futures.move_to_end(link)
+                return future
+
+            future = self.executor.submit(self._load, link)
+            self.futures[link] = future
+            while len(self.futures) > self.max_entries:
+                self.futures.popitem(last=False)
+            return future
+
+    def prefetch(self, links: Iterable[str]):
+        for link in links:
+            self._submit(link)
+
+    def get(self, link: str, timeout: Optional[float] = None) -> dict:
+        """Return the preview for `link`; raises whatever the fetch raised."""
+        return self._submit(link).result(timeout)
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import shutil
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class Abandoned(Exception):
+    """The caller running a shared call was cancelled before it had a result."""
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one. The first caller
+    runs the function; callers that arrive while it is in flight wait for
+    its result (or exception) instead of repeating the work. Nothing is
+    cached once the call finishes.
+
+    Results are handed over through concurrent.futures.Future, so waiting
+    works across threads and across event loops: every Streamlit session
+    runs its downloads on a loop of its own. When the running caller is
+    cancelled, the waiting ones start over and one of them runs the call.
+    """
+
+    def __init__(self):
+        self.calls: Dict[Hashable, Future] = {}
+        self.lock = threading.Lock()
+
+    def _claim(self, key: Hashable) -> Tuple[Future, bool]:
+        with self.lock:
+            future = self.calls.get(key)
+            if future is not None:
+                return future, False
+            future = self.calls[key] = Future()
+            return future, True
+
+    def _finish(self, key: Hashable, future: Future):
+        with self.lock:
+            if self.calls.get(key) is future:
+                del self.calls[key]
+
+    def in_flight(self, key: Hashable) -> bool:
+        with self.lock:
+            return key in self.calls
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Tuple[Any, bool]:
+        """Blocking call; returns (result, joined), `joined` being True when another caller ran it."""
+        while True:
+            future, leader = self._claim(key)
+            if not leader:
+                try:
+                    return future.result(), True
+                except Abandoned:
+                    continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e if isinstance(e, Exception) else Abandoned())
+                raise
+            else:
+                future.set_result(result)
+                return result, False
+            finally:
+                self._finish(key, future)
+
+    async def do_async(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Tuple[Any, bool]:
+        """Coroutine counterpart of do(); `fn` is awaited on the caller's loop."""
+        while True:
+            future, leader = self._claim(key)
+            if not leader:
+                try:
+                    return await asyncio.wrap_future(future), True
+                except Abandoned:
+                    continue
+            try:
+                result = await fn(*args, **kwargs)
+            except asyncio.CancelledError:
+                future.set_exception(Abandoned())
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(result)
+                return result, False
+            finally:
+                self._finish(key, future)
+
+
+def link_or_copy(source: str, destination: str):
+    """
+    Put a copy of `source` at `destination`: a hard link when both are on
+    the same filesystem (no extra space), a byte copy otherwise. An
+    existing file at `destination` is replaced.
+    """
+    temp_path = destination + ".link"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    try:
+        os.link(source, temp_path)
+    except OSError:
+        shutil.copyfile(source, temp_path)
+    os.replace(temp_path, destination)
@@ -0,0 +1,305 @@
+import asyncio
+import os
+import re
+import secrets
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+from core.links import check_expired
+
+PIECE_SIZE = 2 * 1024 * 1024
+SERVE_BLOCK = 256 * 1024
+
+
+class RangeMap:
+    """
+    Byte ranges of a file that are already on disk.
+
+    Written from the download loop and read from the streaming server's
+    threads; readers block in wait_for() until their range arrives.
+    """
+
+    def __init__(self):
+        self.ranges: List[List[int]] = []  # sorted, non-overlapping [start, end)
+        self.total: Optional[int] = None
+        self.failed: Optional[str] = None
+        self.seekable = False  # the source honoured Range requests
+        self.condition = threading.Condition()
+
+    def reset(self):
+        """Forget everything on disk, e.g. when a restarted download rewrites the file."""
+        with self.condition:
+            self.ranges = []
+            self.total = None
+            self.seekable = False
+
+    def set_total(self, total: int):
+        with self.condition:
+            self.total = total
+            self.condition.notify_all()
+
+    def add(self, start: int, end: int):
+        with self.condition:
+            merged = []
+            for existing in self.ranges:
+                if existing[1] < start or existing[0] > end:
+                    merged.append(existing)
+                else:
+                    start, end = min(start, existing[0]), max(end, existing[1])
+            merged.append([start, end])
+            self.ranges = sorted(merged)
+            self.condition.notify_all()
+
+    def fail(self, reason: str):
+        with self.condition:
+            self.failed = reason
+            self.condition.notify_all()
+
+    def _covers(self, start: int, end: int) -> bool:
+        return any(r_start <= start and end <= r_end for r_start, r_end in self.ranges)
+
+    def has(self, start: int, end: int) -> bool:
+        with self.condition:
+            return self._covers(start, end)
+
+    def covered(self) -> int:
+        with self.condition:
+            return sum(end - start for start, end in self.ranges)
+
+    def contiguous_prefix(self) -> int:
+        with self.condition:
+            return self.ranges[0][1] if self.ranges and self.ranges[0][0] == 0 else 0
+
+    def wait_total(self, timeout: Optional[float] = None) -> Optional[int]:
+        with self.condition:
+            self.condition.wait_for(lambda: self.total is not None or self.failed, timeout)
+            return self.total
+
+    def wait_for(self, start: int, end: int, timeout: Optional[float] = None) -> bool:
+        """Block until [start, end) is on disk; False on timeout or failure."""
+        with self.condition:
+            self.condition.wait_for(lambda: self._covers(start, end) or self.failed, timeout)
+            return self._covers(start, end)
+
+
+def find_moov_offset(head: bytes, total: int) -> Optional[int]:
+    """
+    Walk the top-level MP4 boxes in the first bytes of a file. Returns the
+    offset of a 'moov' box that sits after 'mdat' (so a player needs the tail
+    before it can start), or None when moov is already in the head.
+    """
+    offset = 0
+    while offset + 8 <= len(head):
+        size, box = struct.unpack(">I4s", head[offset:offset + 8])
+        if size == 1 and offset + 16 <= len(head):
+            size = struct.unpack(">Q", head[offset + 8:offset + 16])[0]
+        elif size == 0:
+            size = total - offset
+        if box == b"moov":
+            return None
+        if box == b"mdat":
+            return offset + size if offset + size < total else None
+        if size < 8:
+            return None
+        offset += size
+    return None
+
+
+def parse_content_range(value: Optional[str]) -> Optional[int]:
+    match = re.match(r"bytes \d+-\d+/(\d+)", value or "")
+    return int(match.group(1)) if match else None
+
+
+class SequentialDownloader:
+    """
+    Downloads a file so that it becomes playable as early as possible.
+
+    With Range support the head is fetched first, then the 'moov' box if it
+    sits at the end of the file, then the remaining pieces in file order
+    (several connections each take the lowest missing piece). Without Range
+    support the body is streamed once, which is sequential anyway.
+    """
+
+    def __init__(self, session, opener=None, piece_size: int = PIECE_SIZE, connections: int = 2):
+        self.session = session
+        # opener(session, method, url, **kwargs) -> async context manager; defaults to session.request
+        self.opener = opener or (lambda session, method, url, **kwargs: session.request(method, url, **kwargs))
+        self.piece_size = piece_size
+        self.connections = connections
+
+    async def _fetch_range(self, url: str, start: int, end: int):
+        headers = {"Range": f"bytes={start}-{end - 1}"}
+        async with self.opener(self.session, "GET", url, headers=headers) as response:
+            check_expired(response.status, url)
+            if response.status != 206:
+                raise Exception(f"HTTP {response.status}: Failed to download {url} bytes {start}-{end - 1}")
+            return await response.read()
+
+    async def download(self, url: str, file_path: str, range_map: RangeMap,
+                       on_progress: Optional[Callable[[int, int], None]] = None,
+                       cancelled: Callable[[], bool] = lambda: False):
+        """
+        Download into `file_path`. A `range_map` left over from an earlier
+        attempt (e.g. before the link expired) is resumed: pieces already on
+        disk are not fetched again.
+        """
+        import aiofiles
+
+        if range_map.total is not None and range_map.seekable:
+            total = range_map.total
+            with open(file_path, "rb") as file:
+                head = file.read(min(range_map.contiguous_prefix(), self.piece_size))
+        else:
+            range_map.reset()
+            headers = {"Range": f"bytes=0-{self.piece_size - 1}"}
+            async with self.opener(self.session, "GET", url, headers=headers) as response:
+                check_expired(response.status, url)
+                total = parse_content_range(response.headers.get("Content-Range")) if response.status == 206 else None
+                if total is None:
+                    # No Range support: this response is the whole file, stream it in order
+                    await self._stream_body(url, response, file_path, range_map, on_progress, cancelled)
+                    return
+                head = await response.read()
+
+            range_map.seekable = True
+            range_map.set_total(total)
+            with open(file_path, "wb") as file:
+                file.truncate(total)
+                file.write(head)
+            range_map.add(0, len(head))
+
+        pieces: List[Tuple[int, int]] = []
+        moov = find_moov_offset(head, total)
+        if moov is not None:
+            pieces.append((moov, total))  # index needed before playback can start
+        limit = moov if moov is not None else total
+        pieces += [(start, min(start + self.piece_size, limit))
+                   for start in range(len(head), limit, self.piece_size)]
+        pieces = [(start, end) for start, end in pieces if not range_map.has(start, end)]
+
+        async def connection():
+            async with aiofiles.open(file_path, "r+b") as file:
+                while pieces and not cancelled():
+                    start, end = pieces.pop(0)
+                    data = await self._fetch_range(url, start, end)
+                    await file.seek(start)
+                    await file.write(data)
+                    await file.flush()
+                    range_map.add(start, start + len(data))
+                    if on_progress:
+                        on_progress(range_map.covered(), total)
+
+        workers = [asyncio.create_task(connection()) for _ in range(self.connections)]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for worker in workers:
+                worker.cancel()
+            raise
+
+    async def _stream_body(self, url, response, file_path, range_map, on_progress, cancelled):
+        import aiofiles
+
+        if response.status != 200:
+            raise Exception(f"HTTP {response.status}: Failed to download {url}")
+        total = int(response.headers.get("content-length", 0))
+        range_map.set_total(total)
+        downloaded = 0
+        async with aiofiles.open(file_path, "wb") as file:
+            async for chunk in response.content.iter_chunked(512 * 512):
+                if cancelled():
+                    return
+                await file.write(chunk)
+                await file.flush()
+                range_map.add(downloaded, downloaded + len(chunk))
+                downloaded += len(chunk)
+                if on_progress:
+                    on_progress(downloaded, total)
+
+
+class StreamServer:
+    """
+    Local HTTP server for files that are still downloading.
+
+    Supports Range requests and blocks a request until the bytes it asks
+    for are on disk, so a video player can start on the head of the file
+    and seek while the rest arrives.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, wait_timeout: float = 120.0):
+        self.files: Dict[str, Tuple[str, RangeMap]] = {}
+        self.wait_timeout = wait_timeout
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server._serve(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def register(self, file_path: str, range_map: RangeMap) -> str:
+        """Expose a file; returns the URL a player can open."""
+        token = secrets.token_urlsafe(8)
+        self.files[token] = (file_path, range_map)
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/{token}/{os.path.basename(file_path)}"
+
+    def unregister(self, file_path: str):
+        for token, (path, _) in list(self.files.items()):
+            if path == file_path:
+                del self.files[token]
+
+    def _serve(self, request: BaseHTTPRequestHandler):
+        token = request.path.lstrip("/").split("/", 1)[0]
+        if token not in self.files:
+            request.send_error(404)
+            return
+        file_path, range_map = self.files[token]
+
+        total = range_map.wait_total(self.wait_timeout)
+        if total is None:
+            request.send_error(503, range_map.failed or "Download has not started")
+            return
+
+        start, end = 0, total - 1
+        match = re.match(r"bytes=(\d*)-(\d*)", request.headers.get("Range", ""))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), total - 1) if match.group(2) else total - 1
+            else:
+                start = max(total - int(match.group(2)), 0)
+            if start > end:
+                request.send_response(416)
+                request.send_header("Content-Range", f"bytes */{total}")
+                request.end_headers()
+                return
+            request.send_response(206)
+            request.send_header("Content-Range", f"bytes {start}-{end}/{total}")
+        else:
+            request.send_response(200)
+        request.send_header("Accept-Ranges", "bytes")
+        request.send_header("Content-Type", "video/mp4")
+        request.send_header("Content-Length", str(end - start + 1))
+        request.end_headers()
+
+        try:
+            with open(file_path, "rb") as file:
+                position = start
+                while position <= end:
+                    block_end = min(position + SERVE_BLOCK, end + 1)
+                    if not range_map.wait_for(position, block_end, self.wait_timeout):
+                        return  # Download failed or stalled; the player will retry
+                    file.seek(position)
+                    request.wfile.write(file.read(block_end - position))
+                    position = block_end
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Player closed the connection, e.g. after a seek
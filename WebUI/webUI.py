@@ -1,35 +1,170 @@
 import streamlit as st
 import json
-from bs4 import BeautifulSoup
-import requests
 import asyncio
 import os
-import aiohttp
-import aiofiles
 from dataclasses import dataclass, asdict
-from typing import List, Dict, Optional
+from typing import TYPE_CHECKING, Any, Coroutine, Iterable, List, Dict, Optional
 from enum import Enum
 from datetime import datetime
 import re
+import sys
+import threading
 import time
-import psutil
 import math
 from pathlib import Path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the shared core package
+from batch_store import BatchStore, EpisodeSet
+from catalog import AnimeCatalog
+from prefetch import PreviewPrefetcher, ThumbnailCache
+from core.links import LinkExpired, check_expired, link_is_stale
+from core.politeness import BandwidthLimiter, HostScheduler, host_policies
+from core.config import Config, ConfigError, ConfigWatcher
+from core.metrics import (ACTIVE_WORKERS, BYTES_DOWNLOADED, CACHE_REQUESTS, DOWNLOAD_THROUGHPUT, DOWNLOADS,
+                          QUEUE_DEPTH, REGISTRY, RESOLVE_SECONDS, RETRIES, MetricsServer)
+from core.manifest import COMPLETE, CORRUPT, PARTIAL, get_manifest
+from core.preflight import BatchProgress, DiskAdmission, check_space, format_size
+from core.sources import (ParsePool, SlowSource, Source, ThroughputMonitor, parse_download_page, parse_episode_page,
+                          rank_sources)
+from singleflight import SingleFlight, link_or_copy
+from core.scheduler import DEFAULT_PRIORITY, WATCH_NEXT_PRIORITY, DownloadPriorityQueue, async_probe_size
+from streaming import RangeMap, SequentialDownloader, StreamServer
+from core.tracing import TRACER, span
+
+# Heavy or optional modules (aiohttp, bs4, requests, psutil, fault injection, cassettes) are imported
+# where they are used, so a cold start only pays for what the first page needs
+if TYPE_CHECKING:
+    import aiohttp
+    from core.cassettes import Cassette
+    from core.faults import FaultPlan
+
+SETUP_PATH = "../WebUI/setup.json"
+
+
+@st.cache_resource
+def get_config_watcher() -> ConfigWatcher:
+    """setup.json for the whole process, reloaded when it changes on disk or is saved from the settings page."""
+    return ConfigWatcher(SETUP_PATH).start()
+
+
+def settings() -> Config:
+    """
+    The current settings. The globals configure() sets are fixed for one script run, but
+    downloads outlive the run that started them, so the engine reads these.
+    """
+    return get_config_watcher().current
+
+
+# The settings globals are set by configure() at the start of every script run, so importing this
+# module (the spawned parser processes, the benchmarks) reads no settings and starts nothing
+setup = polite = None
+preview_prefetch_count = 5
+
+
+@st.cache_resource
+def get_fault_plan() -> Optional["FaultPlan"]:
+    """Faults injected into every request when fault_plan (a plan file) is set, for resilience testing."""
+    if not setup.get("fault_plan"):
+        return None
+    from core.faults import load_fault_plan
+    return load_fault_plan(setup["fault_plan"])
+
+
+@st.cache_resource
+def get_cassette() -> Optional["Cassette"]:
+    """Recorded scraping traffic for offline profiling; cassette_mode is "once", "record" or "replay"."""
+    if not setup.get("cassette"):
+        return None
+    from core.cassettes import load_cassette
+    return load_cassette(setup["cassette"], setup.get("cassette_mode", "once"))
+
+
+@st.cache_resource
+def get_host_scheduler() -> HostScheduler:
+    """Process-wide per-host limits, so budgets survive reruns and are shared by sessions."""
+    transport = None
+    if get_fault_plan():
+        from core.faults import faulty_session
+        transport = faulty_session(get_fault_plan())
+    if get_cassette():
+        from core.cassettes import cassette_session
+        transport = cassette_session(get_cassette(), transport)
+    scheduler = HostScheduler(host_policies(setup), session=transport)
+
+    def apply(old: Config, new: Config, changed):
+        for kind, policy in host_policies(new).items():
+            scheduler.set_policy(kind, policy)
+    get_config_watcher().subscribe(apply, {"scrape_concurrency", "scrape_rate", "cdn_concurrency", "max_threads"})
+    return scheduler
+
+
+@st.cache_resource
+def get_bandwidth_limiter() -> BandwidthLimiter:
+    """One cap (max_download_kbps) on all downloads together, off when unset; follows setup.json live."""
+    limiter = BandwidthLimiter(setup.bandwidth_cap)
+    get_config_watcher().subscribe(lambda old, new, changed: limiter.set_rate(new.bandwidth_cap),
+                                   {"max_download_kbps"})
+    return limiter
+
+
+@st.cache_resource
+def get_disk_admission() -> DiskAdmission:
+    """Process-wide disk reservations, so concurrent sessions see each other's downloads."""
+    return DiskAdmission(setup.get("disk_margin_mb", 512) * 1024 * 1024)
+
+
+@st.cache_resource
+def get_single_flight() -> SingleFlight:
+    """
+    Scrapes and episode transfers in flight in this process. Sessions that ask
+    for the same page, episode links or episode at the same time share one.
+    """
+    return SingleFlight()
+
+
+def get_page(url: str) -> str:
+    """GET a site page; concurrent requests for the same URL share one fetch."""
+    text, joined = get_single_flight().do(("page", url), polite.get_text, url)
+    CACHE_REQUESTS.inc(cache="in_flight", result="hit" if joined else "miss")
+    return text
+
 
-st.set_page_config(
-    page_title="Anime Downloader",
-    page_icon="⛩️"
-)
+@st.cache_resource
+def get_parse_pool() -> ParsePool:
+    """Where episode pages are parsed: worker processes by default (parse_mode), so the download loop never stalls."""
+    return ParsePool(setup.get("parse_mode", "process"), setup.get("parse_workers", 2))
 
-with open("../WebUI/setup.json", "r") as f:
-    setup = json.load(f)
 
-base_url = setup["gogoanime_main"]
-download_folder = setup["downloads"]
-captcha_v3 = setup["captcha_v3"]
-download_quality = int(setup["download_quality"])
-max_threads = setup["max_threads"]
-preview_status = setup["preview_status"]
+@st.cache_resource
+def get_stream_server() -> StreamServer:
+    """Local server that plays episodes while they download."""
+    return StreamServer(port=setup.get("stream_port", 0))
+
+
+@st.cache_resource
+def get_metrics_server() -> Optional[MetricsServer]:
+    """/metrics and /metrics.json for the whole process, when metrics_port is set."""
+    return MetricsServer(port=setup["metrics_port"]) if setup.get("metrics_port") else None
+
+
+def configure():
+    """Read the settings for this script run and start the process-wide servers; main() calls this first."""
+    global setup, base_url, download_folder, max_threads, preview_status, queue_policy, polite
+    global stream_while_downloading, episode_size_estimate, trace_file
+    setup = settings()
+    base_url = setup.base_url
+    download_folder = setup.download_folder
+    max_threads = setup.max_threads
+    preview_status = setup.get("preview_status", "No Preview")
+    queue_policy = setup.get("queue_policy", "fifo")  # "fifo" or "sjf" (shortest job first)
+    polite = get_host_scheduler()
+    stream_while_downloading = setup.get("stream_while_downloading", False)
+    # link_max_age, max_link_refreshes, min/max_quality, min_speed_kbps and source_error_limit are read
+    # through settings() when used, so they apply to downloads already running
+    episode_size_estimate = setup.get("episode_size_mb", 300) * 1024 * 1024  # for episodes not probed yet
+    trace_file = setup.get("trace_file")  # write a Chrome/Perfetto trace after every download run, off when unset
+    if trace_file:
+        TRACER.enable()
+    get_metrics_server()
 
 
 class DownloadState(Enum):
@@ -41,6 +176,9 @@ class DownloadState(Enum):
     CANCELLED = "cancelled"
 
 
+FINISHED = (DownloadState.COMPLETED, DownloadState.ERROR, DownloadState.CANCELLED)
+
+
 @dataclass
 class DownloadProgress:
     total_bytes: int
@@ -50,16 +188,36 @@ class DownloadProgress:
 
 
 class DownloadTask:
-    def __init__(self, url: str, filename: str, folder: str, episode: int):
-        self.url = url
+    def __init__(self, url: Optional[str], filename: str, folder: str, episode: int,
+                 priority: int = DEFAULT_PRIORITY, episode_url: Optional[str] = None, title: Optional[str] = None,
+                 sources: Optional[List[Source]] = None, resume: bool = False,
+                 owner: Optional[str] = None, batch: Optional[BatchProgress] = None):
+        self.url = url  # None until `episode_url` is resolved, when the episode starts
+        self.owner = owner  # the browser session that queued it
+        self.batch = batch  # the batch it belongs to, for the ETA
+        self.resume = resume  # continue a partial file recorded in the folder manifest
+        self.sources = sources or ([Source(0, url)] if url else [])  # ranked candidates, `url` is the one in use
+        self.quality = self.sources[0].quality if self.sources else None
+        self.resolved_at = time.time()
+        self.episode_url = episode_url  # episode page, to resolve `url` again once it expires
+        self.identity = episode_url or url  # key in the folder manifest
+        self.title = title
         self.filename = filename
         self.folder = folder
         self.episode = episode
+        self.priority = priority
+        self.size: Optional[int] = None
+        self.stream_url: Optional[str] = None
+        self.range_map: Optional[RangeMap] = None
+        self.reservation = None
         self.file_path = os.path.join(folder, filename)
         self.state = DownloadState.QUEUED
         self.progress = DownloadProgress(0, 0, 0, 0)
         self.start_time = None
+        self.queued_at = TRACER.now() if TRACER.enabled else None
         self.status_text = None
+        self.progress_bar = None
+        self.message = None  # (st method, text, bytes downloaded when it was set)
         self.cancel_event = asyncio.Event()
         self.pause_event = asyncio.Event()
         self.pause_event.set()  # Initially not paused
@@ -88,15 +246,28 @@ class DownloadTask:
             self.status_text = st.empty()
             self.progress_bar = st.progress(0)
 
+    def notify(self, level: str, text: str):
+        """
+        Show `text` with st.<level> (info, success, error) in the status line.
+        Safe from the engine thread: it is drawn by the owner's next
+        update_progress(), and gives way to the progress once more bytes arrive.
+        """
+        self.message = (level, text, self.progress.downloaded_bytes)
+
     def update_progress(self):
+        """Draw the progress; call from the script thread of the session that owns the task."""
         if self.progress_bar and self.status_text:
             self.progress_bar.progress(int(self.progress.percentage) / 100)
-            self.status_text.text(
-                f"Episode {self.episode}: {self.progress.percentage:.1f}% "
-                f"({self.progress.downloaded_bytes / 1024 / 1024:.1f} MB / "
-                f"{self.progress.total_bytes / 1024 / 1024:.1f} MB) - "
-                f"Speed: {self.progress.speed / 1024 / 1024:.1f} MB/s"
-            )
+            if self.message and (self.state in FINISHED or self.message[2] == self.progress.downloaded_bytes):
+                getattr(self.status_text, self.message[0])(self.message[1])
+            else:
+                self.status_text.text(
+                    f"Episode {self.episode}: {self.progress.percentage:.1f}% "
+                    f"({self.progress.downloaded_bytes / 1024 / 1024:.1f} MB / "
+                    f"{self.progress.total_bytes / 1024 / 1024:.1f} MB) - "
+                    f"Speed: {self.progress.speed / 1024 / 1024:.1f} MB/s"
+                    + (f" - Watch: {self.stream_url}" if self.stream_url else "")
+                )
 
             # Update the download page manager
             if 'download_page_manager' in st.session_state:
@@ -123,27 +294,69 @@ class DownloadTask:
 
 
 class DownloadManager:
-    def __init__(self, max_concurrent: int = 3):
+    def __init__(self, max_concurrent: int = 3, policy: Optional[str] = None, sequential: Optional[bool] = None):
         self.max_concurrent = max_concurrent
+        # queue_policy and stream_while_downloading from setup.json unless given
+        self.sequential = settings().get("stream_while_downloading", False) if sequential is None else sequential
         self.active_downloads: Dict[str, DownloadTask] = {}
-        self.download_queue = asyncio.Queue()
-        self.session: Optional[aiohttp.ClientSession] = None
+        self.download_queue = DownloadPriorityQueue(policy or settings().get("queue_policy", "fifo"))
+        QUEUE_DEPTH.set_function(self.download_queue.qsize)
+        self.session: Optional["aiohttp.ClientSession"] = None
         self.running = True
         self.worker_tasks = []
+        self.workers_started = 0
+        self.retiring = 0  # workers to stop once they finish their current download
+        self.unsubscribe = None
+        self.probe_tasks = set()
 
     async def start(self):
         if self.session is None:
+            import aiohttp
             self.session = aiohttp.ClientSession()
+            if get_fault_plan():
+                from core.faults import FaultInjectingClientSession
+                self.session = FaultInjectingClientSession(self.session, get_fault_plan())
+            if get_cassette():
+                from core.cassettes import CassetteClientSession
+                self.session = CassetteClientSession(self.session, get_cassette())
 
         # Create worker tasks but don't wait for them
-        self.worker_tasks = [
-            asyncio.create_task(self._worker())
-            for _ in range(self.max_concurrent)
-        ]
+        self.worker_tasks = []
+        self.retiring = 0
+        self.resize(self.max_concurrent)
+
+        # max_threads saved in the settings page (or edited in setup.json) applies to this run
+        loop = asyncio.get_running_loop()
+        self.unsubscribe = get_config_watcher().subscribe(
+            lambda old, new, changed: loop.call_soon_threadsafe(self.resize, new.max_threads), {"max_threads"})
+
+    def resize(self, max_concurrent: int):
+        """
+        Change the number of workers while downloads run. Extra workers start
+        right away; surplus ones stop after their current download, so
+        nothing in flight is dropped. Call on the manager's event loop.
+        """
+        self.max_concurrent = max_concurrent
+        self.worker_tasks = [worker for worker in self.worker_tasks if not worker.done()]
+        if not self.running:
+            return
+        surplus = len(self.worker_tasks) - self.retiring - max_concurrent
+        if surplus >= 0:
+            self.retiring += surplus
+            return
+        cancelled_retirements = min(self.retiring, -surplus)
+        self.retiring -= cancelled_retirements
+        for _ in range(-surplus - cancelled_retirements):
+            self.worker_tasks.append(asyncio.create_task(self._worker(),
+                                                         name=f"download-worker-{self.workers_started}"))
+            self.workers_started += 1
 
     async def stop(self):
         """Stop the download manager and clean up"""
         self.running = False
+        if self.unsubscribe:
+            self.unsubscribe()
+            self.unsubscribe = None
 
         # Cancel all remaining downloads
         while not self.download_queue.empty():
@@ -154,6 +367,9 @@ class DownloadManager:
             except asyncio.QueueEmpty:
                 break
 
+        for probe_task in self.probe_tasks:
+            probe_task.cancel()
+
         # Cancel all worker tasks
         for worker_task in self.worker_tasks:
             worker_task.cancel()
@@ -169,19 +385,58 @@ class DownloadManager:
 
         self.worker_tasks = []
 
-    async def add_download(self, url: str, filename: str, folder: str, episode: int) -> DownloadTask:
-        """Add a new download task to the queue"""
-        task = DownloadTask(url, filename, folder, episode)
-        task.setup_progress_ui()
+    async def add_download(self, url: Optional[str], filename: str, folder: str, episode: int,
+                           priority: int = DEFAULT_PRIORITY, episode_url: Optional[str] = None,
+                           title: Optional[str] = None, sources: Optional[List[Source]] = None,
+                           resume: bool = False, owner: Optional[str] = None,
+                           batch: Optional[BatchProgress] = None) -> DownloadTask:
+        """
+        Add a new download task to the queue; its progress UI is set up by the
+        session that owns it. With `url` None, `episode_url` is resolved when
+        the download starts.
+        """
+        task = DownloadTask(url, filename, folder, episode, priority, episode_url, title, sources, resume,
+                            owner, batch)
         # Now we await putting the task in the queue
         await self.download_queue.put(task)
         self.active_downloads[task.file_path] = task
+
+        if self.download_queue.policy == "sjf" and (task.url or task.episode_url):
+            # Size arrives after queueing; the queue reorders in place
+            probe_task = asyncio.create_task(self._probe_size(task))
+            self.probe_tasks.add(probe_task)
+            probe_task.add_done_callback(self.probe_tasks.discard)
         return task
 
+    async def _probe_size(self, task: DownloadTask):
+        if not task.sources:
+            # Resolved ahead for the probe; the links are used only if still fresh when the episode starts
+            try:
+                sources, title = await resolve_sources_async(self.session, task.episode_url, task.title)
+            except Exception:
+                return  # resolved again, and reported, when the episode starts
+            if task.sources or task.state != DownloadState.QUEUED:
+                return
+            self._use_sources(task, sources, title)
+        size = await async_probe_size(self.session, task.url, polite)
+        if size:
+            self.download_queue.set_size(lambda queued: queued is task, size)
+
+    def set_priority(self, file_path: str, priority: int) -> bool:
+        """Reprioritize a queued download; returns False if it is no longer queued"""
+        return self.download_queue.set_priority(lambda queued: queued.file_path == file_path, priority) > 0
+
+    def promote(self, file_path: str) -> bool:
+        """Download this episode next ("watch next")"""
+        return self.download_queue.promote(lambda queued: queued.file_path == file_path) > 0
+
     async def _worker(self):
         """Worker coroutine that processes downloads from the queue"""
         try:
             while self.running:
+                if self.retiring:
+                    self.retiring -= 1
+                    break
                 try:
                     # Use timeout to allow checking self.running periodically
                     task: DownloadTask = await asyncio.wait_for(
@@ -196,16 +451,24 @@ class DownloadManager:
                 if task.state == DownloadState.CANCELLED:
                     self.download_queue.task_done()
                     continue
+                if task.queued_at is not None:
+                    TRACER.complete("queue_wait", task.queued_at, TRACER.now(),
+                                    task=task.identity, episode=task.episode)
 
                 try:
                     while task.state == DownloadState.PAUSED:
                         await task.pause_event.wait()
 
-                    await self._process_download(task)
+                    ACTIVE_WORKERS.inc()
+                    try:
+                        with span("episode", task=task.identity, episode=task.episode):
+                            await self._process_shared(task)
+                    finally:
+                        ACTIVE_WORKERS.dec()
                 except Exception as e:
+                    DOWNLOADS.inc(result="failed")
                     task.state = DownloadState.ERROR
-                    if task.status_text:
-                        task.status_text.error(f"Error downloading episode {task.episode}: {str(e)}")
+                    task.notify("error", f"Error downloading episode {task.episode}: {str(e)}")
                 finally:
                     self.download_queue.task_done()
         except asyncio.CancelledError:
@@ -213,6 +476,84 @@ class DownloadManager:
         except Exception as e:
             print(f"Worker error: {str(e)}")
 
+    async def _resolve(self, task: DownloadTask):
+        """
+        Resolve the episode page for signed links. The first resolution picks
+        the sources and names the file; later ones fetch fresh links for the
+        current quality.
+        """
+        with span("resolve", task=task.identity):
+            sources, title = await resolve_sources_async(self.session, task.episode_url, task.title)
+        if not task.sources:
+            self._use_sources(task, sources, title)
+            return
+        task.sources = sources
+        task.resolved_at = time.time()
+        same_quality = [source for source in task.sources if source.quality == task.quality]
+        if not same_quality:
+            raise Exception(f"{task.quality}p is no longer offered")
+        task.url = same_quality[0].url
+
+    def _use_sources(self, task: DownloadTask, sources: List[Source], title: str):
+        """
+        Give a task queued unresolved its sources. A partial file is continued
+        when its quality is still offered; otherwise the file is named after
+        the title on the links page.
+        """
+        if task.resume:
+            state, entry = get_manifest(task.folder).check(task.identity)
+            task.resume = state == PARTIAL and any(source.quality == entry["quality"] for source in sources)
+            if task.resume:
+                sources = sorted(sources, key=lambda source: source.quality != entry["quality"])
+        if not task.resume:
+            self._rename(task, f"{title}_episode_{task.episode}.mp4")
+        task.title = title
+        task.sources = sources
+        task.url, task.quality = sources[0].url, sources[0].quality
+        task.resolved_at = time.time()
+
+    def _rename(self, task: DownloadTask, filename: str):
+        self.active_downloads.pop(task.file_path, None)
+        task.filename = filename
+        task.file_path = os.path.join(task.folder, filename)
+        self.active_downloads[task.file_path] = task
+
+    async def _process_shared(self, task: DownloadTask):
+        """
+        Download the episode, or, when another job (in any session) is
+        already downloading the same episode, wait for it and hard link
+        (or copy) its file into this task's folder instead of downloading
+        it a second time.
+        """
+        while True:
+            result, joined = await get_single_flight().do_async(("episode", task.identity), self._transfer, task)
+            if not joined:
+                return
+            if result is not None:
+                break
+            # The other job was cancelled; start over, downloading it here if nobody else is
+
+        file_path, quality, digest = result
+        task.quality = quality
+        if not task.sources and not task.resume:
+            self._rename(task, os.path.basename(file_path))  # never resolved here, named like the file it links
+        if os.path.abspath(file_path) != os.path.abspath(task.file_path):
+            os.makedirs(task.folder, exist_ok=True)
+            with span("link", cat="disk"):
+                await asyncio.to_thread(link_or_copy, file_path, task.file_path)
+        get_manifest(task.folder).completed(task.identity, task.file_path, quality, digest)
+        DOWNLOADS.inc(result="deduplicated")
+        task.state = DownloadState.COMPLETED
+        task.notify("success", f"Episode {task.episode} was downloaded once and linked from {file_path}")
+
+    async def _transfer(self, task: DownloadTask) -> Optional[tuple]:
+        """(file path, quality, digest) once the episode is on disk, None when the download was cancelled."""
+        await self._process_download(task)
+        if task.state != DownloadState.COMPLETED:
+            return None
+        entry = get_manifest(task.folder).entries.get(task.identity) or {}
+        return task.file_path, task.quality, entry.get("digest")
+
     async def _process_download(self, task: DownloadTask):
         """Process a single download task"""
         if not os.path.exists(task.folder):
@@ -222,28 +563,184 @@ class DownloadManager:
         task.state = DownloadState.DOWNLOADING
 
         try:
-            async with self.session.get(task.url) as response:
-                if response.status != 200:
-                    raise Exception(f"HTTP {response.status}: Failed to download {task.url}")
+            # Episodes are queued unresolved so their signed links are fresh when the download starts;
+            # links resolved ahead (by the size probe) may have expired while the episode waited
+            if not task.sources or (task.episode_url and link_is_stale(task.url, task.resolved_at,
+                                                                        settings().link_max_age)):
+                await self._resolve(task)
+
+            known_size = task.size
+            if not known_size:
+                with span("probe_size", cat="network"):
+                    known_size = await async_probe_size(self.session, task.url, polite)
+            size = known_size or episode_size_estimate
+            if task.batch:
+                task.batch.expect(task.file_path, size)
+            existing = os.path.getsize(task.file_path) if os.path.exists(task.file_path) else 0
+            manifest = get_manifest(task.folder)
+            # Copied into the folder or downloaded before it had a manifest
+            adopted = False
+            if not task.resume and known_size and existing == known_size:
+                with span("hash", cat="disk"):
+                    adopted = await asyncio.to_thread(manifest.adopt, task.identity, task.file_path,
+                                                      known_size, task.quality)
+            if adopted:
+                task.state = DownloadState.COMPLETED
+                DOWNLOADS.inc(result="skipped")
+                task.notify("success", f"Episode {task.episode} is already downloaded")
+                return
+            admission = get_disk_admission()
+            task.reservation = admission.try_reserve(task.folder, max(size - existing, 0))
+            if task.reservation is None:
+                task.notify("info", f"Episode {task.episode} is waiting for disk space...")
+                with span("disk_wait", cat="disk"):
+                    task.reservation = await admission.async_reserve(task.folder, max(size - existing, 0))
+            try:
+                downloaded = await self._download_sources(task)
+            finally:
+                task.reservation.release()
+
+            if task.state == DownloadState.CANCELLED:
+                return
+
+            if downloaded == 0:
+                raise Exception("Downloaded file is empty")
+
+            # Hashing reads the whole file, keep it off the event loop
+            with span("hash", cat="disk"):
+                await asyncio.to_thread(manifest.completed, task.identity, task.file_path, task.quality)
+            DOWNLOADS.inc(result="completed")
+            DOWNLOAD_THROUGHPUT.observe(downloaded / max((datetime.now() - task.start_time).total_seconds(), 1e-3))
+            task.state = DownloadState.COMPLETED
+            task.notify("success", f"Episode {task.episode} downloaded successfully in {task.quality}p!")
+
+        except Exception as e:
+            if task.range_map is not None:
+                task.range_map.fail(str(e))
+                get_stream_server().unregister(task.file_path)
+            # If download fails, remove the empty file; partial ones stay in the manifest to resume
+            if os.path.exists(task.file_path) and os.path.getsize(task.file_path) == 0:
+                os.remove(task.file_path)
+            task.state = DownloadState.ERROR
+            task.notify("error", f"Download error for episode {task.episode}: {str(e)}")
+            raise
 
-                total_size = int(response.headers.get('content-length', 0))
+    def _written(self, task: DownloadTask, size: int):
+        """Account bytes written to disk (negative when discarded) for disk reservations and the ETA"""
+        if task.reservation is not None:
+            task.reservation.consume(size)
+        if task.batch:
+            task.batch.add(size)
+        if size > 0:
+            BYTES_DOWNLOADED.inc(size)
+
+    async def _download_sources(self, task: DownloadTask) -> int:
+        """
+        Download from the task's ranked sources, moving to the next one when
+        the current source stays below min_speed or fails source_error_limit
+        times in a row. Expired links are resolved again without giving up
+        the source. Returns the bytes downloaded.
+        """
+        errors = []
+        tried = set()
+        resume = task.resume
+        while True:
+            tried.add(task.quality)
+            get_manifest(task.folder).started(task.identity, task.file_path, task.quality,
+                                              task.size if not errors else None)
+            failures = refreshes = 0
+            while True:
+                try:
+                    if self.sequential:
+                        return await self._download_sequential(task)
+                    return await self._download_direct(task, resume)
+                except LinkExpired:
+                    RETRIES.inc(error="LinkExpired")
+                    if not task.episode_url or refreshes >= settings().max_link_refreshes:
+                        errors.append(f"{task.quality}p: link kept expiring")
+                        break
+                    refreshes += 1
+                    task.notify("info", f"Link for episode {task.episode} expired, resolving it again...")
+                    try:
+                        await self._resolve(task)
+                    except Exception as e:
+                        errors.append(f"{task.quality}p: {e}")
+                        break
+                except SlowSource as e:
+                    RETRIES.inc(error="SlowSource")
+                    errors.append(f"{task.quality}p: {e}")
+                    break
+                except Exception as e:
+                    RETRIES.inc(error=type(e).__name__)
+                    failures += 1
+                    if failures >= settings().source_error_limit:
+                        errors.append(f"{task.quality}p: {e}")
+                        break
+                resume = True
+
+            remaining = [source for source in task.sources if source.quality not in tried]
+            if not remaining:
+                raise Exception("No usable source: " + "; ".join(errors))
+            # A different quality is a different file, start it from scratch
+            task.url, task.quality = remaining[0].url, remaining[0].quality
+            resume = False
+            if task.range_map is not None:
+                self._written(task, -task.range_map.covered())
+                task.range_map.reset()
+            elif os.path.exists(task.file_path):
+                self._written(task, -os.path.getsize(task.file_path))
+            task.notify("info", f"Switching episode {task.episode} to {task.quality}p ({errors[-1]})")
+
+    async def _download_direct(self, task: DownloadTask, resume: bool = False) -> int:
+        """
+        Stream the file to disk. With `resume`, continue after the bytes
+        already written when the CDN honours Range requests.
+        """
+        import aiofiles
+
+        downloaded = os.path.getsize(task.file_path) if resume and os.path.exists(task.file_path) else 0
+        headers = {"Range": f"bytes={downloaded}-"} if downloaded else {}
+        with span("transfer", cat="network", quality=task.quality, offset=downloaded) as transfer:
+            async with polite.async_open(self.session, "GET", task.url, "cdn", headers=headers) as response:
+                check_expired(response.status, task.url)
+                if response.status == 206:
+                    total_size = downloaded + int(response.headers.get('content-length', 0))
+                elif response.status == 200:
+                    self._written(task, -downloaded)
+                    downloaded = 0  # Range ignored, start over
+                    total_size = int(response.headers.get('content-length', 0))
+                else:
+                    raise Exception(f"HTTP {response.status}: Failed to download {task.url}")
                 task.progress.total_bytes = total_size
-                downloaded = 0
+                started_at = downloaded
+                monitor = ThroughputMonitor(settings().min_speed)
+                bandwidth = get_bandwidth_limiter()
+                timed = TRACER.enabled  # disk time is only measured for the trace
+                write_time = 0.0
 
-                async with aiofiles.open(task.file_path, 'wb') as file:
+                async with aiofiles.open(task.file_path, 'ab' if downloaded else 'wb') as file:
                     async for chunk in response.content.iter_chunked(512 * 512):
                         if task.cancel_event.is_set():
                             task.state = DownloadState.CANCELLED
-                            return
+                            return downloaded
 
                         if task.pause_event is not None:
                             await task.pause_event.wait()
 
-                        await file.write(chunk)
+                        if timed:
+                            write_started = time.perf_counter()
+                            await file.write(chunk)
+                            write_time += time.perf_counter() - write_started
+                        else:
+                            await file.write(chunk)
                         downloaded += len(chunk)
+                        self._written(task, len(chunk))
+                        await bandwidth.consume(len(chunk))
+                        if not bandwidth.rate:  # a capped source is slow on purpose
+                            monitor.update(downloaded - started_at)
 
                         elapsed_time = (datetime.now() - task.start_time).total_seconds()
-                        speed = downloaded / elapsed_time if elapsed_time > 0 else 0
+                        speed = (downloaded - started_at) / elapsed_time if elapsed_time > 0 else 0
                         percentage = (downloaded / total_size * 100) if total_size > 0 else 0
 
                         task.progress = DownloadProgress(
@@ -252,24 +749,48 @@ class DownloadManager:
                             speed=speed,
                             percentage=percentage
                         )
-                        task.update_progress()
+            transfer.set(bytes=downloaded - started_at, status=response.status,
+                         disk_write_ms=round(write_time * 1000, 1))
+            return downloaded
 
-            if downloaded == 0:
-                raise Exception("Downloaded file is empty")
+    async def _download_sequential(self, task: DownloadTask) -> int:
+        """
+        Download the head (and moov box) first and serve the partial file
+        locally, so the episode can be watched while it downloads. The range
+        map is kept on the task so a refreshed link resumes the same file.
+        """
+        if task.range_map is None:
+            task.range_map = RangeMap()
+            task.stream_url = get_stream_server().register(task.file_path, task.range_map)
+        range_map = task.range_map
+        monitor = ThroughputMonitor(settings().min_speed)
+        resumed_from = range_map.covered()
+
+        written = [resumed_from]
+
+        def on_progress(downloaded: int, total: int):
+            self._written(task, downloaded - written[0])
+            written[0] = downloaded
+            monitor.update(downloaded - resumed_from)
+            elapsed_time = (datetime.now() - task.start_time).total_seconds()
+            task.progress = DownloadProgress(
+                total_bytes=total,
+                downloaded_bytes=downloaded,
+                speed=downloaded / elapsed_time if elapsed_time > 0 else 0,
+                percentage=(downloaded / total * 100) if total > 0 else 0
+            )
 
-            if task.state != DownloadState.CANCELLED:
-                task.state = DownloadState.COMPLETED
-                if task.status_text:
-                    task.status_text.success(f"Episode {task.episode} downloaded successfully!")
+        downloader = SequentialDownloader(
+            self.session,
+            opener=lambda session, method, url, **kwargs: polite.async_open(session, method, url, "cdn", **kwargs)
+        )
+        with span("transfer", cat="network", quality=task.quality, sequential=True) as transfer:
+            await downloader.download(task.url, task.file_path, range_map, on_progress, task.cancel_event.is_set)
+            transfer.set(bytes=range_map.covered() - resumed_from)
 
-        except Exception as e:
-            # If download fails, remove the empty file
-            if os.path.exists(task.file_path):
-                os.remove(task.file_path)
-            task.state = DownloadState.ERROR
-            if task.status_text:
-                task.status_text.error(f"Download error for episode {task.episode}: {str(e)}")
-            raise
+        if task.cancel_event.is_set():
+            task.state = DownloadState.CANCELLED
+        return range_map.covered()
 
     # async def pause_download(self, file_path: str):
     #     """Pause a download"""
@@ -294,15 +815,108 @@ class DownloadManager:
     #                 task.status_text.info(f"Resumed download for episode {task.episode}")
 
 
+class DownloadEngine:
+    """
+    The one DownloadManager of the server, running on an event loop in a
+    thread of its own. Browser sessions queue episodes on it and draw only
+    the tasks they own, so max_threads, the bandwidth cap and the per-host
+    limits hold for every user together instead of for each tab. Downloads
+    keep running when the tab that queued them closes.
+    """
+
+    def __init__(self, max_concurrent: int):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="download-engine", daemon=True)
+        self.thread.start()
+        self.manager = DownloadManager(max_concurrent=max_concurrent)
+        self.run(self.manager.start())
+        self.jobs: Dict[str, List[DownloadTask]] = {}  # owner -> tasks it queued and has not released
+        self.lock = threading.Lock()
+
+    def run(self, coroutine: Coroutine) -> Any:
+        """Run `coroutine` on the engine loop and wait for it (from any other thread)."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def call(self, coroutine: Coroutine) -> Any:
+        """Run `coroutine` on the engine loop and await it from another event loop."""
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, self.loop))
+
+    async def add_download(self, owner: str, **kwargs) -> DownloadTask:
+        """Queue an episode for `owner` (a session id); takes DownloadManager.add_download's arguments."""
+        task = await self.call(self.manager.add_download(owner=owner, **kwargs))
+        with self.lock:
+            self.jobs.setdefault(owner, []).append(task)
+        return task
+
+    def tasks(self, owner: str) -> List[DownloadTask]:
+        with self.lock:
+            return list(self.jobs.get(owner, []))
+
+    def queued(self, owner: str) -> List[DownloadTask]:
+        """`owner`'s tasks still waiting for a worker, in the order they will start."""
+        async def snapshot() -> List[DownloadTask]:
+            return [task for task in self.manager.download_queue.snapshot() if task.owner == owner]
+        return self.run(snapshot())
+
+    def promote(self, owner: str, episodes: Iterable[int]) -> int:
+        """Download `owner`'s queued `episodes` next without queueing them again; returns how many moved."""
+        wanted = set(episodes)
+
+        async def promote() -> int:
+            return sum(self.manager.promote(task.file_path) for task in self.manager.download_queue.snapshot()
+                       if task.owner == owner and task.episode in wanted)
+        return self.run(promote())
+
+    def release(self, owner: str):
+        """Forget the finished tasks of `owner` once its page no longer shows them."""
+        with self.lock:
+            remaining = [task for task in self.jobs.get(owner, []) if task.state not in FINISHED]
+            if remaining:
+                self.jobs[owner] = remaining
+            else:
+                self.jobs.pop(owner, None)
+
+    def summary(self) -> Dict[str, int]:
+        """Unfinished tasks per owner."""
+        with self.lock:
+            counts = {owner: sum(task.state not in FINISHED for task in tasks) for owner, tasks in self.jobs.items()}
+        return {owner: count for owner, count in counts.items() if count}
+
+    def stop(self):
+        """Stop the manager and the engine loop."""
+        self.run(self.manager.stop())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+@st.cache_resource
+def get_engine() -> DownloadEngine:
+    """Process-wide download engine shared by every browser session."""
+    return DownloadEngine(settings().max_threads)
+
+
+def session_id() -> str:
+    """Id of the browser session running this script, the owner of the downloads it queues."""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "local"
+
+
 @dataclass
 class AnimeDownloadItem:
     name: str
     url: str
-    episodes: List[int]
+    episodes: EpisodeSet
     total_episodes: int
 
+    def __post_init__(self):
+        self.episodes = EpisodeSet(self.episodes)
+
     def to_dict(self):
-        return asdict(self)
+        data = asdict(self)
+        data['episodes'] = list(self.episodes)
+        return data
 
     @classmethod
     def from_dict(cls, data: dict):
@@ -314,125 +928,95 @@ class AnimeDownloadItem:
         )
 
 
+@st.cache_resource
+def get_batch_store() -> BatchStore:
+    """Saved batch lists for the whole process; JSON lists in batch_lists/ are imported on first use."""
+    return BatchStore("batch_lists.db", legacy_dir="batch_lists")
+
+
 # Manage Batch page
 class BatchManager:
     def __init__(self):
-        self.download_list: List[AnimeDownloadItem] = []
+        self.items: Dict[str, AnimeDownloadItem] = {}  # by name, in the order they were added
+        self.store = get_batch_store()
         self.save_directory = Path("batch_lists")
         self.save_directory.mkdir(exist_ok=True)
 
+    @property
+    def download_list(self) -> List[AnimeDownloadItem]:
+        return list(self.items.values())
+
     def add_item(self, item: AnimeDownloadItem):
         # Check for duplicates
-        if any(existing.name == item.name for existing in self.download_list):
+        if item.name in self.items:
             raise ValueError(f"Anime '{item.name}' already exists in the batch list")
-        self.download_list.append(item)
+        self.items[item.name] = item
 
-    def remove_item(self, index: int):
-        if 0 <= index < len(self.download_list):
-            return self.download_list.pop(index)
-        raise IndexError("Invalid index for batch list removal")
+    def update_episodes(self, name: str, episodes: List[int]):
+        self.items[name].episodes = EpisodeSet(episodes)
+
+    def remove_item(self, name: str) -> AnimeDownloadItem:
+        if name in self.items:
+            return self.items.pop(name)
+        raise KeyError(f"Anime '{name}' is not in the batch list")
 
     def clear_list(self):
-        self.download_list.clear()
+        self.items.clear()
 
-    def get_all_saved_lists(self) -> List[Path]:
-        """Returns a list of all saved batch files."""
-        return sorted(self.save_directory.glob("*.json"), key=lambda x: x.stat().st_mtime, reverse=True)
+    def get_all_saved_lists(self) -> List[str]:
+        """Returns the names of all saved batch lists, most recent first."""
+        return self.store.names()
 
-    def save_list(self, filename: str) -> Path:
+    def save_list(self, name: str) -> Optional[str]:
         """
-        Save the current batch list to a JSON file.
-        Returns the path to the saved file.
+        Save the current batch list under `name`.
+        Returns the name it was saved as.
         """
-        if not filename.endswith('.json'):
-            filename += '.json'
-
-        save_path = self.save_directory / filename
+        name = name.removesuffix('.json')
+        if not name:
+            raise ValueError("Enter a name for the list")
 
-        # Create backup if file exists
-        if save_path.exists():
+        # Create backup if the list exists
+        if self.store.exists(name):
             col1, col2 = st.columns(2)
 
-            with st.warning(f"File '{filename} already exists!"):
-                if col1.button("Replace Existing File"):
-                    try:
-                        # Create backup before replacing
-                        backup_name = f"{save_path.stem}_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-                        backup_path = self.save_directory / backup_name
-                        save_path.rename(backup_path)
-                        st.success(f"Backup created: {backup_name}")
-                        print(f"replacing with {backup_name}")
-                    except Exception as e:
-                        raise IOError(f"Failed to create backup: {str(e)}")
+            with st.warning(f"List '{name}' already exists!"):
+                if col1.button("Replace Existing List"):
+                    backup_name = f"{name}_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                    if not self.store.rename(name, backup_name):
+                        raise IOError(f"Failed to create backup: {backup_name} already exists")
+                    st.success(f"Backup created: {backup_name}")
+                    print(f"replacing with {backup_name}")
                 else:
                     return None  # User didn't confirm replacement
 
-        data = {
-            "version": "1.0",
-            "created_at": datetime.now().isoformat(),
-            "items": [item.to_dict() for item in self.download_list]
-        }
-
-        try:
-            with open(save_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            return save_path
-        except Exception as e:
-            raise IOError(f"Failed to save batch list: {str(e)}")
+        self.store.save(name, [vars(item) for item in self.items.values()])
+        return name
 
-    def load_list(self, filename: Path) -> bool:
+    def load_list(self, name: str) -> bool:
         """
-        Load a batch list from a JSON file.
+        Load a saved batch list.
         Returns True if successful, raises exception otherwise.
         """
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            # Validate file format
-            if not isinstance(data, dict) or "items" not in data:
-                raise ValueError("Invalid batch list file format")
-
-            # Create new list from loaded data
-            new_list = []
-            for item_data in data["items"]:
-                try:
-                    new_list.append(AnimeDownloadItem.from_dict(item_data))
-                except (KeyError, TypeError) as e:
-                    raise ValueError(f"Invalid item data in batch list: {str(e)}")
-
-            # Only update if all items were loaded successfully
-            self.download_list = new_list
+            self.items = {item['name']: AnimeDownloadItem.from_dict(item) for item in self.store.load(name)}
             return True
+        except KeyError as e:
+            raise ValueError(str(e))
 
-        except json.JSONDecodeError:
-            raise ValueError("Invalid JSON format in batch list file")
-        except Exception as e:
-            raise IOError(f"Failed to load batch list: {str(e)}")
+    def delete_list(self, name: str) -> bool:
+        return self.store.delete(name)
 
-    def delete_list(self, filename: Path) -> bool:
-        try:
-            Path(filename).unlink()
-            return True
-        except FileNotFoundError:
-            return False
-
-    def merge_list(self, filename: Path) -> int:
+    def merge_list(self, name: str) -> int:
         """
-        Merge another batch list into the current one.
+        Merge a saved batch list into the current one.
         Returns the number of new items added.
         """
-        temp_manager = BatchManager()
-        temp_manager.load_list(filename)
-
         added_count = 0
-        for item in temp_manager.download_list:
-            try:
-                self.add_item(item)
+        for item in self.store.load(name):
+            if item['name'] not in self.items:  # Skip duplicates
+                self.items[item['name']] = AnimeDownloadItem.from_dict(item)
                 added_count += 1
-            except ValueError:
-                continue  # Skip duplicates
-
         return added_count
 
     def export_list(self, filename: str, format: str = 'json') -> Path:
@@ -441,13 +1025,22 @@ class BatchManager:
         Currently supports: json, txt
         Returns the path to the exported file.
         """
-        export_path = self.save_directory / filename
+        # Kept out of save_directory so exports are not imported back as saved lists
+        export_path = self.save_directory / "exports" / Path(filename).stem
+        export_path.parent.mkdir(exist_ok=True)
 
         if format == 'json':
-            return self.save_list(filename)
+            data = {
+                "version": "1.0",
+                "created_at": datetime.now().isoformat(),
+                "items": [item.to_dict() for item in self.items.values()]
+            }
+            with open(export_path.with_suffix('.json'), 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            return export_path.with_suffix('.json')
         elif format == 'txt':
             with open(export_path.with_suffix('.txt'), 'w', encoding='utf-8') as f:
-                for item in self.download_list:
+                for item in self.items.values():
                     f.write(f"Anime: {item.name}\n")
                     f.write(f"Episodes: {', '.join(map(str, item.episodes))}\n")
                     f.write(f"Total Episodes: {item.total_episodes}\n")
@@ -461,19 +1054,11 @@ class DownloadPageManager:
     def __init__(self):
         if 'downloads' not in st.session_state:
             st.session_state['downloads'] = []
-        if 'download_manager' not in st.session_state:
-            st.session_state['download_manager'] = DownloadManager(max_concurrent=max_threads)
         if 'active_downloads' not in st.session_state:
             st.session_state['active_downloads'] = set()
 
     async def start_downloads(self):
         """Process any queued downloads that aren't already being processed"""
-        download_manager = st.session_state['download_manager']
-
-        # Start download manager if needed
-        if not hasattr(download_manager, 'session') or download_manager.session is None:
-            await download_manager.start()
-
         downloads_by_anime = {}
         for download in self.downloads:
             if download['status'] == 'queued' and download['url'] not in st.session_state['active_downloads']:
@@ -590,6 +1175,8 @@ def batch_download_page():
         st.session_state['batch_manager'] = BatchManager()
 
     st.title("Batch Download Manager")
+    for message in st.session_state['batch_manager'].store.skipped:
+        st.warning(message)
 
     tab1, tab2, tab3, tab4 = st.tabs(["Add Anime", "View Current List", "Manage List", "Start Download"])
 
@@ -603,14 +1190,8 @@ def batch_download_page():
             animes = []  # Initialize animes list
 
             if anime_name:
-                response = BeautifulSoup(requests.get(f"{base_url}/search.html?keyword={anime_name}").text,
-                                         "html.parser")
-                try:
-                    pages = response.find("ul", {"class": "pagination-list"}).find_all("li")
-                    animes = [anime for page in pages for anime in get_names(
-                        BeautifulSoup(requests.get(f"{base_url}/search.html{page.a.get('href')}").text, "html.parser"))]
-                except AttributeError:
-                    animes = get_names(response)
+                animes = search_anime(anime_name)
+                prefetch_previews(animes)
 
                 if animes:
                     selected_anime = st.radio("Select Anime:", [name for name, _ in animes])
@@ -619,7 +1200,8 @@ def batch_download_page():
                         selected_url = animes[selected_index][1]
 
                         # Get episode count
-                        response = BeautifulSoup(requests.get(f"{base_url}{selected_url}").text, "html.parser")
+                        from bs4 import BeautifulSoup
+                        response = BeautifulSoup(get_page(f"{base_url}{selected_url}"), "html.parser")
                         movie_id = response.find("input", {"id": "movie_id"}).get("value")
                         last_ep = response.find("ul", {"id": "episode_page"}).find_all("a")[-1].get("ep_end")
                         total_episodes = int(last_ep)
@@ -665,14 +1247,11 @@ def batch_download_page():
 
             if selected_anime:
                 # Find the selected anime item
-                anime_item = next(
-                    item for item in st.session_state['batch_manager'].download_list
-                    if item.name == selected_anime
-                )
+                anime_item = st.session_state['batch_manager'].items[selected_anime]
 
                 # Display current episodes
                 st.write("Current episodes:",
-                         ', '.join(str(ep) for ep in sorted(anime_item.episodes)))
+                         str(anime_item.episodes).replace(',', ', '))
 
                 # Modify episodes
                 new_episodes = st.text_input(
@@ -688,7 +1267,7 @@ def batch_download_page():
                         )
                         if new_episode_list:
                             # Update the episodes
-                            anime_item.episodes = new_episode_list
+                            st.session_state['batch_manager'].update_episodes(selected_anime, new_episode_list)
                             st.success("Episodes updated successfully!")
                             st.rerun()
                         else:
@@ -698,10 +1277,7 @@ def batch_download_page():
 
                 # Option to remove anime from list
                 if st.button("Remove from List", key=f"remove_{selected_anime}"):
-                    st.session_state['batch_manager']['download_list'] = [
-                        item for item in st.session_state['batch_manager'].download_list
-                        if item.name != selected_anime
-                    ]
+                    st.session_state['batch_manager'].remove_item(selected_anime)
                     st.success(f"Removed {selected_anime} from list")
                     st.rerun()
         else:
@@ -714,12 +1290,12 @@ def batch_download_page():
         col1, col2, col3 = st.columns(3)
 
         with col1:
-            save_name = st.text_input("Save list as:", placeholder="batch_list.json")
+            save_name = st.text_input("Save list as:", placeholder="batch_list")
             if st.button("Save List"):
                 try:
-                    saved_path = st.session_state['batch_manager'].save_list(save_name)
-                    if saved_path is not None:
-                        st.success(f"List saved as {saved_path.name}")
+                    saved_name = st.session_state['batch_manager'].save_list(save_name)
+                    if saved_name is not None:
+                        st.success(f"List saved as {saved_name}")
                 except Exception as e:
                     st.error(f"Error saving list: {str(e)}")
 
@@ -764,47 +1340,44 @@ def batch_download_page():
             st.warning("Batch list is empty. Please add some anime first.")
         else:
             total_episodes = sum(len(item.episodes) for item in st.session_state['batch_manager'].download_list)
+            # Episodes already complete in their folder are skipped, so they need no space or time
+            episode_counts = {}
+            for item in st.session_state['batch_manager'].download_list:
+                folder = os.path.join(download_folder, re.sub(r'[<>:"/\\|?*]', '_', item.name))
+                episode_counts[folder] = episode_counts.get(folder, 0) + len(
+                    pending_episodes(folder, batch_episode_list(item)))
+            pending = sum(episode_counts.values())
             st.write(f"Total anime: {len(st.session_state['batch_manager'].download_list)}")
-            st.write(f"Total episodes: {total_episodes}")
+            st.write(f"Total episodes: {total_episodes}"
+                     + (f" ({total_episodes - pending} already downloaded)" if pending < total_episodes else ""))
+            st.write(f"Estimated size: ~{format_size(pending * episode_size_estimate)}")
+            preflight_check(episode_counts)
 
             if st.button("Start Batch Download"):
                 if 'download_started' not in st.session_state:
                     st.session_state['download_started'] = True
 
-                    if 'download_manager' not in st.session_state:
-                        st.session_state['download_manager'] = DownloadManager(max_concurrent=max_threads)
-
                     st.write("### Download Progress")
+                    batch = BatchProgress(pending, episode_size_estimate)
                     # Create a single event loop for all downloads
                     loop = asyncio.new_event_loop()
                     asyncio.set_event_loop(loop)
                     try:
                         for item in st.session_state['batch_manager'].download_list:
                             st.write(f"#### {item.name}")
-                            item.name = re.sub(r'[<>:"/\\|?*]', '_', item.name)
-
-                            download_path = os.path.join(download_folder, item.name)
+                            folder_name = re.sub(r'[<>:"/\\|?*]', '_', item.name)
 
-                            episode_list = [
-                                {
-                                    "episode": str(ep),
-                                    "url": f"{base_url}{item.url.replace('/category', '')}-episode-{ep}"
-                                }
-                                for ep in item.episodes
-                            ]
+                            download_path = os.path.join(download_folder, folder_name)
 
                             # Run download for this anime
                             loop.run_until_complete(
                                 download_episodes(
-                                    episode_list,
-                                    item.name,
-                                    download_path
+                                    batch_episode_list(item),
+                                    folder_name,
+                                    download_path,
+                                    batch
                                 )
                             )
-                            # Reset download manager for next anime
-                            loop.run_until_complete(st.session_state['download_manager'].stop())
-                            st.session_state['download_manager'] = DownloadManager(max_concurrent=max_threads)
-                            loop.run_until_complete(st.session_state['download_manager'].start())
 
                     except Exception as e:
                         st.error(f"Error in batch download: {str(e)}")
@@ -813,46 +1386,97 @@ def batch_download_page():
                         st.session_state['download_started'] = False
 
 
+def batch_episode_list(item) -> List[dict]:
+    """The episode dicts of a batch item, as download_episodes() takes them."""
+    return [
+        {
+            "episode": str(ep),
+            "url": f"{base_url}{item.url.replace('/category', '')}-episode-{ep}"
+        }
+        for ep in item.episodes
+    ]
+
+
+def pending_episodes(folder: str, episodes: List[dict]) -> List[dict]:
+    """The episodes the folder's manifest does not have complete yet."""
+    if not os.path.isdir(folder):
+        return episodes  # nothing downloaded yet; get_manifest() would create the folder
+    manifest = get_manifest(folder)
+    return [episode for episode in episodes if manifest.check(episode['url'])[0] != COMPLETE]
+
+
+def preflight_check(episode_counts: Dict[str, int]):
+    """
+    Warn before starting when a target drive cannot hold the expected
+    episodes (folder -> episode count, sized with episode_size_mb). Downloads
+    still start; they wait for space instead of failing halfway.
+    """
+    sizes = {folder: count * episode_size_estimate for folder, count in episode_counts.items()}
+    for folder, needed, free in check_space(sizes, get_disk_admission().margin):
+        st.warning(f"{folder} needs ~{format_size(needed)} but its drive only has {format_size(free)} free. "
+                   f"Downloads will wait for space.")
+
+
+def clean_title(title):
+    return clean_filename(title) if title else None
+
+
 def clean_filename(filename):
     cleaned_filename = re.sub(r'[\\/*?:"<>|]', '§', filename)
     return cleaned_filename
 
 
-def get_preview(link):
-    try:
-        response = requests.get(f"{base_url}{link}")
+def fetch_preview(link) -> dict:
+    from bs4 import BeautifulSoup
+
+    with polite.open("GET", f"{base_url}{link}") as response:
         response.raise_for_status()
         soup = BeautifulSoup(response.text, "html.parser")
 
-        anime_info_section = soup.find(class_="anime_info_body_bg")
-        anime_data = []
-
-        # for section in anime_info_sections:
-        # Extract individual fields
-        title = anime_info_section.find("h1").get_text(strip=True) if anime_info_section.find("h1") else None
-        synopsis = anime_info_section.find("div", class_="description").get_text(strip=True) if anime_info_section.find(
-            "div", class_="description") else None
-        genre_div = anime_info_section.find_all("p", class_='type')[2] if len(
-            anime_info_section.find_all("p", class_="type")) > 2 else None
-        genres = [genre.get_text(strip=True).replace(', ', '') for genre in
-                  genre_div.find_all("a")] if genre_div else []
-        release_date_tag = anime_info_section.find_all("p", class_="type")[3] if len(
-            anime_info_section.find_all("p", class_="type")) > 3 else None
-        release_date = release_date_tag.get_text(strip=True).replace("Released: ", "") if release_date_tag else None
-        release_date = release_date.replace("Released:", "")
-        image_link = anime_info_section.find("img")["src"] if anime_info_section.find("img") else None
-
-        # Append the extracted data as a dictionary
-        anime_data.append({
-            "title": title,
-            "synopsis": synopsis,
-            "genres": genres,
-            "release_date": release_date,
-            "image_link": image_link
-        })
-
-        return anime_data
+    anime_info_section = soup.find(class_="anime_info_body_bg")
+
+    # Extract individual fields
+    title = anime_info_section.find("h1").get_text(strip=True) if anime_info_section.find("h1") else None
+    synopsis = anime_info_section.find("div", class_="description").get_text(strip=True) if anime_info_section.find(
+        "div", class_="description") else None
+    genre_div = anime_info_section.find_all("p", class_='type')[2] if len(
+        anime_info_section.find_all("p", class_="type")) > 2 else None
+    genres = [genre.get_text(strip=True).replace(', ', '') for genre in
+              genre_div.find_all("a")] if genre_div else []
+    release_date_tag = anime_info_section.find_all("p", class_="type")[3] if len(
+        anime_info_section.find_all("p", class_="type")) > 3 else None
+    release_date = release_date_tag.get_text(strip=True).replace("Released: ", "") if release_date_tag else None
+    release_date = release_date.replace("Released:", "") if release_date else None
+    image_link = anime_info_section.find("img")["src"] if anime_info_section.find("img") else None
 
+    return {
+        "title": title,
+        "synopsis": synopsis,
+        "genres": genres,
+        "release_date": release_date,
+        "image_link": image_link
+    }
+
+
+@st.cache_resource
+def get_prefetcher() -> PreviewPrefetcher:
+    """Process-wide preview cache shared by every page and session."""
+    return PreviewPrefetcher(fetch_preview, ThumbnailCache("thumbnails"), polite)
+
+
+def prefetch_previews(animes: List[List[str]]):
+    """Start warming previews for the top search results in the background."""
+    if preview_status != "No Preview":
+        get_prefetcher().prefetch(url for _, url in animes[:preview_prefetch_count])
+
+
+def get_preview(link):
+    import requests
+
+    prefetcher = get_prefetcher()
+    CACHE_REQUESTS.inc(cache="previews", result="hit" if link in prefetcher.futures else "miss")
+    try:
+        return [prefetcher.get(link)]
     except requests.exceptions.RequestException as e:
         st.error(f"Error fetching anime data: {str(e)}")
         return None
@@ -907,13 +1531,14 @@ def display_anime_preview_markdown(selected_anime_link):
     with st.spinner("Loading details..."):
         anime_data = get_preview(selected_anime_link)
 
+    if not anime_data:
+        return
     anime = anime_data[0]
 
     st.markdown(f'<div class="anime-preview">', unsafe_allow_html=True)
 
     if anime["image_link"]:
-        if anime["image_link"]:
-            st.image(anime["image_link"], caption=None, use_container_width=True)
+        st.image(anime.get("image_path") or anime["image_link"], caption=None, use_container_width=True)
 
     st.markdown(f'<div class="anime-title">{anime["title"]}</div>', unsafe_allow_html=True)
     st.markdown(f'<div class="anime-details">Released: {anime["release_date"]}</div>', unsafe_allow_html=True)
@@ -943,7 +1568,7 @@ def display_anime_preview_vanilla(selected_anime_link):
         anime = anime_data[0]
 
         # Image
-        st.image(anime["image_link"], caption=anime["title"], use_container_width=True)
+        st.image(anime.get("image_path") or anime["image_link"], caption=anime["title"], use_container_width=True)
 
         # Title and Release Date
         st.subheader(anime["title"])
@@ -962,95 +1587,181 @@ def display_anime_preview_vanilla(selected_anime_link):
             st.json(anime)
 
 
-async def download_link_async(session, link):
-    """Async version of download_link function"""
-    async with session.get(link) as response:
-        soup = BeautifulSoup(await response.text(), "html.parser")
-        base_download_url = BeautifulSoup(str(soup.find("li", {"class": "dowloads"})), "html.parser").a.get("href")
-        id = base_download_url[base_download_url.find("id=") + 3:base_download_url.find("&typesub")]
-        base_download_url = base_download_url[:base_download_url.find("id=")]
-
-        async with session.post(f"{base_download_url}&id={id}") as response:
-            title = BeautifulSoup(await response.text(), "html.parser")
-            title = clean_filename(title.find("span", {"id": "title"}).text)
-
-        async with session.post(f"{base_download_url}&id={id}&captcha_v3={captcha_v3}") as response:
-            soup = BeautifulSoup(await response.text(), "html.parser")
-            backup_link = []
-
-            for i in soup.find_all("div", {"class": "dowload"}):
-                if str(BeautifulSoup(str(i), "html.parser").a).__contains__('download=""'):
-                    link = (BeautifulSoup(str(i), "html.parser").a.get("href"))
-                    quality = BeautifulSoup(str(i), "html.parser").a.string.replace(" ", "").replace("Download", "")
-                    try:
-                        quality = int(quality[2:quality.find("P")])
-                    except ValueError:
-                        print("Failed to parse quality information. Using default quality.")
-                        quality = 0
-                    if quality == download_quality:
-                        print(f"Downloading in {quality}p")
-                        return [link, title]
-                    backup_link = [link, quality]
-
-            # print(f"Downloading in {backup_link[1]}p")
-            return [backup_link[0], title]
-
-
-async def download_episodes(episodes: List[dict], anime_name: str, save_path):
-    """Downloads multiple episodes using the download manager"""
-    # Disable sidebar during downloads
-    st.sidebar.empty()
-    st.sidebar.info("⏳ Download in progress. Please wait...")
-    disable_sidebar = st.markdown("""
-       <style>[data-testid="stSidebar"] {pointer-events: none; opacity: 0.4;}</style>
-    """, unsafe_allow_html=True)
-
-    if 'download_manager' not in st.session_state:
-        st.session_state['download_manager'] = DownloadManager(max_concurrent=max_threads)
-    download_manager = st.session_state['download_manager']
+async def resolve_sources_async(session, link, title=None):
+    """
+    Resolve an episode page to (ranked sources, title) in two requests.
+    The title is read from the captcha response that carries the links,
+    falling back to `title` and then the episode page. Sessions resolving
+    the same episode at the same time share one resolution.
+    """
+    (sources, link_title, page_title), joined = await get_single_flight().do_async(
+        ("resolve", link), _resolve_sources, session, link)
+    CACHE_REQUESTS.inc(cache="in_flight", result="hit" if joined else "miss")
+    return sources, link_title or title or page_title
+
+
+async def _resolve_sources(session, link):
+    """(ranked sources, title on the links page, title on the episode page) of an episode page."""
+    parsers = get_parse_pool()
+
+    # Each response is read before the next request so no scrape slot is held while waiting for another
+    with RESOLVE_SECONDS.time(stage="episode_page"), span("episode_page", cat="resolve"):
+        async with polite.async_open(session, "GET", link) as response:
+            page = await response.text()
+    # Parsing is CPU-bound; on the loop it would stall every chunk read in flight
+    with span("parse", cat="resolve"):
+        base_download_url, page_title = await parsers.run_async(parse_episode_page, page)
+    id = base_download_url[base_download_url.find("id=") + 3:base_download_url.find("&typesub")]
+    base_download_url = base_download_url[:base_download_url.find("id=")]
+
+    config = settings()  # a new captcha or default quality applies to the next episode resolved
+    with RESOLVE_SECONDS.time(stage="captcha_post"), span("captcha_post", cat="resolve"):
+        async with polite.async_open(session, "POST",
+                                     f"{base_download_url}&id={id}&captcha_v3={config['captcha_v3']}") as response:
+            links_page = await response.text()
+    with span("parse", cat="resolve"):
+        links, links_title = await parsers.run_async(parse_download_page, links_page)
+    sources = rank_sources(links, config.download_quality, config.min_quality, config.max_quality)
+    if not sources:
+        raise Exception(f"No download links between {config.min_quality or 0}p and {config.max_quality or 'any'}p")
+    return sources, clean_title(links_title), clean_title(page_title)
+
+
+async def download_episodes(episodes: List[dict], anime_name: str, save_path,
+                            batch: Optional[BatchProgress] = None):
+    """Queue the episodes on the shared download engine and show their progress until they finish"""
+    disable_sidebar = lock_sidebar()
+    st.session_state['downloading'] = True  # a rerun from here on keeps drawing them, see resume_downloads()
+
+    engine = get_engine()
+    download_manager = engine.manager
+    owner = session_id()
+    if batch is None:
+        pending = len(pending_episodes(save_path, episodes))
+        preflight_check({save_path: pending})
+        batch = BatchProgress(pending, episode_size_estimate)
+    eta_text = st.empty()
     try:
-        if not hasattr(download_manager, 'session') or download_manager.session is None:
-            await download_manager.start()
-
         download_tasks = []
+        manifest = get_manifest(save_path)
         for episode in episodes:
             try:
-                # Get the legitimate download link using the async version
-                download_info = await download_link_async(download_manager.session, episode['url'])
-                download_url = download_info[0]
-                episode_title = download_info[1]
-
-                # Create filename using the extracted title
-                filename = f"{episode_title}_episode_{episode['episode']}.mp4"
-
-                # Queue the download task - now awaiting the add_download
-                download_task = await download_manager.add_download(
-                    url=download_url,
-                    filename=filename,
+                state, entry = manifest.check(episode['url'])
+                if state == COMPLETE:
+                    st.info(f"Episode {episode['episode']} is already downloaded: {entry['file']}")
+                    continue
+                if state == CORRUPT:
+                    st.warning(f"{entry['file']} does not match its recorded digest, downloading it again")
+                    os.remove(os.path.join(save_path, entry['file']))
+                    manifest.forget(episode['url'])
+
+                # The engine resolves the episode when a worker starts it, so its signed links are fresh;
+                # until then the file is named after the anime. A partial file is continued if its quality
+                # is still offered then
+                episode_title = clean_filename(f"{anime_name} Episode {str(episode['episode']).strip()}")
+                resume = state == PARTIAL and not download_manager.sequential
+                download_task = await engine.add_download(
+                    owner,
+                    url=None,
+                    filename=entry['file'] if resume else f"{episode_title}_episode_{episode['episode']}.mp4",
                     folder=save_path,
-                    episode=int(episode['episode'])
+                    episode=int(episode['episode']),
+                    priority=episode.get('priority', DEFAULT_PRIORITY),
+                    episode_url=episode['url'],
+                    title=episode_title,
+                    resume=resume,
+                    batch=batch
                 )
+                download_task.setup_progress_ui()
                 download_tasks.append(download_task)
             except Exception as e:
                 st.error(f"Error processing episode {episode['episode']}: {str(e)}")
                 continue
 
-        # Since tasks are already running,  wait for them to complete
-        for task in download_tasks:
-            while task.state not in [DownloadState.COMPLETED, DownloadState.ERROR, DownloadState.CANCELLED]:
-                await asyncio.sleep(0.5)
+        await follow_downloads(engine, owner, download_tasks, batch, eta_text)
 
         disable_sidebar.empty()
+        st.session_state['downloading'] = False
         st.rerun()
 
     except Exception as e:
         st.error(f"Download manager error: {str(e)}")
         raise e
     finally:
-        try:
-            await download_manager.stop()
-        except Exception as e:
-            st.error(f"Error stopping download manager: {str(e)}")
+        engine.release(owner)
+        TRACER.save(trace_file)
+        if get_cassette():
+            get_cassette().save()
+
+
+def lock_sidebar():
+    """Disable the sidebar while downloads run; returns the style element that does it."""
+    st.sidebar.empty()
+    st.sidebar.info("⏳ Download in progress. Please wait...")
+    return st.markdown("""
+       <style>[data-testid="stSidebar"] {pointer-events: none; opacity: 0.4;}</style>
+    """, unsafe_allow_html=True)
+
+
+def watch_next_form(engine: DownloadEngine, owner: str, tasks: List[DownloadTask]):
+    """Move queued episodes of this session to the front of the shared queue while its downloads run."""
+    with st.form("watch_next_form", clear_on_submit=True):
+        selection = st.text_input("Download next (e.g. 7 8 or 7-9):",
+                                  help="Queued episodes jump ahead of the rest without being queued again")
+        if st.form_submit_button("Move to front") and selection:
+            try:
+                episodes = parse_episode_selection(selection, max(task.episode for task in tasks))
+            except ValueError:
+                st.error("Invalid episode selection. Please try again.")
+                return
+            moved = engine.promote(owner, episodes)
+            st.info(f"Moved {moved} queued episode{'s' if moved != 1 else ''} to the front")
+
+
+async def follow_downloads(engine: DownloadEngine, owner: str, tasks: List[DownloadTask],
+                           batch: BatchProgress, eta_text):
+    """
+    Draw this session's tasks until they finish; the engine runs them. The
+    "Download next" form reorders the ones still queued. Submitting it reruns
+    the script, and main() comes back here through resume_downloads().
+    """
+    if engine.queued(owner):
+        watch_next_form(engine, owner, tasks)
+    while any(task.state not in FINISHED for task in tasks):
+        for task in tasks:
+            task.update_progress()
+        running = engine.summary()
+        eta_text.info(f"Batch: {batch.summary()} · server: {sum(running.values())} downloads "
+                      f"for {len(running)} session{'s' if len(running) != 1 else ''}")
+        await asyncio.sleep(0.5)
+    for task in tasks:
+        task.update_progress()
+
+
+async def resume_downloads():
+    """
+    Keep drawing the downloads this session started when the script reruns
+    while they run, then rerun into the page. Returns right away when they
+    have all finished.
+    """
+    engine = get_engine()
+    owner = session_id()
+    tasks = engine.tasks(owner)
+    if all(task.state in FINISHED for task in tasks):
+        st.session_state['downloading'] = False
+        return
+    disable_sidebar = lock_sidebar()
+    st.write("### Downloads")
+    for task in tasks:
+        task.setup_progress_ui()
+    eta_text = st.empty()
+    try:
+        await follow_downloads(engine, owner, tasks, tasks[0].batch, eta_text)
+    finally:
+        engine.release(owner)
+    disable_sidebar.empty()
+    st.session_state['downloading'] = False
+    st.rerun()
 
 
 def get_names(response):
@@ -1063,6 +1774,55 @@ def get_names(response):
     return names
 
 
+@st.cache_resource
+def get_catalog() -> AnimeCatalog:
+    """Process-wide local catalog; loaded once, refreshed in the background."""
+    return AnimeCatalog(base_url, "catalog.db", scheduler=get_host_scheduler())
+
+
+def search_live(anime_name: str) -> List[List[str]]:
+    """Search the site directly, walking every results page."""
+    from bs4 import BeautifulSoup
+
+    with span("search_live", keyword=anime_name) as search_span:
+        response = BeautifulSoup(polite.get_text(f"{base_url}/search.html?keyword={anime_name}"), "html.parser")
+        try:
+            pages = response.find("ul", {"class": "pagination-list"}).find_all("li")
+            search_span.set(pages=len(pages))
+            return [anime for page in pages for anime in get_names(
+                BeautifulSoup(polite.get_text(f"{base_url}/search.html{page.a.get('href')}"), "html.parser"))]
+        except AttributeError:
+            return get_names(response)
+
+
+def search_anime(anime_name: str) -> List[List[str]]:
+    """
+    Search the local catalog first and only hit the site when it has no
+    strong match: a weak fuzzy hit may be a title the catalog does not have
+    yet. Live results are added to the catalog so the next lookup is local;
+    without any, the fuzzy suggestions are shown.
+    """
+    catalog = get_catalog()
+    catalog.refresh_in_background()
+
+    with span("search", keyword=anime_name):
+        animes, strong = catalog.match(anime_name)
+    if not strong:
+        live = search_live(anime_name)
+        if live:
+            catalog.add(live)
+            animes = live
+    return animes
+
+
+def prioritize_episodes(episodes: List[dict], watch_next: List[str]) -> List[dict]:
+    """Return copies of the episode dicts with the "watch next" ones moved to the front of the queue."""
+    return [
+        {**episode, 'priority': WATCH_NEXT_PRIORITY} if episode['episode'] in watch_next else episode
+        for episode in episodes
+    ]
+
+
 def parse_episode_selection(selections: str, max_episodes: int) -> List[int]:
     """
     Parse user's episode selection string.
@@ -1093,19 +1853,8 @@ def single_download_page():
 
     col1, col2 = st.columns(2)
     anime_name = col1.text_input("Enter Anime name: ", placeholder="Search").title()
-    response = BeautifulSoup(requests.get(f"{base_url}/search.html?keyword={anime_name}").text, "html.parser")
-
-    try:
-        pages = response.find("ul", {"class": "pagination-list"}).find_all("li")
-        animes = []
-        for page in pages:
-            page_url = f"{base_url}/search.html{page.a.get('href')}"
-            response = requests.get(page_url)
-            soup = BeautifulSoup(response.text, "html.parser")
-            animes.extend(get_names(soup))
-
-    except AttributeError:
-        animes = get_names(response)
+    animes = search_anime(anime_name) if anime_name else []
+    prefetch_previews(animes)
 
     if 'page' not in st.session_state:
         st.session_state['page'] = 'search'
@@ -1145,27 +1894,35 @@ def single_download_page():
         st.write(f"### {st.session_state.selected_anime[0]} episodes")
         # print(f"{base_url}{st.session_state.selected_anime[1]}")
         # print(get_preview(st.session_state.selected_anime[1]))
-        response = BeautifulSoup(requests.get(f"{base_url}{st.session_state.selected_anime[1]}").text, "html.parser")
-        base_url_cdn_api = re.search(r"base_url_cdn_api\s*=\s*'([^']*)'",
-                                     str(response.find("script", {"src": ""}))).group(1)
-        movie_id = response.find("input", {"id": "movie_id"}).get("value")
-        last_ep = response.find("ul", {"id": "episode_page"}).find_all("a")[-1].get("ep_end")
-
-        episodes_response = BeautifulSoup(
-            requests.get(f"{base_url_cdn_api}ajax/load-list-episode?ep_start=0&ep_end={last_ep}&id={movie_id}").text,
-            "html.parser").find_all("a")
-
-        episodes = [
-            {
-                "episode": re.search(r"</span>(.*?)</div", str(ep.find("div"))).group(1),
-                "url": f'{base_url}{ep.get("href").replace(" ", "")}'
-            }
-            for ep in reversed(episodes_response)
-        ]
+        with span("create_links", anime=st.session_state.selected_anime[1]):
+            from bs4 import BeautifulSoup
+            response = BeautifulSoup(get_page(f"{base_url}{st.session_state.selected_anime[1]}"), "html.parser")
+            base_url_cdn_api = re.search(r"base_url_cdn_api\s*=\s*'([^']*)'",
+                                         str(response.find("script", {"src": ""}))).group(1)
+            movie_id = response.find("input", {"id": "movie_id"}).get("value")
+            last_ep = response.find("ul", {"id": "episode_page"}).find_all("a")[-1].get("ep_end")
+
+            episodes_response = BeautifulSoup(
+                get_page(f"{base_url_cdn_api}ajax/load-list-episode?ep_start=0&ep_end={last_ep}&id={movie_id}"),
+                "html.parser").find_all("a")
+
+            episodes = [
+                {
+                    "episode": re.search(r"</span>(.*?)</div", str(ep.find("div"))).group(1).strip(),
+                    "url": f'{base_url}{ep.get("href").replace(" ", "")}'
+                }
+                for ep in reversed(episodes_response)
+            ]
 
         st.write(f"Found {len(episodes)} episodes")
 
         if len(episodes) > 1:
+            watch_next = st.text_input(
+                "Download first (optional, e.g. 3 4):",
+                key="watch_next",
+                help="These episodes jump to the front of the download queue"
+            ).split()
+
             # Create download options
             download_method = st.radio(
                 "Select download method:",
@@ -1184,7 +1941,7 @@ def single_download_page():
                 if st.button("Download Range"):
                     if 'download_started' not in st.session_state or st.session_state['download_started'] is False:
                         st.session_state['download_started'] = True
-                        selected_episodes = episodes[start - 1:end]
+                        selected_episodes = prioritize_episodes(episodes[start - 1:end], watch_next)
                         anime_name = re.sub(r'[<>:"/\\|?*]', '_', anime_name)
                         save_path = os.path.join(download_folder, anime_name)
                         st.session_state['episodes_to_download'] = selected_episodes
@@ -1223,7 +1980,8 @@ def single_download_page():
                 if st.button("Download Selected"):
                     try:
                         selected_numbers = parse_episode_selection(episode_input, len(episodes))
-                        selected_episodes = [episodes[ep - 1] for ep in selected_numbers]
+                        selected_episodes = prioritize_episodes([episodes[ep - 1] for ep in selected_numbers],
+                                                                watch_next)
                         st.session_state.episodes_to_download = selected_episodes
                         anime_name = re.sub(r'[<>:"/\\|?*]', '_', anime_name)
                         save_path = os.path.join(download_folder, anime_name)
@@ -1279,14 +2037,33 @@ def single_download_page():
                         raise e
 
 
-def save_setup(settings):
-    """Save settings to setup.json"""
-    with open("../WebUI/setup.json", "w") as f:
-        json.dump(settings, f, indent=4)
+# What "Reset to Default Settings" restores; the site, captcha and every other setting are kept
+DEFAULT_SETTINGS = {
+    "downloads": os.path.join(os.path.expanduser("~"), "Downloads"),
+    "download_quality": "360",
+    "max_threads": 3,
+    "preview_status": "No Preview",
+}
+SETTING_LABELS = {
+    "downloads": "Download location",
+    "download_quality": "Default resolution",
+    "max_threads": "Maximum concurrent downloads",
+    "preview_status": "Preview status",
+}
+
+
+def save_setup(data):
+    """Validate and save settings to setup.json; running downloads pick them up right away"""
+    return get_config_watcher().save(data)
 
 
 def settings_page():
     st.title("Settings")
+    st.caption("Saved settings apply to running downloads: worker count, resolution and speed limits "
+               "change without restarting")
+    if get_config_watcher().error:
+        st.warning(f"setup.json was changed but is not valid, still using the previous settings: "
+                   f"{get_config_watcher().error}")
 
     # Create a copy of settings to track changes
     temp_settings = setup.copy()
@@ -1323,6 +2100,40 @@ def settings_page():
         )
     temp_settings['preview_status'] = selected_preview
 
+    st.header("Search Catalog")
+
+    catalog = get_catalog()
+    last_refresh = catalog.last_refresh()
+    st.write(f"Titles indexed: {len(catalog)}")
+    st.caption(
+        f"Last refreshed: {datetime.fromtimestamp(last_refresh).strftime('%Y-%m-%d %H:%M')}"
+        if last_refresh else "Catalog has not been built yet"
+    )
+    if st.button("Rebuild Catalog", help="Crawl the full anime list again; searches stay local meanwhile"):
+        with st.spinner("Crawling anime list..."):
+            changed = catalog.rebuild()
+        st.success(f"Catalog rebuilt, {changed} list pages changed")
+
+    st.header("Engine Metrics")
+    metrics_server = get_metrics_server()
+    st.caption(f"Prometheus endpoint: {metrics_server.url} (JSON at {metrics_server.url}.json)"
+               if metrics_server else "Set metrics_port in setup.json to expose /metrics and /metrics.json")
+    with st.expander("Current snapshot"):
+        st.json(REGISTRY.snapshot())
+
+    st.header("Pipeline Tracing")
+    tracing = st.checkbox("Record a trace of each pipeline stage", value=TRACER.enabled,
+                          help="Open the exported file in ui.perfetto.dev or chrome://tracing")
+    if tracing:
+        TRACER.enable()
+    else:
+        TRACER.disable()
+    if TRACER.events:
+        st.download_button("Download trace", json.dumps(TRACER.export()), "trace.json", "application/json")
+        if st.button("Clear trace"):
+            TRACER.clear()
+            st.rerun()
+
     # Resolution Settings
     st.header("Resolution Settings")
 
@@ -1330,12 +2141,12 @@ def settings_page():
     selected_resolution = st.radio(
         "Select Default Download Resolution:",
         resolutions,
-        index=resolutions.index(setup.get("download_quality", '360'))
+        index=resolutions.index(str(setup.download_quality))
     )
 
-    if selected_resolution != setup.get("download_quality"):
+    if selected_resolution != str(setup.download_quality):
         changes_made.append(
-            f"Default resolution changed from '{setup.get('default_resolution')}' to '{selected_resolution}'")
+            f"Default resolution changed from '{setup.download_quality}' to '{selected_resolution}'")
     temp_settings["download_quality"] = selected_resolution
 
     # Concurrent Downloads Settings
@@ -1377,6 +2188,7 @@ def settings_page():
                 details_container.write(f"CPU Cores detected: {cpu_count}")
 
                 # Get memory info
+                import psutil
                 memory = psutil.virtual_memory()
                 available_memory_gb = memory.available / (1024 * 1024 * 1024)
                 details_container.write(f"Available memory: {available_memory_gb:.2f} GB")
@@ -1389,6 +2201,7 @@ def settings_page():
 
                 try:
                     details_container.write("Testing network conditions...")
+                    import aiohttp
                     async with aiohttp.ClientSession() as session:
                         start_time = asyncio.get_event_loop().time()
                         async with session.get(test_url) as response:
@@ -1449,9 +2262,13 @@ def settings_page():
                 st.info("No changes to save.")
             else:
                 # Validate all settings before saving
-                if os.path.exists(os.path.dirname(temp_settings["downloads"])):
+                try:
+                    if not os.path.exists(os.path.dirname(temp_settings["downloads"])):
+                        raise ConfigError("Invalid download path")
                     save_setup(temp_settings)
-
+                except ConfigError as e:
+                    st.error(f"Cannot save: {e}")
+                else:
                     st.success("Settings saved successfully!")
                     st.write("Changes made:")
                     for change in changes_made:
@@ -1459,28 +2276,14 @@ def settings_page():
 
                     time.sleep(2)
                     st.rerun()
-                else:
-                    st.error("Cannot save: Invalid download path")
 
     with col2:
         if st.button("Reset to Default Settings"):
-            default_settings = {
-                "downloads": os.path.join(os.path.expanduser("~"), "Downloads"),
-                "download_quality": "360p",
-                "max_threads": 3
-            }
-
             # Track what will be reset
-            reset_changes = []
-            if default_settings["downloads"] != setup["downloads"]:
-                reset_changes.append(f"Download location reset to '{default_settings['downloads']}'")
-            if default_settings["default_resolution"] != setup.get("default_resolution"):
-                reset_changes.append(f"Default resolution reset to '{default_settings['default_resolution']}'")
-            if default_settings["max_concurrent_downloads"] != setup.get("max_concurrent_downloads"):
-                reset_changes.append(
-                    f"Maximum concurrent downloads reset to {default_settings['max_concurrent_downloads']}")
+            reset_changes = [f"{SETTING_LABELS[key]} reset to '{value}'"
+                             for key, value in DEFAULT_SETTINGS.items() if setup.get(key) != value]
 
-            save_setup(default_settings)
+            save_setup({**setup, **DEFAULT_SETTINGS})
 
             st.success("Settings reset to default!")
             if reset_changes:
@@ -1493,6 +2296,13 @@ def settings_page():
 
 
 def main():
+    st.set_page_config(
+        page_title="Anime Downloader",
+        page_icon="⛩️"
+    )
+    configure()
+    if st.session_state.get('downloading'):
+        asyncio.run(resume_downloads())  # returns once they have finished
     st.sidebar.title("Anime Downloader")
 
     # if 'sidebar_content' not in st.session_state:
@@ -1516,4 +2326,5 @@ def main():
         downloads_page()
 
 
-main()
+if __name__ == "__main__":  # streamlit runs the script as __main__
+    main()
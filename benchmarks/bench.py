@@ -0,0 +1,244 @@
+"""
+End-to-end download benchmark against the local mock site.
+
+Starts MockSite, then runs each downloader in its own process (both UIs
+have modules with the same names, and each reads its setup.json relative
+to the working directory at import time):
+
+  cli    search() and create_links() with scripted answers, then download()
+  webui  search_live(), then every episode resolved and queued on a DownloadManager
+
+and reports episodes/min, MB/s, p50/p99 resolve latency and peak RSS.
+
+    python benchmarks/bench.py --episodes 24 --episode-mb 16 --bandwidth-kbps 8192 --latency-ms 40
+    python benchmarks/bench.py --target webui --set max_threads=6 --set scrape_rate=20
+    python benchmarks/bench.py --faults benchmarks/fault_plans/flaky_cdn.json --set min_speed_kbps=512
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+TARGETS = {"cli": ROOT / "CommandLineUI", "webui": ROOT / "WebUI"}
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(round(fraction * (len(values) - 1))), len(values) - 1)]
+
+
+def peak_rss() -> int:
+    """Peak resident set size of this process in bytes."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:  # Windows
+        import psutil
+        return psutil.Process().memory_info().peak_wset
+
+
+def sandbox(target: str) -> Path:
+    """
+    Temporary tree where "../<UI>/setup.json" resolves from `root/work`, so
+    the benchmark never touches the real setup.json.
+    """
+    root = Path(tempfile.mkdtemp(prefix=f"bench-{target}-"))
+    (root / TARGETS[target].name).mkdir()
+    (root / "work").mkdir()
+    return root
+
+
+def resolve_latencies(tracer) -> List[float]:
+    return [event["dur"] / 1e6 for event in tracer.export()["traceEvents"] if event.get("name") == "resolve"]
+
+
+def run_cli(config: dict, keyword: str, episodes: int) -> dict:
+    import main as cli
+    from core.tracing import TRACER
+
+    cli.configure()
+    TRACER.enable()
+    answers = iter([keyword, "1", "1", "1", str(episodes)])
+    cli.input = lambda prompt="": next(answers)  # search() and create_links() are interactive
+
+    started = time.perf_counter()
+    links = cli.search()
+    listed = time.perf_counter()
+    cli.download(links, config["downloads"])
+    finished = time.perf_counter()
+    return {"listing_seconds": listed - started, "download_seconds": finished - listed,
+            "downloads": cli.DOWNLOADS.snapshot(), "resolve": resolve_latencies(TRACER), "tracer": TRACER,
+            "faults": cli.fault_plan.summary() if cli.fault_plan else {}}
+
+
+def run_webui(config: dict, keyword: str, episode_urls: List[str]) -> dict:
+    import webUI
+    from core.tracing import TRACER
+
+    webUI.configure()
+    TRACER.enable()
+
+    async def download():
+        manager = webUI.DownloadManager(max_concurrent=config["max_threads"])
+        batch = webUI.BatchProgress(len(episode_urls), webUI.episode_size_estimate)
+        await manager.start()
+        tasks = []
+        # The same steps as download_episodes(), without the Streamlit page around it
+        for number, url in enumerate(episode_urls, 1):
+            tasks.append(await manager.add_download(
+                url=None, filename=f"Episode {number}_episode_{number}.mp4", folder=config["downloads"],
+                episode=number, episode_url=url, title=f"Episode {number}", batch=batch))
+        while any(task.state not in (webUI.DownloadState.COMPLETED, webUI.DownloadState.ERROR,
+                                     webUI.DownloadState.CANCELLED) for task in tasks):
+            await asyncio.sleep(0.05)
+        await manager.stop()
+
+    started = time.perf_counter()
+    webUI.search_live(keyword)
+    listed = time.perf_counter()
+    asyncio.run(download())
+    finished = time.perf_counter()
+    fault_plan = webUI.get_fault_plan()
+    return {"listing_seconds": listed - started, "download_seconds": finished - listed,
+            "downloads": webUI.DOWNLOADS.snapshot(), "resolve": resolve_latencies(TRACER), "tracer": TRACER,
+            "faults": fault_plan.summary() if fault_plan else {}}
+
+
+def child(args):
+    """Run one target inside its sandbox and write the measurements to args.result."""
+    job = json.loads(Path(args.job).read_text())
+    os.chdir(job["workdir"])
+    sys.path.insert(0, str(TARGETS[args.driver]))
+    if args.driver == "cli":
+        result = run_cli(job["config"], job["keyword"], len(job["episode_urls"]))
+    else:
+        result = run_webui(job["config"], job["keyword"], job["episode_urls"])
+
+    result["retries"] = sys.modules["core.metrics"].RETRIES.snapshot()
+    if job.get("trace"):
+        result["tracer"].save(job["trace"])
+    downloaded = sum(f.stat().st_size for f in Path(job["config"]["downloads"]).glob("*.mp4"))
+    elapsed = result["listing_seconds"] + result["download_seconds"]
+    completed = result["downloads"].get("completed", 0)
+    Path(args.result).write_text(json.dumps({
+        "episodes": completed,
+        "failed": result["downloads"].get("failed", 0),
+        "seconds": elapsed,
+        "listing_seconds": result["listing_seconds"],
+        "episodes_per_min": completed / elapsed * 60,
+        "mb_per_s": downloaded / 1024 / 1024 / result["download_seconds"],
+        "resolve_p50_ms": (percentile(result["resolve"], 0.5) or 0) * 1000,
+        "resolve_p99_ms": (percentile(result["resolve"], 0.99) or 0) * 1000,
+        "peak_rss_mb": peak_rss() / 1024 / 1024,
+        "retries": result["retries"],
+        "faults": result["faults"],
+    }))
+    os._exit(0)  # the download workers and metrics/stream servers are not joined
+
+
+def run_target(target: str, site, args) -> dict:
+    slug = site.slugs()[0]
+    root = sandbox(target)
+    config = {
+        "gogoanime_main": site.base_url,
+        "downloads": str(root / "downloads"),
+        "captcha_v3": "bench",
+        "download_quality": str(args.quality),
+        "max_threads": args.threads,
+        "preview_status": "No Preview",
+        "hls_fallback": False,
+    }
+    if args.faults:
+        config["fault_plan"] = str(Path(args.faults).resolve())
+    for override in args.set:
+        key, _, value = override.partition("=")
+        try:
+            config[key] = json.loads(value)
+        except ValueError:
+            config[key] = value
+    (root / TARGETS[target].name / "setup.json").write_text(json.dumps(config))
+
+    job = root / "job.json"
+    result = root / "result.json"
+    job.write_text(json.dumps({
+        "workdir": str(root / "work"), "config": config, "keyword": slug.replace("-", " "),
+        "episode_urls": site.episode_urls(slug),
+        "trace": str(Path(args.trace_dir).resolve() / f"{target}.trace.json") if args.trace_dir else None,
+    }))
+    output = None if args.verbose else subprocess.DEVNULL
+    try:
+        subprocess.run([sys.executable, __file__, "--driver", target, "--job", str(job), "--result", str(result)],
+                       stdout=output, stderr=output, check=True, timeout=args.timeout)
+        return json.loads(result.read_text())
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def report(results: dict):
+    columns = [("episodes", "{:d}"), ("failed", "{:d}"), ("seconds", "{:.1f}"), ("episodes_per_min", "{:.1f}"),
+               ("mb_per_s", "{:.1f}"), ("resolve_p50_ms", "{:.1f}"), ("resolve_p99_ms", "{:.1f}"),
+               ("peak_rss_mb", "{:.1f}")]
+    print("target  " + "  ".join(f"{name:>16}" for name, _ in columns))
+    for target, result in results.items():
+        print(f"{target:<8}" + "  ".join(f"{fmt.format(result[name]):>16}" for name, fmt in columns))
+    for target, result in results.items():
+        if result["retries"]:
+            print(f"{target} retries: " + ", ".join(f"{error}={count}" for error, count in result["retries"].items()))
+        for rule, (matched, fired) in result["faults"].items():
+            print(f"{target} fault {rule}: {fired} injected of {matched} matching requests")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end download benchmark against a local mock site")
+    parser.add_argument("--target", choices=["cli", "webui", "all"], default="all")
+    parser.add_argument("--episodes", type=int, default=12)
+    parser.add_argument("--episode-mb", type=float, default=8, help="size at 1080p")
+    parser.add_argument("--quality", type=int, default=1080)
+    parser.add_argument("--threads", type=int, default=3, help="max_threads")
+    parser.add_argument("--bandwidth-kbps", type=float, default=0, help="per CDN connection, 0 for unlimited")
+    parser.add_argument("--latency-ms", type=float, default=0, help="added to every response")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra setup.json entry, the value parsed as JSON when possible")
+    parser.add_argument("--faults", help="fault plan file applied to every request (see fault_plans/)")
+    parser.add_argument("--trace-dir", help="save a Chrome trace of each run here")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--verbose", action="store_true", help="show the downloaders' output")
+    parser.add_argument("--driver", choices=list(TARGETS), help=argparse.SUPPRESS)
+    parser.add_argument("--job", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.driver:
+        child(args)
+        return
+
+    from mock_site import MockSite
+    if args.trace_dir:
+        os.makedirs(args.trace_dir, exist_ok=True)
+    site = MockSite(1, args.episodes, args.episode_mb, args.bandwidth_kbps * 1024 or None, args.latency_ms / 1000)
+    site.start()
+    try:
+        targets = list(TARGETS) if args.target == "all" else [args.target]
+        results = {target: run_target(target, site, args) for target in targets}
+    finally:
+        site.stop()
+    report(results)
+    print("mock site requests: " + ", ".join(f"{route}={count}" for route, count in sorted(site.requests.items())))
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Chunk-loop latency while episode pages are parsed, with and without the
+parse offload (parse_mode in setup.json), for a batch of episodes from
+the local mock site.
+
+Each run downloads the whole batch in a fresh interpreter and records
+every gap between two chunks of the same transfer. In the WebUI the event
+loop reads the chunks; in the CLI the download threads do. A page parsed
+in between shows up as a long gap; `stalls` counts gaps more than 50 ms
+over the median. For the WebUI, the lag of a 10 ms timer on the loop is
+reported as well.
+
+    python benchmarks/bench_parse.py
+    python benchmarks/bench_parse.py --target webui --modes off thread process --page-kb 120
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from bench import TARGETS, percentile, sandbox
+from mock_site import MockSite
+
+
+class GapRecorder:
+    """Time between consecutive chunks of one transfer, from any thread."""
+
+    def __init__(self):
+        self.gaps = []
+        self.last = {}
+        self.lock = threading.Lock()
+
+    def chunk(self, transfer):
+        now = time.perf_counter()
+        with self.lock:
+            if transfer in self.last:
+                self.gaps.append(now - self.last[transfer])
+            self.last[transfer] = now
+
+    def finish(self, transfer):
+        with self.lock:
+            self.last.pop(transfer, None)
+
+
+def run_webui(job: dict, recorder: GapRecorder) -> dict:
+    import webUI
+
+    webUI.configure()
+
+    class TimedManager(webUI.DownloadManager):
+        def _written(self, task, size):
+            if size > 0:
+                recorder.chunk(id(task))
+            super()._written(task, size)
+
+    lags = []
+
+    async def probe():
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - started - 0.01)
+
+    async def download():
+        manager = TimedManager(max_concurrent=job["threads"])
+        await manager.start()
+        probing = asyncio.create_task(probe())
+        tasks = []
+        # The same steps as download_episodes(): episodes are queued unresolved and resolved by the workers
+        for number, url in enumerate(job["episode_urls"], 1):
+            tasks.append(await manager.add_download(
+                url=None, filename=f"Episode {number}_episode_{number}.mp4", folder=job["downloads"],
+                episode=number, episode_url=url, title=f"Episode {number}"))
+        while any(task.state not in webUI.FINISHED for task in tasks):
+            await asyncio.sleep(0.05)
+        probing.cancel()
+        await manager.stop()
+
+    asyncio.run(download())
+    return {"loop_lag_p50_ms": (percentile(lags, 0.5) or 0) * 1000,
+            "loop_lag_p99_ms": (percentile(lags, 0.99) or 0) * 1000,
+            "loop_lag_max_ms": max(lags, default=0) * 1000}
+
+
+def run_cli(job: dict, recorder: GapRecorder) -> dict:
+    import main as cli
+
+    cli.configure()
+
+    fetch_to_file = cli.fetch_to_file
+
+    def timed_fetch_to_file(url, file_path, monitor=None, on_chunk=None):
+        transfer = object()
+
+        def timed_on_chunk(written):
+            recorder.chunk(transfer)
+            if on_chunk:
+                on_chunk(written)
+        try:
+            return fetch_to_file(url, file_path, monitor, timed_on_chunk)
+        finally:
+            recorder.finish(transfer)
+
+    cli.fetch_to_file = timed_fetch_to_file
+    links = [{"episode": str(number), "url": url, "title": f"Episode {number}"}
+             for number, url in enumerate(job["episode_urls"], 1)]
+    cli.download(links, job["downloads"])
+    return {}
+
+
+def child(args):
+    job = json.loads(Path(args.job).read_text())
+    os.chdir(job["workdir"])
+    sys.path.insert(0, str(TARGETS[args.driver]))
+    recorder = GapRecorder()
+    started = time.perf_counter()
+    result = (run_webui if args.driver == "webui" else run_cli)(job, recorder)
+    gaps = recorder.gaps
+    median = percentile(gaps, 0.5) or 0
+    result.update({
+        "seconds": time.perf_counter() - started,
+        "episodes": len(list(Path(job["downloads"]).glob("*.mp4"))),
+        "chunks": len(gaps),
+        "gap_p50_ms": median * 1000,
+        "gap_p99_ms": (percentile(gaps, 0.99) or 0) * 1000,
+        "gap_max_ms": max(gaps, default=0) * 1000,
+        "stalls": sum(gap > median + 0.05 for gap in gaps),  # chunks 50 ms later than usual
+    })
+    Path(args.result).write_text(json.dumps(result))
+    os._exit(0)  # the download workers and parser processes are not joined
+
+
+def run(target: str, mode: str, site: MockSite, args) -> dict:
+    root = sandbox(target)
+    config = {"gogoanime_main": site.base_url, "downloads": str(root / "downloads"), "captcha_v3": "bench",
+              "download_quality": "1080", "max_threads": args.threads, "preview_status": "No Preview",
+              "hls_fallback": False, "parse_mode": mode, "parse_workers": args.parse_workers,
+              "scrape_concurrency": 64, "scrape_rate": None}
+    (root / TARGETS[target].name / "setup.json").write_text(json.dumps(config))
+    job, result = root / "job.json", root / "result.json"
+    job.write_text(json.dumps({"workdir": str(root / "work"), "downloads": config["downloads"],
+                               "threads": args.threads, "episode_urls": site.episode_urls(site.slugs()[0])}))
+    output = None if args.verbose else subprocess.DEVNULL
+    try:
+        subprocess.run([sys.executable, __file__, "--driver", target, "--job", str(job), "--result", str(result)],
+                       stdout=output, stderr=output, check=True, timeout=args.timeout)
+        return json.loads(result.read_text())
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk-loop latency with and without the parse offload")
+    parser.add_argument("--target", choices=["cli", "webui", "all"], default="all")
+    parser.add_argument("--modes", nargs="+", choices=["off", "thread", "process"], default=["off", "process"])
+    parser.add_argument("--episodes", type=int, default=200)
+    parser.add_argument("--episode-mb", type=float, default=2)
+    parser.add_argument("--page-kb", type=float, default=60, help="size of each episode and download page")
+    parser.add_argument("--bandwidth-kbps", type=float, default=4096, help="per CDN connection, 0 for unlimited")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--parse-workers", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=900)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--driver", choices=["cli", "webui"], help=argparse.SUPPRESS)
+    parser.add_argument("--job", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.job:
+        child(args)
+        return
+
+    site = MockSite(1, args.episodes, args.episode_mb, args.bandwidth_kbps * 1024 or None, page_kb=args.page_kb)
+    site.start()
+    results = {}
+    try:
+        for target in (["cli", "webui"] if args.target == "all" else [args.target]):
+            for mode in args.modes:
+                results[f"{target}/{mode}"] = run(target, mode, site, args)
+    finally:
+        site.stop()
+
+    columns = ["episodes", "seconds", "chunks", "gap_p50_ms", "gap_p99_ms", "gap_max_ms", "stalls", "loop_lag_p99_ms"]
+    print(f"{'run':<16}" + "".join(f"{column:>16}" for column in columns))
+    for name, result in results.items():
+        cells = [result.get(column) for column in columns]
+        print(f"{name:<16}" + "".join(f"{'-' if cell is None else round(cell, 1):>16}" for cell in cells))
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
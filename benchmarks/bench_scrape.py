@@ -0,0 +1,137 @@
+"""
+Profile the CLI scraping layer (search pagination, create_links and
+resolve_sources) from a recorded cassette, offline and repeatably.
+
+Record once, against the mock site or the real one:
+
+    python benchmarks/bench_scrape.py --record scrape.json.gz --episodes 24
+    python benchmarks/bench_scrape.py --record live.json.gz --base-url https://anitaku.so \\
+        --keyword "one piece" --captcha <captcha_v3> --episodes 10
+
+then replay it as often as needed; politeness limits are lifted because
+nothing goes over the network:
+
+    python benchmarks/bench_scrape.py --replay scrape.json.gz --repeat 50
+
+When the site's markup changes, record again to refresh the fixture.
+"""
+import argparse
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from bench import TARGETS, peak_rss, percentile, sandbox
+
+
+def recorded_flow(path: str):
+    """(base URL, search keyword, episodes resolved) of a recorded cassette."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        requests = [interaction["request"] for interaction in json.load(f)["interactions"]]
+    search = next(request["url"] for request in requests if "/search.html" in request["url"])
+    parts = urlsplit(search)
+    episodes = sum(request["method"] == "POST" for request in requests)
+    return f"{parts.scheme}://{parts.netloc}", parse_qs(parts.query)["keyword"][0], episodes
+
+
+def child(args):
+    job = json.loads(Path(args.job).read_text())
+    os.chdir(job["workdir"])
+    sys.path.insert(0, str(TARGETS["cli"]))
+    import main as cli
+    from core.tracing import TRACER
+
+    cli.configure()
+    TRACER.enable()
+    timings = {"search": [], "create_links": [], "resolve_sources": []}
+    for _ in range(job["repeat"]):
+        TRACER.clear()
+        answers = iter([job["keyword"], "1", "1", "1", str(job["episodes"])])
+        cli.input = lambda prompt="": next(answers)
+        links = cli.search()
+        for event in TRACER.export()["traceEvents"]:
+            if event.get("name") in ("search", "create_links"):
+                timings[event["name"]].append(event["dur"] / 1e6)
+        for link in links:
+            started = time.perf_counter()
+            cli.resolve_sources(link["url"], link.get("title"))
+            timings["resolve_sources"].append(time.perf_counter() - started)
+    cli.cassette.save()
+    Path(args.result).write_text(json.dumps({
+        "timings": timings, "peak_rss_mb": peak_rss() / 1024 / 1024,
+        "cassette": {"hits": cli.cassette.hits, "misses": cli.cassette.misses, "recorded": cli.cassette.recorded},
+    }))
+    os._exit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the scraping layer from a recorded cassette")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--record", metavar="CASSETTE", help="record a cassette (.json or .json.gz)")
+    mode.add_argument("--replay", metavar="CASSETTE", help="replay a cassette offline")
+    parser.add_argument("--base-url", help="site to record from; the local mock site when omitted")
+    parser.add_argument("--keyword", default="bench anime")
+    parser.add_argument("--captcha", default="bench", help="captcha_v3 while recording; never stored")
+    parser.add_argument("--episodes", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=20, help="replay passes")
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--job", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.job:
+        child(args)
+        return
+    if not (args.record or args.replay):
+        parser.error("one of --record or --replay is required")
+
+    site = None
+    config = {"captcha_v3": args.captcha, "download_quality": "1080", "max_threads": 1,
+              "preview_status": "No Preview", "hls_fallback": False}
+    if args.record:
+        path, repeat, keyword, episodes = args.record, 1, args.keyword, args.episodes
+        if args.base_url:
+            base_url = args.base_url
+        else:
+            from mock_site import MockSite
+            site = MockSite(1, args.episodes)
+            base_url = site.start()
+        config.update(cassette_mode="record")
+    else:
+        path, repeat = args.replay, args.repeat
+        base_url, keyword, episodes = recorded_flow(path)
+        config.update(cassette_mode="replay", scrape_rate=None, scrape_concurrency=64)
+
+    root = sandbox("cli")
+    config.update(gogoanime_main=base_url, downloads=str(root / "downloads"), cassette=str(Path(path).resolve()))
+    (root / TARGETS["cli"].name / "setup.json").write_text(json.dumps(config))
+    job, result = root / "job.json", root / "result.json"
+    job.write_text(json.dumps({"workdir": str(root / "work"), "keyword": keyword, "episodes": episodes,
+                               "repeat": repeat}))
+    output = None if args.verbose else subprocess.DEVNULL
+    try:
+        subprocess.run([sys.executable, __file__, "--job", str(job), "--result", str(result)],
+                       stdout=output, stderr=output, check=True)
+        result = json.loads(result.read_text())
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+        if site:
+            site.stop()
+
+    print(f"{'stage':<16}{'calls':>8}{'p50 ms':>10}{'p99 ms':>10}{'total s':>10}")
+    for stage, values in result["timings"].items():
+        print(f"{stage:<16}{len(values):>8}{(percentile(values, 0.5) or 0) * 1000:>10.2f}"
+              f"{(percentile(values, 0.99) or 0) * 1000:>10.2f}{sum(values):>10.2f}")
+    cassette = result["cassette"]
+    print(f"peak RSS {result['peak_rss_mb']:.1f} MB; cassette {cassette['hits']} replayed, "
+          f"{cassette['misses']} missed, {cassette['recorded']} recorded")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Startup-time benchmark with a budget, for CI or before a release.
+
+Each UI is imported in a fresh interpreter under `python -X importtime`
+(inside a sandbox with its own setup.json, like bench.py) and the
+cumulative import time is compared with a budget in milliseconds. Modules
+that should only be imported when first used are checked as well. For the
+WebUI, the cost of a Streamlit rerun is measured with AppTest.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --target webui --repeat 9 --budget webui=600 --top 15
+
+Exits with status 1 when a target is over budget or imports a lazy module
+at startup.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from bench import TARGETS, sandbox
+
+MODULES = {"cli": "main", "webui": "webUI"}
+BUDGETS = {"cli": 250, "webui": 900}  # ms of cumulative import time on a warm disk cache
+LAZY = {  # imported where they are used, never at startup
+    "cli": ("requests", "hls", "core.faults", "core.cassettes"),
+    "webui": ("aiohttp", "aiofiles", "bs4", "requests", "psutil", "PIL", "core.faults", "core.cassettes"),
+}
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """(module, depth, self us, cumulative us) for every line -X importtime wrote."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative)))
+    return rows
+
+
+def config(root: Path) -> dict:
+    return {"gogoanime_main": "http://127.0.0.1:9", "downloads": str(root / "downloads"), "captcha_v3": "bench",
+            "download_quality": "1080", "max_threads": 3, "preview_status": "No Preview"}
+
+
+def measure_imports(target: str, repeat: int) -> dict:
+    root = sandbox(target)
+    try:
+        (root / TARGETS[target].name / "setup.json").write_text(json.dumps(config(root)))
+        env = dict(os.environ, PYTHONPATH=str(TARGETS[target]))
+        code = f"import {MODULES[target]}, sys; print(' '.join(sys.modules))"
+        runs = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=root / "work", env=env,
+                                     capture_output=True, text=True, check=True)
+            wall = time.perf_counter() - started
+            rows = parse_importtime(process.stderr)
+            # A module's imports are listed before it, one level deeper
+            end = next(index for index, row in enumerate(rows) if row[0] == MODULES[target] and row[1] == 0)
+            start = max((index for index, row in enumerate(rows[:end]) if row[1] == 0), default=-1) + 1
+            direct = [(name, cumulative / 1000) for name, depth, _, cumulative in rows[start:end] if depth == 1]
+            runs.append({"import_ms": rows[end][3] / 1000, "wall_ms": wall * 1000,
+                         "slowest": sorted(direct, key=lambda row: -row[1]),
+                         "eager": sorted(name for name in LAZY[target] if name in process.stdout.split())})
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    result = sorted(runs, key=lambda run: run["import_ms"])[len(runs) // 2]  # the median run
+    result["import_ms_all"] = [run["import_ms"] for run in runs]
+    return result
+
+
+def measure_reruns(reruns: int) -> Dict[str, float]:
+    """Runs in a child process so the WebUI modules are imported fresh."""
+    root = sandbox("webui")
+    try:
+        (root / TARGETS["webui"].name / "setup.json").write_text(json.dumps(config(root)))
+        result = root / "reruns.json"
+        subprocess.run([sys.executable, __file__, "--reruns-child", str(reruns), "--result", str(result)],
+                       cwd=root / "work", check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return json.loads(result.read_text())
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def reruns_child(reruns: int, result: str):
+    sys.path.insert(0, str(TARGETS["webui"]))
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(str(TARGETS["webui"] / "webUI.py"), default_timeout=120)
+    started = time.perf_counter()
+    app.run()
+    first = time.perf_counter() - started
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    timings = []
+    for _ in range(reruns):
+        started = time.perf_counter()
+        app.run()
+        timings.append(time.perf_counter() - started)
+    Path(result).write_text(json.dumps({"first_run_ms": first * 1000,
+                                        "rerun_p50_ms": statistics.median(timings) * 1000,
+                                        "rerun_max_ms": max(timings) * 1000}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time budget and Streamlit rerun cost of each UI")
+    parser.add_argument("--target", choices=list(MODULES) + ["all"], default="all")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per target; the median is kept")
+    parser.add_argument("--reruns", type=int, default=10, help="Streamlit reruns to time, 0 to skip")
+    parser.add_argument("--budget", action="append", default=[], metavar="TARGET=MS",
+                        help=f"override a budget (defaults: {', '.join(f'{k}={v}' for k, v in BUDGETS.items())})")
+    parser.add_argument("--top", type=int, default=10, help="slowest direct imports to list")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--reruns-child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.reruns_child is not None:
+        reruns_child(args.reruns_child, args.result)
+        return
+
+    budgets = dict(BUDGETS)
+    for override in args.budget:
+        target, _, value = override.partition("=")
+        budgets[target] = float(value)
+
+    failed = False
+    results = {}
+    for target in (list(MODULES) if args.target == "all" else [args.target]):
+        result = results[target] = measure_imports(target, args.repeat)
+        over = result["import_ms"] > budgets[target]
+        failed |= over or bool(result["eager"])
+        print(f"{target}: imports {result['import_ms']:.0f} ms of a {budgets[target]:.0f} ms budget"
+              f"{' (OVER)' if over else ''}, interpreter wall time {result['wall_ms']:.0f} ms")
+        for name, ms in result["slowest"][:args.top]:
+            print(f"  {ms:8.1f} ms  {name}")
+        if result["eager"]:
+            print(f"  imported at startup but should be lazy: {', '.join(result['eager'])}")
+        if target == "webui" and args.reruns:
+            result["reruns"] = measure_reruns(args.reruns)
+            print("  Streamlit first run {first_run_ms:.0f} ms, rerun p50 {rerun_p50_ms:.0f} ms, "
+                  "max {rerun_max_ms:.0f} ms".format(**result["reruns"]))
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Local stand-in for the anime site and its CDN, for benchmarks.
+
+Serves the pages the downloaders scrape (paginated search, category page,
+the load-list-episode ajax, episode page and the captcha download page)
+and a Range-capable CDN whose files are generated on the fly, so no disk
+space is needed on the server side. Latency is added to every response and
+each CDN connection is capped at `bandwidth` bytes per second. `page_kb`
+pads the episode and download pages with sidebar markup to the size of the
+real ones, for benchmarks where parsing cost matters.
+
+    python benchmarks/mock_site.py --animes 3 --episodes 12 --bandwidth-kbps 4096
+"""
+import argparse
+import asyncio
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+from aiohttp import web
+
+QUALITIES = {360: 0.162, 480: 0.244, 720: 0.526, 1080: 1.0}  # size relative to 1080p
+RESULTS_PER_PAGE = 20
+LINK_LIFETIME = 3600  # seconds a signed CDN link stays valid
+
+_BLOCK = bytes(i % 251 for i in range(251 * 261))  # file content repeats every 251 bytes
+
+
+def file_bytes(offset: int, length: int) -> bytes:
+    """Bytes [offset, offset + length) of every generated file."""
+    chunks = []
+    while length > 0:
+        start = offset % 251
+        chunk = _BLOCK[start:start + min(length, len(_BLOCK) - 251)]
+        chunks.append(chunk)
+        offset += len(chunk)
+        length -= len(chunk)
+    return b"".join(chunks)
+
+
+def sidebar(size: int) -> str:
+    """About `size` bytes of the recent-release list every real page carries."""
+    item = ('<li><a href="/recent-anime-{n}-episode-{n}" title="Recent Anime {n}"><div class="img">'
+            '<img src="/cover/recent-anime-{n}.png" alt="Recent Anime {n}"></div>'
+            '<p class="name">Recent Anime {n}</p><p class="time">Episode {n}</p></a></li>')
+    items = []
+    while sum(map(len, items)) < size:
+        items.append(item.format(n=len(items) + 1))
+    return f'<div class="menu_recent"><ul>{"".join(items)}</ul></div>' if items else ""
+
+
+class MockSite:
+    """
+    `animes` shows named "Bench Anime N", each with `episodes` episodes of
+    `episode_mb` MB at 1080p (smaller qualities scale with QUALITIES).
+    start() serves on a background thread and returns the base URL.
+    """
+
+    def __init__(self, animes: int = 1, episodes: int = 12, episode_mb: float = 8,
+                 bandwidth: Optional[float] = None, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0,
+                 page_kb: float = 0):
+        self.animes = animes
+        self.episodes = episodes
+        self.episode_size = int(episode_mb * 1024 * 1024)
+        self.bandwidth = bandwidth  # bytes per second per CDN connection, None for unlimited
+        self.latency = latency  # seconds added before every response
+        self.padding = sidebar(int(page_kb * 1024))
+        self.host = host
+        self.port = port
+        self.requests: Dict[str, int] = {}  # route -> count
+        self.bytes_served = 0
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.runner: Optional[web.AppRunner] = None
+        self.thread: Optional[threading.Thread] = None
+        self.base_url = ""
+
+    # Catalog
+
+    def slugs(self) -> List[str]:
+        return [f"bench-anime-{n}" for n in range(1, self.animes + 1)]
+
+    def episode_urls(self, slug: str) -> List[str]:
+        return [f"{self.base_url}/{slug}-episode-{n}" for n in range(1, self.episodes + 1)]
+
+    def file_size(self, quality: int) -> int:
+        return int(self.episode_size * QUALITIES[quality])
+
+    # Handlers
+
+    def _count(self, route: str):
+        self.requests[route] = self.requests.get(route, 0) + 1
+
+    async def _html(self, route: str, body: str) -> web.Response:
+        self._count(route)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.Response(text=f"<html><body>{body}</body></html>", content_type="text/html")
+
+    async def search(self, request: web.Request) -> web.Response:
+        keyword = request.query.get("keyword", "").lower()
+        page = int(request.query.get("page", 1))
+        matches = [slug for slug in self.slugs() if keyword in slug.replace("-", " ")]
+        pages = max((len(matches) + RESULTS_PER_PAGE - 1) // RESULTS_PER_PAGE, 1)
+        shown = matches[(page - 1) * RESULTS_PER_PAGE:page * RESULTS_PER_PAGE]
+        items = "".join(f'<li><p class="name"><a href="/category/{slug}" title="{slug.replace("-", " ").title()}">'
+                        f'{slug}</a></p></li>' for slug in shown)
+        pagination = ""
+        if pages > 1:
+            pagination = '<ul class="pagination-list">' + "".join(
+                f'<li><a href="?keyword={quote(keyword)}&page={n}">{n}</a></li>' for n in range(1, pages + 1)) + "</ul>"
+        return await self._html("search", f'{pagination}<ul class="items">{items}</ul>')
+
+    async def category(self, request: web.Request) -> web.Response:
+        slug = request.match_info["slug"]
+        body = (f'<script src="">var base_url_cdn_api = \'{self.base_url}/api/\';</script>'
+                f'<div class="anime_info_body_bg"><img src="{self.base_url}/cover/{slug}.jpg">'
+                f'<h1>{slug.replace("-", " ").title()}</h1>'
+                f'<p class="type">Type: TV</p><p class="type">Plot</p>'
+                f'<p class="type">Genre: <a>Action</a>, <a>Bench</a></p><p class="type">Released: 2024</p>'
+                f'<div class="description">Generated for benchmarks.</div></div>'
+                f'<input id="movie_id" value="{slug}">'
+                f'<ul id="episode_page"><li><a href="#" ep_start="0" ep_end="{self.episodes}">'
+                f'1-{self.episodes}</a></li></ul>')
+        return await self._html("category", body)
+
+    async def episode_list(self, request: web.Request) -> web.Response:
+        slug = request.query["id"]
+        end = min(int(request.query.get("ep_end", self.episodes)), self.episodes)
+        items = "".join(f'<li><a href=" /{slug}-episode-{n}"><div class="name"><span>EP</span> {n}</div></a></li>'
+                        for n in range(end, 0, -1))
+        return await self._html("episode_list", f'<ul id="episode_related">{items}</ul>')
+
+    async def episode(self, request: web.Request) -> web.Response:
+        slug, number = request.match_info["slug"], request.match_info["number"]
+        href = f"{self.base_url}/download?id={slug}.{number}&typesub=SUB&title={slug}"
+        return await self._html("episode_page", f'<div class="anime_video_body"><h1>{slug} Episode {number}</h1>'
+                                                f'</div><li class="dowloads"><a href="{href}">Download</a></li>'
+                                                f'{self.padding}')
+
+    async def download_page(self, request: web.Request) -> web.Response:
+        slug, number = request.query["id"].rsplit(".", 1)
+        expires = int(time.time()) + LINK_LIFETIME
+        links = "".join(f'<div class="dowload"><a href="{self.base_url}/cdn/{slug}/{number}/{quality}.mp4'
+                        f'?expires={expires}" download="">Download\n ({quality}P - mp4)</a></div>'
+                        for quality in sorted(QUALITIES))
+        title = f"{slug.replace('-', ' ').title()} Episode {number}"
+        return await self._html("captcha_post", f'<span id="title">{title}</span>{links}{self.padding}')
+
+    async def cdn(self, request: web.Request) -> web.StreamResponse:
+        self._count("cdn_head" if request.method == "HEAD" else "cdn")
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if int(request.query.get("expires", 0)) < time.time():
+            raise web.HTTPForbidden()
+        size = self.file_size(int(request.match_info["quality"]))
+        start, end = 0, size - 1
+        status = 200
+        range_header = request.headers.get("Range")
+        if range_header and range_header.startswith("bytes="):
+            first, _, last = range_header[6:].partition("-")
+            start = int(first or 0)
+            if start >= size:
+                return web.Response(status=416, headers={"Content-Range": f"bytes */{size}"})
+            end = min(int(last), size - 1) if last else size - 1
+            status = 206
+
+        response = web.StreamResponse(status=status, headers={
+            "Content-Type": "video/mp4", "Accept-Ranges": "bytes", "Content-Length": str(end - start + 1)})
+        if status == 206:
+            response.headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        await response.prepare(request)
+        if request.method == "HEAD":
+            return response
+
+        chunk_size = 64 * 1024
+        started = time.monotonic()
+        sent = 0
+        offset = start
+        try:
+            while offset <= end:
+                chunk = file_bytes(offset, min(chunk_size, end - offset + 1))
+                await response.write(chunk)
+                offset += len(chunk)
+                sent += len(chunk)
+                self.bytes_served += len(chunk)
+                if self.bandwidth:
+                    ahead = sent / self.bandwidth - (time.monotonic() - started)
+                    if ahead > 0:
+                        await asyncio.sleep(ahead)
+            await response.write_eof()
+        except ConnectionError:
+            pass  # the client gave up on the body, e.g. a reset injected on its side
+        return response
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([
+            web.get("/search.html", self.search),
+            web.get("/category/{slug}", self.category),
+            web.get("/api/ajax/load-list-episode", self.episode_list),
+            web.get(r"/{slug}-episode-{number:\d+}", self.episode),
+            web.post("/download", self.download_page),
+            web.route("*", r"/cdn/{slug}/{number}/{quality:\d+}.mp4", self.cdn),
+        ])
+        return app
+
+    # Lifecycle
+
+    def start(self) -> str:
+        started = threading.Event()
+
+        def serve():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.runner = web.AppRunner(self.app(), access_log=None)
+            self.loop.run_until_complete(self.runner.setup())
+            site = web.TCPSite(self.runner, self.host, self.port)
+            self.loop.run_until_complete(site.start())
+            self.port = site._server.sockets[0].getsockname()[1]
+            self.base_url = f"http://{self.host}:{self.port}"
+            started.set()
+            self.loop.run_forever()
+            self.loop.run_until_complete(self.runner.cleanup())
+            self.loop.close()
+
+        self.thread = threading.Thread(target=serve, daemon=True)
+        self.thread.start()
+        started.wait()
+        return self.base_url
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--animes", type=int, default=1)
+    parser.add_argument("--episodes", type=int, default=12)
+    parser.add_argument("--episode-mb", type=float, default=8)
+    parser.add_argument("--bandwidth-kbps", type=float, default=0, help="per CDN connection, 0 for unlimited")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--page-kb", type=float, default=0, help="pad episode and download pages to this size")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    site = MockSite(args.animes, args.episodes, args.episode_mb, args.bandwidth_kbps * 1024 or None,
+                    args.latency_ms / 1000, port=args.port, page_kb=args.page_kb)
+    print(f"Serving on {site.start()} (set it as gogoanime_main), Ctrl+C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        site.stop()
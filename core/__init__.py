@@ -0,0 +1,5 @@
+"""
+Scraping, scheduling and download bookkeeping shared by the command line,
+web and desktop interfaces. Each interface puts the repository root on
+sys.path and imports from here.
+"""
@@ -0,0 +1,294 @@
+import atexit
+import asyncio
+import base64
+import gzip
+import io
+import json
+import os
+import threading
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import aiohttp
+import requests
+from multidict import CIMultiDict, CIMultiDictProxy
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+RECORD = "record"  # always go to the network and store what comes back
+REPLAY = "replay"  # never go to the network; unrecorded requests fail
+ONCE = "once"  # replay what is recorded and record the rest
+
+KEPT_HEADERS = ("content-type", "content-length", "location", "retry-after", "content-range", "accept-ranges")
+TEXT_TYPES = ("text/", "json", "xml", "javascript")
+
+
+class CassetteMiss(requests.ConnectionError):
+    """A replayed request that is not in the cassette."""
+
+
+class Cassette:
+    """
+    Request/response pairs of the scraping layer, stored as JSON (gzipped
+    when the path ends in .gz) so parsers and schedulers can be profiled
+    offline and repeatably.
+
+    Only HEAD requests and text bodies up to `max_body` bytes are recorded,
+    which keeps video bytes out. Query parameters in `ignore_params` are
+    removed before matching and storing, so tokens such as captcha_v3 never
+    end up in a fixture. To refresh fixtures after the site's markup
+    changes, run the same flow again with the RECORD mode; entries are
+    replaced as they are fetched.
+    """
+
+    def __init__(self, path: str, mode: str = ONCE, ignore_params: Iterable[str] = ("captcha_v3",),
+                 max_body: int = 2 * 1024 * 1024):
+        if mode not in (RECORD, REPLAY, ONCE):
+            raise ValueError(f"Unknown cassette mode {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.ignore_params = set(ignore_params)
+        self.max_body = max_body
+        self.interactions: Dict[Tuple[str, str, str], dict] = {}
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.hits = self.misses = self.recorded = 0
+        if os.path.exists(path):
+            opener = gzip.open if path.endswith(".gz") else open
+            with opener(path, "rt", encoding="utf-8") as f:
+                for interaction in json.load(f)["interactions"]:
+                    request = interaction["request"]
+                    self.interactions[(request["method"], request["url"], request.get("body", ""))] = interaction
+        elif mode == REPLAY:
+            raise FileNotFoundError(f"No cassette at {path} to replay")
+
+    def _url(self, url: str) -> str:
+        parts = urlsplit(url)
+        query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                 if key not in self.ignore_params]
+        return urlunsplit(parts._replace(query=urlencode(query)))
+
+    def key(self, method: str, url: str, body=None) -> Tuple[str, str, str]:
+        if isinstance(body, bytes):
+            body = body.decode("utf-8", "replace")
+        return method.upper(), self._url(url), body or ""
+
+    def find(self, key) -> Optional[dict]:
+        """The recorded response for a request key, when the mode allows replaying it."""
+        if self.mode == RECORD:
+            return None
+        with self.lock:
+            interaction = self.interactions.get(key)
+            if interaction is None:
+                self.misses += 1
+                if self.mode == REPLAY:
+                    raise CassetteMiss(f"{key[0]} {key[1]} is not in cassette {self.path}")
+                return None
+            self.hits += 1
+            return interaction["response"]
+
+    def recordable(self, method: str, headers) -> bool:
+        if method.upper() == "HEAD":
+            return True
+        content_type = (headers.get("content-type") or "").lower()
+        length = headers.get("content-length")
+        return (any(kind in content_type for kind in TEXT_TYPES)
+                and (length is None or int(length) <= self.max_body))
+
+    def record(self, key, status: int, headers, body: bytes):
+        try:
+            text, encoding = body.decode("utf-8"), "utf-8"
+        except UnicodeDecodeError:
+            text, encoding = base64.b64encode(body).decode("ascii"), "base64"
+        response = {"status": status, "headers": {name: headers[name] for name in KEPT_HEADERS if name in headers},
+                    "body": text, "encoding": encoding}
+        with self.lock:
+            self.interactions[key] = {"request": {"method": key[0], "url": key[1], "body": key[2]},
+                                      "response": response}
+            self.recorded += 1
+            self.dirty = True
+
+    @staticmethod
+    def body(response: dict) -> bytes:
+        if response.get("encoding") == "base64":
+            return base64.b64decode(response["body"])
+        return response["body"].encode("utf-8")
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            opener = gzip.open if self.path.endswith(".gz") else open
+            temp_path = self.path + ".tmp"
+            with opener(temp_path, "wt", encoding="utf-8") as f:
+                json.dump({"version": 1, "interactions": list(self.interactions.values())}, f)
+            os.replace(temp_path, self.path)
+            self.dirty = False
+
+
+def load_cassette(path: str, mode: str = ONCE) -> Cassette:
+    """Open a cassette that is written back when the process exits."""
+    cassette = Cassette(path, mode)
+    atexit.register(cassette.save)
+    return cassette
+
+
+class CassetteAdapter(HTTPAdapter):
+    """
+    A requests transport adapter that replays from and records into a
+    Cassette. Live requests go through `inner` (e.g. a FaultInjectingAdapter)
+    when given.
+    """
+
+    def __init__(self, cassette: Cassette, inner: Optional[HTTPAdapter] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+        self.inner = inner
+
+    def send(self, request, **kwargs):
+        key = self.cassette.key(request.method, request.url, request.body)
+        recorded = self.cassette.find(key)
+        if recorded is not None:
+            return self._replayed(request, recorded)
+        response = self.inner.send(request, **kwargs) if self.inner else super().send(request, **kwargs)
+        if self.cassette.recordable(request.method, response.headers):
+            self.cassette.record(key, response.status_code, response.headers, response.content)
+        return response
+
+    @staticmethod
+    def _replayed(request, recorded: dict) -> requests.Response:
+        body = Cassette.body(recorded)
+        response = requests.Response()
+        response.status_code = recorded["status"]
+        response.reason = "Replayed"
+        response.headers = CaseInsensitiveDict(recorded["headers"])
+        response.url = request.url
+        response.request = request
+        response.raw = io.BytesIO(body)
+        response._content = body
+        response._content_consumed = True
+        return response
+
+    def close(self):
+        super().close()
+        if self.inner:
+            self.inner.close()
+
+
+def cassette_session(cassette: Cassette, session: Optional[requests.Session] = None) -> requests.Session:
+    """`session` (or a new one) with its current adapters wrapped by a CassetteAdapter."""
+    session = session or requests.Session()
+    for prefix in ("http://", "https://"):
+        session.mount(prefix, CassetteAdapter(cassette, session.get_adapter(prefix)))
+    return session
+
+
+# aiohttp
+
+class _ReplayedContent:
+    def __init__(self, body: bytes):
+        self._body = body
+
+    async def read(self, n: int = -1) -> bytes:
+        if n < 0:
+            n = len(self._body)
+        chunk, self._body = self._body[:n], self._body[n:]
+        return chunk
+
+    async def readany(self) -> bytes:
+        return await self.read()
+
+    async def iter_chunked(self, n: int):
+        while self._body:
+            yield await self.read(n)
+
+    async def iter_any(self):
+        while self._body:
+            yield await self.read()
+
+    def at_eof(self) -> bool:
+        return not self._body
+
+
+class ReplayedResponse:
+    """The parts of aiohttp.ClientResponse the downloaders use, served from a cassette or a fault plan."""
+
+    def __init__(self, method: str, url: str, recorded: dict, reason: str = "Replayed"):
+        self.method = method
+        self.url = url
+        self.status = recorded["status"]
+        self.reason = reason
+        self.headers = CIMultiDictProxy(CIMultiDict(recorded["headers"]))
+        self._body = Cassette.body(recorded)
+        self.content = _ReplayedContent(self._body)
+
+    @property
+    def ok(self) -> bool:
+        return self.status < 400
+
+    @property
+    def content_length(self) -> Optional[int]:
+        length = self.headers.get("content-length")
+        return int(length) if length else None
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise aiohttp.ClientResponseError(None, (), status=self.status, message=self.reason,
+                                              headers=self.headers)
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self, encoding: Optional[str] = None, errors: str = "strict") -> str:
+        return self._body.decode(encoding or "utf-8", errors)
+
+    async def json(self, **kwargs):
+        return json.loads(self._body)
+
+    def release(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class CassetteClientSession:
+    """
+    Wraps an aiohttp.ClientSession: request(), get(), post() and head()
+    replay from and record into a Cassette, everything else is the wrapped
+    session's.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, cassette: Cassette):
+        self._session = session
+        self.cassette = cassette
+
+    @asynccontextmanager
+    async def _request(self, method: str, url, **kwargs):
+        key = self.cassette.key(method, str(url), kwargs.get("data") if isinstance(kwargs.get("data"), (str, bytes))
+                                else None)
+        recorded = self.cassette.find(key)
+        if recorded is not None:
+            await asyncio.sleep(0)  # still yield to the loop like a real request
+            yield ReplayedResponse(method, str(url), recorded)
+            return
+        async with self._session.request(method, url, **kwargs) as response:
+            if self.cassette.recordable(method, response.headers):
+                self.cassette.record(key, response.status, response.headers, await response.read())
+            yield response
+
+    def request(self, method: str, url, **kwargs):
+        return self._request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self._request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self._request("POST", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self._request("HEAD", url, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
@@ -0,0 +1,213 @@
+import json
+import os
+import threading
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+REQUIRED = ("gogoanime_main", "downloads", "captcha_v3", "download_quality", "max_threads")
+NUMBERS = ("max_threads", "scrape_concurrency", "scrape_rate", "cdn_concurrency", "link_max_age",
+           "max_link_refreshes", "max_retries", "min_speed_kbps", "source_error_limit", "episode_size_mb",
+           "disk_margin_mb", "disk_budget_mb", "target_minutes", "bandwidth_kbps", "hls_segment_workers",
+           "metrics_port", "stream_port", "max_download_kbps", "parse_workers")
+QUALITIES = (360, 480, 720, 1080)
+PARSE_MODES = ("process", "thread", "off")
+
+
+class ConfigError(ValueError):
+    """setup.json is missing a required setting or has a value of the wrong kind."""
+
+
+def parse_quality(value) -> int:
+    """1080, "1080" or "1080p" -> 1080"""
+    try:
+        quality = int(str(value).lower().rstrip("p"))
+    except ValueError:
+        raise ConfigError(f"download_quality must be one of {QUALITIES}, not {value!r}") from None
+    if quality not in QUALITIES:
+        raise ConfigError(f"download_quality must be one of {QUALITIES}, not {value!r}")
+    return quality
+
+
+class Config(dict):
+    """
+    setup.json, validated when it is read. It stays a dict so settings are
+    still looked up with setup["..."] and setup.get("..."); the settings
+    every module needs are also typed properties.
+    """
+
+    def __init__(self, data: dict, path: str = "setup.json"):
+        super().__init__(data)
+        self.path = path
+        self.validate()
+
+    def validate(self):
+        missing = [key for key in REQUIRED if key not in self]
+        if missing:
+            raise ConfigError(f"{self.path} is missing {', '.join(missing)}")
+        for key in ("download_quality", "min_quality", "max_quality"):
+            if self.get(key) is not None:
+                parse_quality(self[key])
+        for key in NUMBERS:
+            value = self.get(key)
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0):
+                raise ConfigError(f"{key} in {self.path} must be a non-negative number, not {value!r}")
+        if not isinstance(self["max_threads"], int) or self["max_threads"] < 1:
+            raise ConfigError(f"max_threads in {self.path} must be a whole number of at least 1")
+        if self.get("parse_mode", "process") not in PARSE_MODES:
+            raise ConfigError(f"parse_mode in {self.path} must be one of {PARSE_MODES}, not {self['parse_mode']!r}")
+
+    @property
+    def base_url(self) -> str:
+        return self["gogoanime_main"]
+
+    @property
+    def download_folder(self) -> str:
+        return self["downloads"]
+
+    @property
+    def download_quality(self) -> int:
+        return parse_quality(self["download_quality"])
+
+    @property
+    def max_threads(self) -> int:
+        return self["max_threads"]
+
+    @property
+    def min_quality(self) -> Optional[int]:
+        return parse_quality(self["min_quality"]) if self.get("min_quality") is not None else None
+
+    @property
+    def max_quality(self) -> Optional[int]:
+        return parse_quality(self["max_quality"]) if self.get("max_quality") is not None else None
+
+    @property
+    def min_speed(self) -> float:
+        """Bytes per second below which a source is abandoned, 0 to never switch."""
+        return self.get("min_speed_kbps", 0) * 1024
+
+    @property
+    def bandwidth_cap(self) -> Optional[float]:
+        """Bytes per second for all downloads together, None for unlimited."""
+        return self["max_download_kbps"] * 1024 if self.get("max_download_kbps") else None
+
+    @property
+    def link_max_age(self) -> float:
+        return self.get("link_max_age", 600)
+
+    @property
+    def max_link_refreshes(self) -> int:
+        return self.get("max_link_refreshes", 3)
+
+    @property
+    def source_error_limit(self) -> int:
+        return self.get("source_error_limit", 2)
+
+
+_cache: Dict[str, Tuple[Tuple[int, int], Config]] = {}  # absolute path -> (file version, config)
+_lock = threading.Lock()
+
+
+def load_config(path: str, force: bool = False) -> Config:
+    """
+    The validated setup.json at `path`. The file is parsed once per version:
+    later calls cost a stat() until it is written again (or `force` is set).
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == version and not force:
+            return cached[1]
+    with open(path, "r") as f:
+        config = Config(json.load(f), path)
+    with _lock:
+        _cache[path] = (version, config)
+    return config
+
+
+Listener = Callable[[Config, Config, Set[str]], None]  # (old, new, changed keys)
+
+
+def changed_keys(old: dict, new: dict) -> Set[str]:
+    return {key for key in old.keys() | new.keys() if old.get(key) != new.get(key)}
+
+
+class ConfigWatcher:
+    """
+    The current Config of one setup.json, reloaded by a polling thread when
+    the file changes (a stat() every `interval` seconds) and right away when
+    it is written through save(). Listeners are called with (old, new,
+    changed keys) on the thread that noticed the change, so running
+    components can apply new settings without a restart. A file that fails
+    validation is reported in `error` and the last good config stays current.
+    """
+
+    def __init__(self, path: str, interval: float = 1.0):
+        self.path = os.path.abspath(path)
+        self.interval = interval
+        self.config = load_config(self.path)
+        self.error: Optional[str] = None
+        self.listeners: List[Tuple[Optional[FrozenSet[str]], Listener]] = []
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def current(self) -> Config:
+        return self.config
+
+    def subscribe(self, listener: Listener, keys: Optional[Iterable[str]] = None) -> Callable[[], None]:
+        """Call `listener` when any of `keys` (any setting when None) changes; returns an unsubscribe function."""
+        entry = (frozenset(keys) if keys is not None else None, listener)
+        with self.lock:
+            self.listeners.append(entry)
+
+        def unsubscribe():
+            with self.lock:
+                if entry in self.listeners:
+                    self.listeners.remove(entry)
+        return unsubscribe
+
+    def check(self, force: bool = False) -> Set[str]:
+        """Reload the file if it changed and notify listeners; returns the changed keys."""
+        try:
+            config = load_config(self.path, force)
+        except (OSError, ValueError) as e:
+            self.error = str(e)
+            return set()
+        self.error = None
+        with self.lock:
+            if config is self.config:
+                return set()
+            old, self.config = self.config, config
+            listeners = list(self.listeners)
+        changed = changed_keys(old, config)
+        for keys, listener in listeners:
+            if changed and (keys is None or changed & keys):
+                try:
+                    listener(old, config, changed)
+                except Exception as e:
+                    print(f"Settings listener error: {e}")
+        return changed
+
+    def save(self, data: dict) -> Set[str]:
+        """Validate and write `data` (ConfigError leaves the file untouched), then notify listeners."""
+        Config(data, self.path)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(data, f, indent=4)
+        os.replace(temp_path, self.path)
+        return self.check(force=True)
+
+    def _poll(self):
+        while not self.stopped.wait(self.interval):
+            self.check()
+
+    def start(self) -> "ConfigWatcher":
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._poll, name="config-watcher", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,340 @@
+import asyncio
+import io
+import json
+import random
+import re
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.exceptions import ProtocolError
+
+from .cassettes import ReplayedResponse
+
+
+@dataclass
+class FaultRule:
+    """
+    One scripted or probabilistic fault. A request matches when `url` (a
+    regex) is found in its URL and `method` is unset or equal; the rule
+    skips the first `after` matches, then fires with `probability` at most
+    `times` times (None for no limit).
+    """
+    url: str = "."
+    method: Optional[str] = None
+    after: int = 0
+    times: Optional[int] = None
+    probability: float = 1.0
+    name: Optional[str] = None
+    latency: float = 0.0  # seconds before the response
+    status: Optional[int] = None  # answer with this status instead of the server's response
+    headers: Dict[str, str] = field(default_factory=dict)  # sent with an injected status, e.g. Retry-After
+    body: str = ""
+    connect_error: bool = False  # fail as if the connection was refused
+    bandwidth: Optional[float] = None  # bytes per second for the body
+    reset_at: Optional[int] = None  # drop the connection after this many body bytes
+    truncate_at: Optional[int] = None  # end the body early without an error
+
+    def __post_init__(self):
+        self.pattern = re.compile(self.url)
+        self.matched = 0
+        self.fired = 0
+
+    @property
+    def label(self) -> str:
+        return self.name or self.url
+
+    @property
+    def shapes_body(self) -> bool:
+        return bool(self.bandwidth or self.reset_at is not None or self.truncate_at is not None)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FaultRule":
+        data = dict(data)
+        # Friendlier units in plan files
+        if "latency_ms" in data:
+            data["latency"] = data.pop("latency_ms") / 1000
+        if "bandwidth_kbps" in data:
+            data["bandwidth"] = data.pop("bandwidth_kbps") * 1024
+        return cls(**data)
+
+
+class FaultPlan:
+    """
+    Ordered fault rules; the first matching rule that fires applies to a
+    request. Random draws come from a seeded generator so a run can be
+    repeated exactly (with one worker, or when rules do not use probability).
+    """
+
+    def __init__(self, rules: List[FaultRule], seed: Optional[int] = 0):
+        self.rules = rules
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def pick(self, method: str, url: str) -> Optional[FaultRule]:
+        with self.lock:
+            for rule in self.rules:
+                if rule.method and rule.method.upper() != method.upper():
+                    continue
+                if not rule.pattern.search(url):
+                    continue
+                rule.matched += 1
+                if rule.matched <= rule.after or (rule.times is not None and rule.fired >= rule.times):
+                    continue
+                if rule.probability < 1 and self.random.random() >= rule.probability:
+                    continue
+                rule.fired += 1
+                return rule
+            return None
+
+    def summary(self) -> Dict[str, Tuple[int, int]]:
+        """rule label -> (requests matched, faults injected)"""
+        with self.lock:
+            return {f"{index}: {rule.label}": (rule.matched, rule.fired) for index, rule in enumerate(self.rules)}
+
+
+def load_fault_plan(path: str) -> FaultPlan:
+    """Read a plan file: {"seed": 1, "rules": [{"url": "/cdn/", "reset_at": 1048576, "times": 2}, ...]}"""
+    with open(path, "r") as f:
+        data = json.load(f)
+    return FaultPlan([FaultRule.from_dict(rule) for rule in data.get("rules", [])], data.get("seed", 0))
+
+
+class BodyShaper:
+    """Applies a rule's bandwidth cap, reset and truncation to a body delivered in chunks."""
+
+    def __init__(self, rule: FaultRule):
+        self.rule = rule
+        self.sent = 0
+        self.started: Optional[float] = None
+
+    def shape(self, chunk: bytes) -> Tuple[bytes, float, bool]:
+        """(bytes to deliver, seconds to wait before delivering them, whether the body ends after them)"""
+        if self.started is None:
+            self.started = time.monotonic()
+        limits = [limit for limit in (self.rule.reset_at, self.rule.truncate_at) if limit is not None]
+        end = False
+        if limits and self.sent + len(chunk) >= min(limits):
+            chunk = chunk[:max(min(limits) - self.sent, 0)]
+            end = True
+        self.sent += len(chunk)
+        delay = 0.0
+        if self.rule.bandwidth:
+            delay = max(self.sent / self.rule.bandwidth - (time.monotonic() - self.started), 0.0)
+        return chunk, delay, end
+
+    @property
+    def resets(self) -> bool:
+        """Whether the end of the body is a dropped connection rather than a clean EOF."""
+        return self.rule.reset_at is not None and (self.rule.truncate_at is None
+                                                   or self.rule.reset_at <= self.rule.truncate_at)
+
+
+# requests
+
+class _ShapedRaw:
+    """Wraps a urllib3 response so requests reads the body through a BodyShaper."""
+
+    def __init__(self, raw, rule: FaultRule):
+        self._raw = raw
+        self._shaper = BodyShaper(rule)
+
+    def stream(self, amt: int = 2 ** 16, decode_content: Optional[bool] = None):
+        for chunk in self._raw.stream(amt, decode_content=decode_content):
+            chunk, delay, end = self._shaper.shape(chunk)
+            if delay:
+                time.sleep(delay)
+            if chunk:
+                yield chunk
+            if end:
+                break
+        else:
+            return
+        self._raw.close()
+        if self._shaper.resets:
+            raise ProtocolError("Connection reset by peer (injected)", ConnectionResetError())
+
+    def read(self, amt: Optional[int] = None, decode_content: Optional[bool] = None, **kwargs) -> bytes:
+        return b"".join(self.stream(amt or 2 ** 16, decode_content))
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class FaultInjectingAdapter(HTTPAdapter):
+    """A requests transport adapter that applies a FaultPlan to every request sent through it."""
+
+    def __init__(self, plan: FaultPlan, **kwargs):
+        super().__init__(**kwargs)
+        self.plan = plan
+
+    def send(self, request, **kwargs):
+        rule = self.plan.pick(request.method, request.url)
+        if rule is None:
+            return super().send(request, **kwargs)
+        if rule.latency:
+            time.sleep(rule.latency)
+        if rule.connect_error:
+            raise requests.ConnectionError("Connection refused (injected)", request=request)
+        if rule.status is not None:
+            return self._injected(request, rule)
+        response = super().send(request, **kwargs)
+        if rule.shapes_body:
+            response.raw = _ShapedRaw(response.raw, rule)
+        return response
+
+    @staticmethod
+    def _injected(request, rule: FaultRule) -> requests.Response:
+        response = requests.Response()
+        response.status_code = rule.status
+        response.reason = "Injected"
+        response.headers = CaseInsensitiveDict(rule.headers)
+        response.url = request.url
+        response.request = request
+        response.raw = io.BytesIO(rule.body.encode())
+        response._content = rule.body.encode()
+        response._content_consumed = True
+        return response
+
+
+def faulty_session(plan: FaultPlan) -> requests.Session:
+    """A requests session whose HTTP and HTTPS traffic goes through a FaultInjectingAdapter."""
+    session = requests.Session()
+    adapter = FaultInjectingAdapter(plan)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# aiohttp
+
+class _ShapedContent:
+    """Wraps an aiohttp StreamReader so the body is read through a BodyShaper."""
+
+    def __init__(self, content, rule: FaultRule):
+        self._content = content
+        self._shaper = BodyShaper(rule)
+        self._ended = False
+        self._reset = False
+
+    async def _next(self, n: int) -> bytes:
+        if self._reset:
+            raise aiohttp.ClientPayloadError("Connection reset by peer (injected)")
+        if self._ended:
+            return b""
+        chunk = await (self._content.read(n) if n > 0 else self._content.readany())
+        if not chunk:
+            return b""
+        chunk, delay, end = self._shaper.shape(chunk)
+        if delay:
+            await asyncio.sleep(delay)
+        if end:
+            self._ended = True
+            self._reset = self._shaper.resets
+            if not chunk:
+                return await self._next(n)
+        return chunk
+
+    async def read(self, n: int = -1) -> bytes:
+        if n >= 0:
+            return await self._next(n)
+        chunks = []
+        while True:
+            chunk = await self._next(2 ** 16)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    async def readany(self) -> bytes:
+        return await self._next(-1)
+
+    async def iter_chunked(self, n: int):
+        while True:
+            chunk = await self._next(n)
+            if not chunk:
+                return
+            yield chunk
+
+    async def iter_any(self):
+        while True:
+            chunk = await self._next(-1)
+            if not chunk:
+                return
+            yield chunk
+
+    def __aiter__(self):
+        return self.iter_any()
+
+    def at_eof(self) -> bool:
+        return self._ended or self._content.at_eof()
+
+    def __getattr__(self, name):
+        return getattr(self._content, name)
+
+
+class _ShapedResponse:
+    """A live aiohttp response whose body is read through a BodyShaper; everything else is the response's."""
+
+    def __init__(self, response: aiohttp.ClientResponse, rule: FaultRule):
+        self._response = response
+        self.content = _ShapedContent(response.content, rule)
+
+    async def read(self) -> bytes:
+        return await self.content.read()
+
+    async def text(self, encoding: Optional[str] = None, errors: str = "strict") -> str:
+        return (await self.read()).decode(encoding or self._response.get_encoding(), errors)
+
+    async def json(self, **kwargs):
+        return json.loads(await self.read())
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+
+class FaultInjectingClientSession:
+    """
+    Wraps an aiohttp.ClientSession: request(), get(), post() and head()
+    apply a FaultPlan the way FaultInjectingAdapter does, everything else
+    is the wrapped session's. An injected status or connection error
+    replaces the request; body faults shape the server's response.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, plan: FaultPlan):
+        self._session = session
+        self.plan = plan
+
+    @asynccontextmanager
+    async def _request(self, method: str, url, **kwargs):
+        rule = self.plan.pick(method, str(url))
+        if rule is not None and rule.latency:
+            await asyncio.sleep(rule.latency)
+        if rule is not None and rule.connect_error:
+            raise aiohttp.ClientConnectionError("Connection refused (injected)")
+        if rule is not None and rule.status is not None:
+            yield ReplayedResponse(method, str(url), {"status": rule.status, "headers": rule.headers,
+                                                      "body": rule.body}, reason="Injected")
+            return
+        async with self._session.request(method, url, **kwargs) as response:
+            yield _ShapedResponse(response, rule) if rule is not None and rule.shapes_body else response
+
+    def request(self, method: str, url, **kwargs):
+        return self._request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self._request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self._request("POST", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self._request("HEAD", url, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
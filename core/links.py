@@ -0,0 +1,39 @@
+import time
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+# Signed CDN links answer these once their signature has expired
+EXPIRED_STATUSES = {403, 410}
+EXPIRY_PARAMS = ("expires", "expiry", "exp")
+
+
+class LinkExpired(Exception):
+    """A resolved download link was rejected by the CDN and must be resolved again."""
+
+
+def link_expires_at(url: str) -> Optional[float]:
+    """Unix time a signed link stops working, when the URL carries it."""
+    query = parse_qs(urlsplit(url).query)
+    for key, values in query.items():
+        if key.lower() in EXPIRY_PARAMS and values and values[0].isdigit():
+            value = int(values[0])
+            if value > 1_000_000_000:  # an absolute timestamp, not a lifetime
+                return float(value)
+    return None
+
+
+def link_is_stale(url: str, resolved_at: float, max_age: float, margin: float = 30.0) -> bool:
+    """
+    True when a link resolved at `resolved_at` (time.time()) should be
+    resolved again before use: its signed expiry is within `margin` seconds,
+    or, for links without one, it is older than `max_age`.
+    """
+    expires_at = link_expires_at(url)
+    if expires_at is not None:
+        return time.time() + margin >= expires_at
+    return time.time() - resolved_at >= max_age
+
+
+def check_expired(status: int, url: str):
+    if status in EXPIRED_STATUSES:
+        raise LinkExpired(f"HTTP {status}: Download link expired {url}")
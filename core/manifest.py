@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+MANIFEST_NAME = ".manifest.json"
+
+COMPLETE = "complete"
+PARTIAL = "partial"
+CORRUPT = "corrupt"
+MISSING = "missing"
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FolderManifest:
+    """
+    Index of the episodes in one download folder, stored in `.manifest.json`.
+
+    Entries are keyed by episode identity (the episode page URL) and record
+    the file name, quality, expected size, and the size, mtime and SHA-1 of
+    the file once it completed. check() only hashes a file again when its
+    size or mtime changed since it was recorded, so re-running a batch over
+    a large folder costs one stat per episode.
+
+    scan() indexes the files in the folder by size and mtime, so episodes
+    copied into it by hand (or downloaded before it had a manifest) can be
+    adopted without downloading them again.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.path = os.path.join(folder, MANIFEST_NAME)
+        self.lock = threading.Lock()
+        self.entries: Dict[str, dict] = {}
+        self.files: Dict[str, Tuple[int, int]] = {}  # name -> (size, mtime_ns) at the last scan
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}  # Rebuilt as episodes are downloaded again
+
+    def _save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.entries, f, indent=1)
+        os.replace(temp_path, self.path)
+
+    def scan(self) -> List[str]:
+        """
+        Index the files in the folder and return the names that appeared or
+        changed (by size or mtime) since the last scan. Only stats are read.
+        """
+        files = {}
+        for entry in os.scandir(self.folder):
+            if entry.is_file() and not entry.name.startswith("."):
+                stat = entry.stat()
+                files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            changed = [name for name, key in files.items() if self.files.get(name) != key]
+            self.files = files
+        return changed
+
+    def refresh(self) -> int:
+        """Rescan the folder and drop entries whose files were deleted; returns how many were dropped."""
+        self.scan()
+        with self.lock:
+            gone = [identity for identity, entry in self.entries.items() if entry["file"] not in self.files]
+            for identity in gone:
+                del self.entries[identity]
+            if gone:
+                self._save()
+            return len(gone)
+
+    def check(self, identity: str) -> Tuple[str, Optional[dict]]:
+        """(state, entry) of an episode: COMPLETE, PARTIAL, CORRUPT or MISSING."""
+        with self.lock:
+            entry = self.entries.get(identity)
+            if entry is None:
+                return MISSING, None
+            file_path = os.path.join(self.folder, entry["file"])
+            if not os.path.exists(file_path):
+                return MISSING, entry
+            stat = os.stat(file_path)
+            if not entry.get("digest"):
+                return PARTIAL, entry
+            if stat.st_size == entry["size"] and stat.st_mtime == entry["mtime"]:
+                return COMPLETE, entry
+            if stat.st_size < entry["size"]:
+                return PARTIAL, entry
+            # Changed since it was recorded: only the content can tell
+            if stat.st_size == entry["size"] and file_digest(file_path) == entry["digest"]:
+                entry["mtime"] = stat.st_mtime
+                self._save()
+                return COMPLETE, entry
+            return CORRUPT, entry
+
+    def started(self, identity: str, file_path: str, quality: Optional[int] = None,
+                expected: Optional[int] = None):
+        """Record a download in progress so a later run can resume it."""
+        with self.lock:
+            self.entries[identity] = {"file": os.path.basename(file_path), "quality": quality,
+                                      "expected": expected, "size": None, "mtime": None, "digest": None}
+            self._save()
+
+    def completed(self, identity: str, file_path: str, quality: Optional[int] = None,
+                  digest: Optional[str] = None):
+        """Record a finished file; pass `digest` when it is already known (a linked copy) to skip hashing."""
+        digest = digest or file_digest(file_path)  # outside the lock, this reads the whole file
+        stat = os.stat(file_path)
+        with self.lock:
+            self.entries[identity] = {"file": os.path.basename(file_path), "quality": quality,
+                                      "expected": stat.st_size, "size": stat.st_size,
+                                      "mtime": stat.st_mtime, "digest": digest}
+            self._save()
+
+    def adopt(self, identity: str, file_path: str, size: int, quality: Optional[int] = None) -> bool:
+        """
+        Record a file found in the folder as the complete episode when it has
+        the expected `size` and no entry claims it or the episode. A file the
+        manifest knows is never adopted by size: a sequential download
+        pre-sizes its file, so a failed one is full size but partly empty.
+        """
+        name = os.path.basename(file_path)
+        self.scan()  # picks up files copied in since the last call
+        with self.lock:
+            entry = self.entries.get(identity)
+            if entry is not None and entry["file"] in self.files:
+                return False
+            if any(other["file"] == name for other in self.entries.values()):
+                return False
+            if self.files.get(name, (None,))[0] != size:
+                return False
+        self.completed(identity, file_path, quality)
+        return True
+
+    def forget(self, identity: str):
+        with self.lock:
+            if self.entries.pop(identity, None) is not None:
+                self._save()
+
+
+_manifests: Dict[str, FolderManifest] = {}
+_manifests_lock = threading.Lock()
+
+
+def get_manifest(folder) -> FolderManifest:
+    """The shared manifest of a download folder, loaded and refreshed on first use."""
+    folder = os.path.abspath(folder)
+    with _manifests_lock:
+        if folder not in _manifests:
+            os.makedirs(folder, exist_ok=True)
+            _manifests[folder] = FolderManifest(folder)
+            _manifests[folder].refresh()
+        return _manifests[folder]
@@ -0,0 +1,222 @@
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+THROUGHPUT_BUCKETS = tuple(kb * 1024 for kb in (64, 256, 512, 1024, 2048, 4096, 8192, 16384))
+
+
+def _escape(value: str) -> str:
+    """A label value as the text format quotes it: backslash, double quote and newline escaped."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> List[Tuple[str, float]]:
+        with self.lock:
+            return [(self.name + self._labels(key), value) for key, value in self.values.items()]
+
+    def snapshot(self):
+        with self.lock:
+            return {",".join(key) or "": value for key, value in self.values.items()}
+
+
+class Gauge(Counter):
+    """A value that goes up and down, or is read from a callback when exported."""
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float]):
+        self.function = function
+
+    def _refresh(self):
+        if self.function is not None:
+            self.set(self.function())
+
+    def samples(self):
+        self._refresh()
+        return super().samples()
+
+    def snapshot(self):
+        self._refresh()
+        return super().snapshot()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        self.values: Dict[Tuple[str, ...], list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            series = self.values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        lines = []
+        with self.lock:
+            for key, series in self.values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append((self.name + "_bucket" + self._labels(key, f'le="{bound}"'), cumulative))
+                lines.append((self.name + "_bucket" + self._labels(key, 'le="+Inf"'), series[-1]))
+                lines.append((self.name + "_sum" + self._labels(key), series[-2]))
+                lines.append((self.name + "_count" + self._labels(key), series[-1]))
+        return lines
+
+    def snapshot(self):
+        with self.lock:
+            return {",".join(key) or "": {"count": series[-1], "sum": series[-2],
+                                          "buckets": dict(zip(map(str, self.buckets), series))}
+                    for key, series in self.values.items()}
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+        self.lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labelnames=()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines += [f"{sample} {value}" for sample, value in metric.samples()]
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """The same data as a JSON-friendly dict, keyed by metric name then label values."""
+        return {name: metric.snapshot() for name, metric in list(self.metrics.items())}
+
+
+REGISTRY = Registry()
+
+BYTES_DOWNLOADED = REGISTRY.counter("anime_downloader_bytes_total", "Bytes of video written to disk")
+DOWNLOADS = REGISTRY.counter("anime_downloader_downloads_total", "Finished episodes by result", ("result",))
+DOWNLOAD_THROUGHPUT = REGISTRY.histogram("anime_downloader_download_throughput_bytes_per_second",
+                                         "Average throughput of each finished download", (),
+                                         THROUGHPUT_BUCKETS)
+RESOLVE_SECONDS = REGISTRY.histogram("anime_downloader_resolve_seconds",
+                                     "Latency of each link resolution request", ("stage",))
+QUEUE_DEPTH = REGISTRY.gauge("anime_downloader_queue_depth", "Episodes waiting for a download worker")
+ACTIVE_WORKERS = REGISTRY.gauge("anime_downloader_active_workers", "Download workers busy with an episode")
+RETRIES = REGISTRY.counter("anime_downloader_retries_total", "Retried or abandoned attempts by error class",
+                           ("error",))
+CACHE_REQUESTS = REGISTRY.counter("anime_downloader_cache_requests_total", "Cache lookups by cache and result",
+                                  ("cache", "result"))
+
+
+class MetricsServer:
+    """Serves /metrics (Prometheus text) and /metrics.json (snapshot) on a background thread."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 9464, registry: Registry = REGISTRY):
+        self.registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = registry.prometheus().encode()
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(registry.snapshot()).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/metrics"
@@ -0,0 +1,239 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    import requests
+
+    from .config import Config
+
+THROTTLE_STATUSES = {429, 503}
+
+
+@dataclass
+class HostPolicy:
+    max_concurrent: int
+    rate: Optional[float] = None  # requests per second, None for unlimited
+    burst: int = 1
+
+
+def host_policies(config: "Config") -> Dict[str, HostPolicy]:
+    """The "scrape" and "cdn" limits from setup.json."""
+    return {
+        "scrape": HostPolicy(config.get("scrape_concurrency", 4), config.get("scrape_rate", 4.0), burst=4),
+        "cdn": HostPolicy(config.get("cdn_concurrency", config.max_threads)),
+    }
+
+
+class _HostState:
+    def __init__(self, policy: HostPolicy):
+        self.policy = policy
+        self.active = 0
+        self.tokens = float(policy.burst)
+        self.updated = time.monotonic()
+        self.cooldown_until = 0.0
+        self.strikes = 0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HostScheduler:
+    """
+    Per-host politeness limits shared by every scraper and downloader.
+
+    Requests are keyed by (kind, host), so scraping the site ("scrape") and
+    pulling video bytes from the CDN ("cdn") have separate concurrency caps
+    and request-rate budgets and cannot starve each other. A 429/503 puts
+    that key into a cooldown for the Retry-After duration (or an exponential
+    backoff when the header is missing), which every caller then honours.
+
+    State is guarded by a threading lock, so worker threads and the asyncio
+    loop share the same budgets.
+    """
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, policies: Dict[str, HostPolicy], max_retries: int = 5,
+                 session: Optional["requests.Session"] = None):
+        self.policies = policies
+        self.max_retries = max_retries
+        self.session = session  # transport for requests made without a session of their own
+        self.hosts: Dict[Tuple[str, str], _HostState] = {}
+        self.lock = threading.Lock()
+
+    def _state(self, kind: str, host: str) -> _HostState:
+        key = (kind, host)
+        if key not in self.hosts:
+            self.hosts[key] = _HostState(self.policies[kind])
+        return self.hosts[key]
+
+    def set_policy(self, kind: str, policy: HostPolicy):
+        """Change the limits for `kind` while requests run; slots already taken are kept."""
+        with self.lock:
+            self.policies[kind] = policy
+            for (state_kind, _), state in self.hosts.items():
+                if state_kind == kind:
+                    state.policy = policy
+                    state.tokens = min(state.tokens, policy.burst)
+
+    def try_acquire(self, kind: str, url: str) -> float:
+        """Take a slot and a token for this host; returns 0 on success, else seconds to wait."""
+        with self.lock:
+            state = self._state(kind, urlsplit(url).netloc)
+            now = time.monotonic()
+
+            if now < state.cooldown_until:
+                return state.cooldown_until - now
+            if state.active >= state.policy.max_concurrent:
+                return self.POLL_INTERVAL
+
+            if state.policy.rate:
+                state.tokens = min(state.policy.burst,
+                                   state.tokens + (now - state.updated) * state.policy.rate)
+                state.updated = now
+                if state.tokens < 1:
+                    return (1 - state.tokens) / state.policy.rate
+                state.tokens -= 1
+
+            state.active += 1
+            return 0.0
+
+    def release(self, kind: str, url: str):
+        with self.lock:
+            self._state(kind, urlsplit(url).netloc).active -= 1
+
+    def throttled(self, kind: str, url: str, retry_after: Optional[str]) -> float:
+        """Record a 429/503 for this host and return how long callers will wait."""
+        with self.lock:
+            state = self._state(kind, urlsplit(url).netloc)
+            state.strikes += 1
+            delay = parse_retry_after(retry_after)
+            if delay is None:
+                delay = min(2 ** state.strikes, 60)
+            state.cooldown_until = max(state.cooldown_until, time.monotonic() + delay)
+            return delay
+
+    def succeeded(self, kind: str, url: str):
+        with self.lock:
+            self._state(kind, urlsplit(url).netloc).strikes = 0
+
+    # Blocking API for requests
+
+    @contextmanager
+    def slot(self, kind: str, url: str):
+        while True:
+            wait = self.try_acquire(kind, url)
+            if not wait:
+                break
+            time.sleep(wait)
+        try:
+            yield
+        finally:
+            self.release(kind, url)
+
+    @contextmanager
+    def open(self, method: str, url: str, kind: str = "scrape",
+             session: Optional["requests.Session"] = None, **kwargs):
+        """
+        Perform a request inside a host slot, retrying throttled responses.
+        The slot is held until the block exits, so streamed bodies count too.
+        """
+        import requests  # imported on first use, it is one of the slowest imports at startup
+
+        for attempt in range(self.max_retries + 1):
+            with self.slot(kind, url):
+                response = (session or self.session or requests).request(method, url, **kwargs)
+                if response.status_code not in THROTTLE_STATUSES or attempt == self.max_retries:
+                    self.succeeded(kind, url)
+                    try:
+                        yield response
+                    finally:
+                        response.close()
+                    return
+                self.throttled(kind, url, response.headers.get("Retry-After"))
+                response.close()
+
+    def get_text(self, url: str, session: Optional["requests.Session"] = None, **kwargs) -> str:
+        with self.open("GET", url, "scrape", session, **kwargs) as response:
+            return response.text
+
+    def post_text(self, url: str, session: Optional["requests.Session"] = None, **kwargs) -> str:
+        with self.open("POST", url, "scrape", session, **kwargs) as response:
+            return response.text
+
+    # Async API for aiohttp
+
+    @asynccontextmanager
+    async def async_slot(self, kind: str, url: str):
+        while True:
+            wait = self.try_acquire(kind, url)
+            if not wait:
+                break
+            await asyncio.sleep(wait)
+        try:
+            yield
+        finally:
+            self.release(kind, url)
+
+    @asynccontextmanager
+    async def async_open(self, session, method: str, url: str, kind: str = "scrape", **kwargs):
+        """aiohttp counterpart of open(); yields the response with its slot held."""
+        for attempt in range(self.max_retries + 1):
+            async with self.async_slot(kind, url):
+                async with session.request(method, url, **kwargs) as response:
+                    if response.status not in THROTTLE_STATUSES or attempt == self.max_retries:
+                        self.succeeded(kind, url)
+                        yield response
+                        return
+                    self.throttled(kind, url, response.headers.get("Retry-After"))
+
+
+class BandwidthLimiter:
+    """
+    One cap on bytes per second shared by every download. `rate` can be
+    changed (None lifts the cap) while transfers run; at most one second of
+    unused allowance is carried over.
+    """
+
+    def __init__(self, rate: Optional[float] = None):
+        self.rate = rate
+        self.allowance = 0.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def set_rate(self, rate: Optional[float]):
+        with self.lock:
+            self.rate = rate or None
+            self.allowance = 0.0
+            self.updated = time.monotonic()
+
+    def reserve(self, size: int) -> float:
+        """Account `size` bytes; returns seconds to wait before they are within the cap."""
+        with self.lock:
+            if not self.rate:
+                return 0.0
+            now = time.monotonic()
+            self.allowance = min(self.allowance + (now - self.updated) * self.rate, self.rate) - size
+            self.updated = now
+            return -self.allowance / self.rate if self.allowance < 0 else 0.0
+
+    async def consume(self, size: int):
+        delay = self.reserve(size)
+        if delay:
+            await asyncio.sleep(delay)
@@ -0,0 +1,171 @@
+import asyncio
+import errno
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from typing import Dict, Hashable, List, Optional, Tuple
+
+DEFAULT_EPISODE_SIZE = 300 * 1024 * 1024  # used until a real size is known
+
+
+def existing_parent(folder) -> str:
+    """The folder itself or its nearest existing parent, for disk usage queries."""
+    folder = os.path.abspath(folder)
+    while not os.path.exists(folder):
+        parent = os.path.dirname(folder)
+        if parent == folder:
+            break
+        folder = parent
+    return folder
+
+
+def check_space(sizes: Dict[str, int], margin: int = 0) -> List[Tuple[str, int, int]]:
+    """
+    Pre-flight check of expected bytes per target folder. Folders on the
+    same drive are summed; returns (folder, needed, free) for each drive
+    that cannot hold its share.
+    """
+    drives: Dict[int, List] = {}
+    for folder, size in sizes.items():
+        path = existing_parent(folder)
+        drive = drives.setdefault(os.stat(path).st_dev, [folder, 0, shutil.disk_usage(path).free])
+        drive[1] += size
+    return [(folder, needed, free) for folder, needed, free in drives.values() if needed + margin > free]
+
+
+class Reservation:
+    def __init__(self, admission: "DiskAdmission", drive: int, size: int):
+        self.admission = admission
+        self.drive = drive
+        self.remaining = size
+
+    def consume(self, size: int):
+        """Bytes written to disk no longer need to be held back; negative for bytes discarded."""
+        self.admission._adjust(self, -min(size, self.remaining))
+
+    def release(self):
+        self.admission._adjust(self, -self.remaining)
+
+
+class DiskAdmission:
+    """
+    Admission control for downloads, per drive.
+
+    Each running download reserves the bytes it still has to write. A new
+    download starts only when free space minus every reservation (and a
+    safety margin) can hold it; otherwise it waits until running downloads
+    finish. A download that cannot fit even with nothing else running fails
+    right away instead of waiting forever.
+    """
+    POLL_INTERVAL = 5.0  # free space can also change outside this process
+
+    def __init__(self, margin: int = 512 * 1024 * 1024):
+        self.margin = margin
+        self.reserved: Dict[int, int] = {}
+        self.condition = threading.Condition()
+
+    def _adjust(self, reservation: Reservation, change: int):
+        with self.condition:
+            reservation.remaining += change
+            self.reserved[reservation.drive] += change
+            self.condition.notify_all()
+
+    def try_reserve(self, folder, size: int) -> Optional[Reservation]:
+        path = existing_parent(folder)
+        drive = os.stat(path).st_dev
+        with self.condition:
+            reserved = self.reserved.get(drive, 0)
+            free = shutil.disk_usage(path).free - self.margin
+            if size <= free - reserved:
+                self.reserved[drive] = reserved + size
+                return Reservation(self, drive, size)
+            if not reserved:
+                raise OSError(errno.ENOSPC, f"Not enough disk space in {folder}: "
+                                            f"{format_size(size)} needed, {format_size(max(free, 0))} free")
+            return None
+
+    def reserve(self, folder, size: int) -> Reservation:
+        """Block until `size` bytes can be reserved on the drive holding `folder`."""
+        while True:
+            reservation = self.try_reserve(folder, size)
+            if reservation is not None:
+                return reservation
+            with self.condition:
+                self.condition.wait(self.POLL_INTERVAL)
+
+    async def async_reserve(self, folder, size: int, poll: float = 1.0) -> Reservation:
+        """reserve() for the asyncio loop; polls instead of blocking it."""
+        while True:
+            reservation = self.try_reserve(folder, size)
+            if reservation is not None:
+                return reservation
+            await asyncio.sleep(poll)
+
+
+class BatchProgress:
+    """
+    Bytes expected and downloaded across a batch, with an ETA from the
+    throughput measured over the last `window` seconds.
+    """
+
+    def __init__(self, jobs: int, default_size: int = DEFAULT_EPISODE_SIZE, window: float = 60.0):
+        self.jobs = jobs
+        self.default_size = default_size
+        self.window = window
+        self.sizes: Dict[Hashable, int] = {}
+        self.downloaded = 0
+        self.transferred = 0  # unlike `downloaded`, never reduced, so the speed stays true
+        self.samples = deque()
+        self.lock = threading.Lock()
+
+    def expect(self, job: Hashable, size: int):
+        with self.lock:
+            self.sizes[job] = size
+
+    def add(self, size: int):
+        """Record bytes written; negative for bytes discarded, e.g. when switching sources."""
+        with self.lock:
+            self.downloaded += size
+            if size < 0:
+                return
+            self.transferred += size
+            now = time.monotonic()
+            self.samples.append((now, self.transferred))
+            while len(self.samples) > 2 and self.samples[0][0] < now - self.window:
+                self.samples.popleft()
+
+    def expected(self) -> int:
+        with self.lock:
+            return sum(self.sizes.values()) + max(self.jobs - len(self.sizes), 0) * self.default_size
+
+    def speed(self) -> float:
+        with self.lock:
+            if len(self.samples) < 2:
+                return 0.0
+            (start, start_bytes), (end, end_bytes) = self.samples[0], self.samples[-1]
+            return (end_bytes - start_bytes) / (end - start) if end > start else 0.0
+
+    def eta(self) -> Optional[float]:
+        speed = self.speed()
+        return max(self.expected() - self.downloaded, 0) / speed if speed else None
+
+    def summary(self) -> str:
+        eta = self.eta()
+        return (f"{format_size(self.downloaded)} of ~{format_size(self.expected())}, "
+                f"{format_size(self.speed())}/s, ETA {format_duration(eta) if eta is not None else 'unknown'}")
+
+
+def format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m" if hours else f"{minutes}m {seconds:02d}s"
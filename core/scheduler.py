@@ -0,0 +1,210 @@
+import asyncio
+import heapq
+import itertools
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import aiohttp
+    import requests
+
+    from .politeness import HostScheduler
+
+# Lower numbers are downloaded first, like queue.PriorityQueue and asyncio.PriorityQueue
+DEFAULT_PRIORITY = 0
+WATCH_NEXT_PRIORITY = -100
+
+
+class PriorityTaskQueue(queue.Queue):
+    """
+    Drop-in replacement for the download queue.Queue, ordered by priority.
+
+    Items are the episode dicts used by the download workers; an optional
+    "priority" key (lower runs first) and "size" key (bytes) control ordering.
+    With the "sjf" policy, episodes of equal priority run shortest first and
+    episodes of unknown size run after the known ones. Ties keep FIFO order.
+
+    Priorities and sizes can change while items are queued; the heap is
+    fixed up in place so nothing needs to be re-enqueued. A None sentinel
+    always sorts last so workers drain real work before shutting down.
+    """
+
+    def __init__(self, policy: str = "fifo", maxsize: int = 0):
+        if policy not in ("fifo", "sjf"):
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self.policy = policy
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        self.queue = []
+        self.counter = itertools.count()
+
+    def _qsize(self):
+        return len(self.queue)
+
+    def _sort_key(self, item) -> tuple:
+        if item is None:
+            return float("inf"), float("inf")
+        priority = item.get("priority", DEFAULT_PRIORITY)
+        if self.policy != "sjf":
+            return priority, 0
+        return priority, item.get("size") or float("inf")
+
+    def _put(self, item):
+        heapq.heappush(self.queue, [*self._sort_key(item), next(self.counter), item])
+
+    def _get(self):
+        return heapq.heappop(self.queue)[-1]
+
+    def update(self, match: Callable[[dict], bool], **changes) -> int:
+        """
+        Set `changes` on queued items matching `match` and reorder them;
+        returns how many changed. Items a worker already took are left alone.
+        """
+        updated = 0
+        with self.mutex:
+            for entry in self.queue:
+                item = entry[-1]
+                if item is not None and match(item):
+                    item.update(changes)
+                    entry[0], entry[1] = self._sort_key(item)
+                    updated += 1
+            if updated:
+                heapq.heapify(self.queue)
+        return updated
+
+    def set_priority(self, match: Callable[[dict], bool], priority: int) -> int:
+        """Change the priority of queued items matching `match`; returns how many changed."""
+        return self.update(match, priority=priority)
+
+    def set_size(self, match: Callable[[dict], bool], size: int) -> int:
+        return self.update(match, size=size)
+
+    def promote(self, match: Callable[[dict], bool]) -> int:
+        """Move matching items to the front of the queue ("watch next")."""
+        return self.set_priority(match, WATCH_NEXT_PRIORITY)
+
+    def queued(self, match: Callable[[dict], bool]) -> bool:
+        """True while an item matching `match` waits in the queue."""
+        with self.mutex:
+            return any(entry[-1] is not None and match(entry[-1]) for entry in self.queue)
+
+    def snapshot(self) -> List[dict]:
+        """Queued items in the order they will be handed out."""
+        with self.mutex:
+            return [entry[-1] for entry in sorted(self.queue) if entry[-1] is not None]
+
+
+class DownloadPriorityQueue(asyncio.Queue):
+    """
+    Drop-in replacement for the DownloadManager asyncio.Queue, ordered by priority.
+
+    Queued objects expose `priority` (lower runs first) and `size` (bytes or
+    None). With the "sjf" policy, tasks of equal priority run shortest first
+    and tasks of unknown size run after the known ones. Ties keep FIFO order.
+    Priorities and sizes can be changed while tasks wait in the queue.
+    """
+
+    def __init__(self, policy: str = "fifo", maxsize: int = 0):
+        if policy not in ("fifo", "sjf"):
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self.policy = policy
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        self._queue = []
+        self._counter = itertools.count()
+
+    def _sort_key(self, task) -> tuple:
+        if self.policy != "sjf":
+            return task.priority, 0
+        return task.priority, task.size or float("inf")
+
+    def _put(self, task):
+        heapq.heappush(self._queue, [*self._sort_key(task), next(self._counter), task])
+
+    def _get(self):
+        return heapq.heappop(self._queue)[-1]
+
+    def update(self, match: Callable, **changes) -> int:
+        """Set `changes` on queued tasks matching `match` and reorder them; returns how many changed."""
+        updated = 0
+        for entry in self._queue:
+            task = entry[-1]
+            if match(task):
+                for name, value in changes.items():
+                    setattr(task, name, value)
+                entry[0], entry[1] = self._sort_key(task)
+                updated += 1
+        if updated:
+            heapq.heapify(self._queue)
+        return updated
+
+    def set_priority(self, match: Callable, priority: int) -> int:
+        """Change the priority of queued tasks matching `match`; returns how many changed."""
+        return self.update(match, priority=priority)
+
+    def set_size(self, match: Callable, size: int) -> int:
+        return self.update(match, size=size)
+
+    def promote(self, match: Callable) -> int:
+        """Move matching tasks to the front of the queue ("watch next")."""
+        return self.set_priority(match, WATCH_NEXT_PRIORITY)
+
+    def snapshot(self) -> List:
+        """Queued tasks in the order they will be handed out."""
+        return [entry[-1] for entry in sorted(self._queue, key=lambda entry: entry[:3])]
+
+
+def probe_size(url: str, scheduler: Optional["HostScheduler"] = None,
+               session: Optional["requests.Session"] = None) -> Optional[int]:
+    """
+    Content-Length from a HEAD request, or None when the server does not send
+    one. With a `scheduler` the request takes a "cdn" slot of its host, like
+    the downloads do.
+    """
+    import requests
+
+    try:
+        if scheduler is not None:
+            request = scheduler.open("HEAD", url, "cdn", session, allow_redirects=True, timeout=15)
+        else:
+            request = nullcontext((session or requests).head(url, allow_redirects=True, timeout=15))
+        with request as response:
+            length = response.headers.get("content-length")
+            return int(length) if response.ok and length else None
+    except (requests.RequestException, ValueError):
+        return None
+
+
+def probe_sizes(urls: List[str], max_workers: int = 8,
+                scheduler: Optional["HostScheduler"] = None) -> Dict[str, Optional[int]]:
+    """HEAD all urls concurrently; returns url -> size (None if unknown)."""
+    import requests
+
+    session = requests.Session() if scheduler is None else None  # the scheduler brings its own
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return dict(zip(urls, pool.map(lambda url: probe_size(url, scheduler, session), urls)))
+    finally:
+        if session is not None:
+            session.close()
+
+
+async def async_probe_size(session: "aiohttp.ClientSession", url: str,
+                           scheduler: Optional["HostScheduler"] = None) -> Optional[int]:
+    """probe_size() for the asyncio loop."""
+    import aiohttp
+
+    kwargs = {"allow_redirects": True, "timeout": aiohttp.ClientTimeout(total=15)}
+    try:
+        request = (scheduler.async_open(session, "HEAD", url, "cdn", **kwargs) if scheduler is not None
+                   else session.head(url, **kwargs))
+        async with request as response:
+            if response.status == 200 and response.content_length:
+                return response.content_length
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        pass
+    return None
@@ -0,0 +1,178 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import BrokenExecutor, Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple, TypeVar
+
+from .config import PARSE_MODES
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+
+@dataclass
+class Source:
+    quality: int  # vertical resolution, 0 when the label could not be parsed
+    url: str
+
+
+class SlowSource(Exception):
+    """The current source stayed below the minimum throughput."""
+
+
+def parse_sources(soup: "BeautifulSoup") -> List[Source]:
+    """Every direct download link on the download page, in page order."""
+    sources = []
+    for i in soup.find_all("div", {"class": "dowload"}):
+        a = i.a
+        if a is None or 'download=""' not in str(a):
+            continue
+        quality = a.string.replace(" ", "").replace("Download", "")
+        try:
+            quality = int(quality[2:quality.find("P")])
+        except ValueError:
+            quality = 0
+        sources.append(Source(quality, a.get("href")))
+    return sources
+
+
+def page_title(soup: "BeautifulSoup") -> Optional[str]:
+    """The episode title on a download page or an episode page."""
+    tag = soup.find("span", {"id": "title"}) or soup.select_one("div.anime_video_body h1")
+    return tag.get_text(strip=True) if tag else None
+
+
+# Parsers for ParsePool: plain HTML text in, picklable values out
+
+def parse_episode_page(html: str) -> Tuple[str, Optional[str]]:
+    """(download page link, title) of an episode page."""
+    from bs4 import BeautifulSoup
+
+    page = BeautifulSoup(html, "html.parser")
+    return page.find("li", {"class": "dowloads"}).a.get("href"), page_title(page)
+
+
+def parse_download_page(html: str) -> Tuple[List[Source], Optional[str]]:
+    """(direct download links in page order, title) of the download page the captcha POST returns."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    return parse_sources(soup), page_title(soup)
+
+
+T = TypeVar("T")
+
+
+class ParsePool:
+    """
+    Where CPU-bound page parsing runs. BeautifulSoup holds the GIL, so a
+    page parsed on a download thread or on the event loop stalls every
+    transfer in progress for as long as it takes.
+
+    "process" parses in `workers` spawned processes, which frees both the
+    threads and the loop; "thread" uses a background thread, which frees the
+    event loop but still competes for the GIL; "off" parses in the caller.
+    Workers start on first use. A process pool that breaks (a worker was
+    killed) is replaced by a thread.
+    """
+
+    def __init__(self, mode: str = "process", workers: int = 2):
+        if mode not in PARSE_MODES:
+            raise ValueError(f"parse_mode must be one of {PARSE_MODES}, not {mode!r}")
+        self.mode = mode
+        self.workers = max(workers, 1)
+        self.executor: Optional[Executor] = None
+        self.lock = threading.Lock()
+
+    def _executor(self) -> Optional[Executor]:
+        with self.lock:
+            if self.executor is None and self.mode == "process":
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                # Spawned workers import the parent's main script again; the UIs only set up (exit
+                # handlers, servers, threads) from main(), so that import has no side effects
+                self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            elif self.executor is None and self.mode == "thread":
+                self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="parse")
+            return self.executor
+
+    def _broken(self, executor: Executor):
+        with self.lock:
+            if self.executor is executor:
+                print("Parser processes stopped, parsing on a thread from now on")
+                self.mode, self.executor = "thread", None
+        executor.shutdown(wait=False)
+
+    def run(self, parser: Callable[..., T], *args) -> T:
+        """Parse from a worker thread, blocking only the caller."""
+        executor = self._executor()
+        if executor is None:
+            return parser(*args)
+        try:
+            return executor.submit(parser, *args).result()
+        except BrokenExecutor:
+            self._broken(executor)
+            return self.run(parser, *args)
+
+    async def run_async(self, parser: Callable[..., T], *args) -> T:
+        """Parse without blocking the event loop."""
+        executor = self._executor()
+        if executor is None:
+            return parser(*args)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, parser, *args)
+        except BrokenExecutor:
+            self._broken(executor)
+            return await self.run_async(parser, *args)
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown()
+
+
+def rank_sources(sources: List[Source], preferred: int, min_quality: Optional[int] = None,
+                 max_quality: Optional[int] = None) -> List[Source]:
+    """
+    Candidates in the order they should be tried: the preferred quality,
+    then the next lower ones (smaller, usually faster), then the higher
+    ones. Sources outside [min_quality, max_quality] are dropped.
+    """
+    allowed = [source for source in sources
+               if (min_quality is None or source.quality >= min_quality)
+               and (max_quality is None or source.quality <= max_quality)]
+    exact = [source for source in allowed if source.quality == preferred]
+    below = sorted((source for source in allowed if source.quality < preferred),
+                   key=lambda source: source.quality, reverse=True)
+    above = sorted((source for source in allowed if source.quality > preferred),
+                   key=lambda source: source.quality)
+    return exact + below + above
+
+
+class ThroughputMonitor:
+    """
+    Raises SlowSource once the average speed over the last `window` seconds
+    is below `min_speed` bytes per second. A min_speed of 0 disables it.
+    """
+
+    def __init__(self, min_speed: float, window: float = 20.0):
+        self.min_speed = min_speed
+        self.window = window
+        self.started = time.monotonic()
+        self.samples = deque([(self.started, 0)])
+
+    def update(self, downloaded: int):
+        if not self.min_speed:
+            return
+        now = time.monotonic()
+        self.samples.append((now, downloaded))
+        while len(self.samples) > 2 and self.samples[1][0] <= now - self.window:
+            self.samples.popleft()
+        oldest, oldest_bytes = self.samples[0]
+        if now - self.started >= self.window and now > oldest:
+            speed = (downloaded - oldest_bytes) / (now - oldest)
+            if speed < self.min_speed:
+                raise SlowSource(f"{speed / 1024:.0f} KB/s is below {self.min_speed / 1024:.0f} KB/s")
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class _NoopSpan:
+    """Returned while tracing is off so instrumented code costs one attribute check."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    def __init__(self, tracer: "Tracer", name: str, cat: str, args: dict):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def set(self, **args):
+        """Attach arguments known only once the span is running, e.g. byte counts."""
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.complete(self.name, self.start, time.perf_counter(), self.cat, **self.args)
+        return False
+
+
+class Tracer:
+    """
+    Opt-in span recorder that exports the Chrome trace event format, which
+    chrome://tracing and ui.perfetto.dev open directly.
+
+    Spans are recorded as complete ("X") events on the lane of the current
+    thread, or of the current asyncio task when called from a coroutine,
+    so each download worker gets its own row in the timeline. While
+    disabled, span() returns a shared no-op context manager.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.events: List[dict] = []
+        self.lanes: Dict[int, str] = {}
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        with self.lock:
+            self.events = []
+            self.lanes = {}
+
+    @staticmethod
+    def now() -> float:
+        return time.perf_counter()
+
+    def _lane(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:  # no running event loop in this thread
+            task = None
+        if task is not None:
+            lane, name = id(task), task.get_name()
+        else:
+            thread = threading.current_thread()
+            lane, name = thread.ident, thread.name
+        if lane not in self.lanes:
+            self.lanes[lane] = name
+        return lane
+
+    def span(self, name: str, cat: str = "pipeline", **args):
+        """Context manager timing one pipeline stage; `args` (task, episode...) show in the trace."""
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, name, cat, args)
+
+    def complete(self, name: str, start: float, end: float, cat: str = "pipeline", **args):
+        """Record a span measured elsewhere, e.g. the time an episode waited in the queue."""
+        if not self.enabled:
+            return
+        event = {"name": name, "cat": cat, "ph": "X", "pid": self.pid, "tid": self._lane(),
+                 "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6, "args": args}
+        with self.lock:
+            self.events.append(event)
+
+    def instant(self, name: str, cat: str = "pipeline", **args):
+        if not self.enabled:
+            return
+        event = {"name": name, "cat": cat, "ph": "i", "s": "t", "pid": self.pid, "tid": self._lane(),
+                 "ts": (time.perf_counter() - self.origin) * 1e6, "args": args}
+        with self.lock:
+            self.events.append(event)
+
+    def export(self) -> dict:
+        with self.lock:
+            metadata = [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": lane, "args": {"name": name}}
+                        for lane, name in self.lanes.items()]
+            return {"traceEvents": metadata + list(self.events), "displayTimeUnit": "ms"}
+
+    def save(self, path: Optional[str]):
+        """Write the trace as JSON; nothing is written when no span was recorded."""
+        if not path or not self.events:
+            return
+        with open(path, "w") as f:
+            json.dump(self.export(), f)
+
+
+TRACER = Tracer()
+span = TRACER.span
@@ -0,0 +1,136 @@
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")  # the desktop modules need no display
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The shared core package, the UI modules the way each UI imports them, and the benchmarks' mock site
+for path in (ROOT, *(os.path.join(ROOT, folder) for folder in ("CommandLineUI", "WebUI", "DesktopGUI", "benchmarks"))):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture(scope="session")
+def webui(tmp_path_factory):
+    import webUI
+
+    folder = tmp_path_factory.mktemp("webui")
+    (folder / "setup.json").write_text(json.dumps({
+        "gogoanime_main": "http://127.0.0.1:9", "downloads": str(folder / "downloads"), "captcha_v3": "test",
+        "download_quality": "1080", "max_threads": 1, "parse_mode": "off", "source_error_limit": 2}))
+    webUI.SETUP_PATH = str(folder / "setup.json")
+    webUI.configure()
+    return webUI
+
+
+CLI_SETUP = {"gogoanime_main": "http://127.0.0.1:9", "captcha_v3": "test", "download_quality": "1080",
+             "max_threads": 1, "parse_mode": "off", "source_error_limit": 2}
+
+
+@pytest.fixture(scope="session")
+def cli(tmp_path_factory):
+    import main
+
+    folder = tmp_path_factory.mktemp("cli")
+    (folder / "setup.json").write_text(json.dumps({**CLI_SETUP, "downloads": str(folder / "downloads")}))
+    main.configure(str(folder / "setup.json"))
+    return main
+
+
+@pytest.fixture
+def configure_cli(cli, tmp_path):
+    """Configure the CLI with settings on top of the defaults; the defaults come back after the test."""
+    default = cli.setup.path
+
+    def configure(**settings):
+        (tmp_path / "setup.json").write_text(json.dumps({**cli.setup, **settings}))
+        cli.configure(str(tmp_path / "setup.json"))
+        return cli
+
+    yield configure
+    cli.configure(default)
+
+
+@pytest.fixture(scope="session")
+def mock_site():
+    """The benchmarks' stand-in for the site and its CDN; request counts are shared, so compare deltas."""
+    from mock_site import MockSite
+
+    site = MockSite(animes=1, episodes=2, episode_mb=0.25)
+    site.start()
+    yield site
+    site.stop()
+
+
+class LocalServer:
+    """
+    A threaded HTTP server on a free local port.
+
+    Serves `pages` (path -> str or bytes; missing paths answer 404, paths in
+    `failing` answer 500), or whatever `respond(request)` returns as
+    (status, body, headers) when given. HEAD gets the headers only, and every
+    request is recorded as (method, path).
+    """
+
+    def __init__(self, pages=None, respond=None):
+        self.pages = {} if pages is None else pages
+        self.failing = set()
+        self.requests = []
+        self.respond = respond or self.serve_page
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def reply(self):
+                server.requests.append((self.command, self.path))
+                status, body, headers = server.respond(self)
+                body = body.encode() if isinstance(body, str) else body
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            do_GET = do_HEAD = do_POST = reply
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def serve_page(self, request):
+        body = self.pages.get(request.path)
+        if body is None or request.path in self.failing:
+            return (404 if body is None else 500), "", {}
+        return 200, body, {}
+
+    def paths(self, method="GET"):
+        """The paths requested with `method`, in arrival order."""
+        return [path for command, path in self.requests if command == method]
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def serve():
+    """Start LocalServers with serve(pages) or serve(respond=...); they are closed after the test."""
+    servers = []
+
+    def start(pages=None, respond=None):
+        servers.append(LocalServer(pages, respond))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
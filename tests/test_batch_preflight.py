@@ -0,0 +1,17 @@
+def test_batch_estimate_skips_episodes_already_complete(webui, tmp_path):
+    item = webui.AnimeDownloadItem("Show", "/category/show", [1, 2, 3], 3)
+    episodes = webui.batch_episode_list(item)
+    assert [episode["url"] for episode in episodes] == [f"{webui.base_url}/show-episode-{ep}" for ep in (1, 2, 3)]
+
+    folder = tmp_path / "Show"
+    assert webui.pending_episodes(str(folder), episodes) == episodes
+    assert not folder.exists()  # counting does not create the folder
+
+    folder.mkdir()
+    (folder / "Show Episode 2.mp4").write_bytes(b"done")
+    (folder / "Show Episode 3.mp4").write_bytes(b"half")
+    manifest = webui.get_manifest(str(folder))
+    manifest.completed(episodes[1]["url"], str(folder / "Show Episode 2.mp4"), 1080)
+    manifest.started(episodes[2]["url"], str(folder / "Show Episode 3.mp4"), 1080)
+
+    assert webui.pending_episodes(str(folder), episodes) == [episodes[0], episodes[2]]
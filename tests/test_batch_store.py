@@ -0,0 +1,95 @@
+import json
+import os
+
+import pytest
+
+from batch_store import BatchStore, EpisodeSet
+
+
+def item(name, episodes, total=24):
+    return {"name": name, "url": f"/category/{name.lower()}", "episodes": episodes, "total_episodes": total}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BatchStore(str(tmp_path / "batch.db"), legacy_dir=None)
+
+
+def test_episode_set_keeps_ranges_merged():
+    episodes = EpisodeSet([1, 2, 3, 7])
+    assert episodes.intervals == [(1, 3), (7, 7)]
+
+    episodes.add_range(5, 5)
+    assert episodes.intervals == [(1, 3), (5, 5), (7, 7)]
+    episodes.add_range(4, 6)  # touches both neighbours
+    assert episodes.intervals == [(1, 7)]
+    episodes.add_range(10, 1000)
+    episodes.add_range(2, 3)  # already covered
+    assert str(episodes) == "1-7,10-1000"
+    assert len(episodes) == 998
+
+
+@pytest.mark.parametrize("episode, expected", [(0, False), (1, True), (7, True), (8, False), (9, False),
+                                               (10, True), (500, True), (1000, True), (1001, False)])
+def test_episode_set_membership_does_not_expand_ranges(episode, expected):
+    assert (episode in EpisodeSet.parse("1-7, 10-1000")) is expected
+
+
+def test_episode_set_round_trips_through_text():
+    episodes = EpisodeSet.parse("15,1-12,3")
+    assert str(episodes) == "1-12,15"
+    assert list(episodes) == list(range(1, 13)) + [15]
+    assert EpisodeSet.parse(str(episodes)) == episodes
+    assert not EpisodeSet()
+
+
+def test_save_only_writes_rows_that_changed(store):
+    items = [item("Alpha", EpisodeSet.parse("1-12")), item("Beta", [1, 2]), item("Gamma", [5])]
+    assert store.save("weekend", items) == 3
+    assert store.save("weekend", items) == 0
+
+    items[1] = item("Beta", [1, 2, 3])
+    assert store.save("weekend", items) == 1
+
+    assert store.save("weekend", [items[0], items[2]]) == 2  # Beta removed, Gamma moved up
+    assert [(row["name"], str(row["episodes"])) for row in store.load("weekend")] == [("Alpha", "1-12"), ("Gamma", "5")]
+
+
+def test_lists_are_named_newest_first(store):
+    store.save("first", [item("Alpha", [1])])
+    store.save("second", [item("Beta", [1])])
+    store.put_item("first", item("Gamma", [2]))
+
+    assert store.names() == ["first", "second"]
+    assert store.has_item("first", "Gamma")
+    assert store.remove_item("first", "Gamma")
+    assert not store.has_item("first", "Gamma")
+    with pytest.raises(KeyError):
+        store.load("missing")
+
+
+def test_json_lists_are_imported_again_only_when_changed(store, tmp_path):
+    legacy = tmp_path / "batch_lists"
+    legacy.mkdir()
+    path = legacy / "old.json"
+    path.write_text(json.dumps({"items": [item("Alpha", [1, 2, 3])]}))
+
+    assert store.import_json(str(legacy)) == 1
+    assert store.import_json(str(legacy)) == 0
+
+    path.write_text(json.dumps({"items": [item("Alpha", [1, 2, 3, 4])]}))
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert store.import_json(str(legacy)) == 1
+    assert str(store.load("old")[0]["episodes"]) == "1-4"
+
+
+def test_unreadable_json_lists_are_reported(store, tmp_path):
+    legacy = tmp_path / "batch_lists"
+    legacy.mkdir()
+    (legacy / "broken.json").write_text("{not json")
+    (legacy / "good.json").write_text(json.dumps({"items": [item("Alpha", [1])]}))
+
+    assert store.import_json(str(legacy)) == 1
+    assert len(store.skipped) == 1 and store.skipped[0].startswith("Skipping batch list broken.json")
+    assert store.names() == ["good"]
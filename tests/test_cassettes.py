@@ -0,0 +1,137 @@
+import asyncio
+import gzip
+
+import aiohttp
+import pytest
+
+from core.cassettes import (ONCE, RECORD, REPLAY, Cassette, CassetteClientSession, CassetteMiss,
+                            cassette_session)
+
+PAGE = "<html>Show Episode 1 – page</html>"
+VIDEO = bytes(range(256)) * 8
+
+
+def respond(request):
+    """An HTML page, a video file and a form, each with a session cookie."""
+    headers = {"Set-Cookie": "session=secret"}
+    if request.command == "POST":
+        body = request.rfile.read(int(request.headers["Content-Length"])).decode()
+        return 200, f"posted {body}", {**headers, "Content-Type": "text/html"}
+    if request.command == "HEAD" or request.path.startswith("/video"):
+        return 200, VIDEO, {**headers, "Content-Type": "video/mp4"}
+    return 200, PAGE, {**headers, "Content-Type": "text/html; charset=utf-8"}
+
+
+@pytest.fixture
+def site(serve):
+    return serve(respond=respond)
+
+
+@pytest.fixture(params=["cassette.json", "cassette.json.gz"])
+def path(request, tmp_path):
+    return str(tmp_path / request.param)
+
+
+def record(site, path):
+    cassette = Cassette(path, RECORD)
+    session = cassette_session(cassette)
+    assert session.get(f"{site.url}/show-episode-1?captcha_v3=token").text == PAGE
+    assert session.post(f"{site.url}/download", data={"id": "1"}).text == "posted id=1"
+    assert session.head(f"{site.url}/video/1080.mp4").headers["Content-Length"] == str(len(VIDEO))
+    assert session.get(f"{site.url}/video/1080.mp4").content == VIDEO
+    cassette.save()
+    return cassette
+
+
+def test_replay_serves_recorded_pages_without_the_network(site, path):
+    assert record(site, path).recorded == 3  # the video body is not recorded
+    site.requests.clear()
+
+    cassette = Cassette(path, REPLAY)
+    session = cassette_session(cassette)
+    response = session.get(f"{site.url}/show-episode-1?captcha_v3=another")
+    assert (response.status_code, response.text) == (200, PAGE)
+    assert response.headers["content-type"] == "text/html; charset=utf-8"
+    assert "set-cookie" not in response.headers
+    assert session.post(f"{site.url}/download", data={"id": "1"}).text == "posted id=1"
+    assert session.head(f"{site.url}/video/1080.mp4").headers["Content-Length"] == str(len(VIDEO))
+    assert site.requests == []
+
+    with pytest.raises(CassetteMiss):
+        session.get(f"{site.url}/video/1080.mp4")
+    with pytest.raises(CassetteMiss):
+        session.post(f"{site.url}/download", data={"id": "2"})
+    assert (cassette.hits, cassette.misses) == (3, 2)
+
+
+def test_tokens_are_kept_out_of_the_file(site, path):
+    record(site, path)
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        data = f.read()
+    assert "/show-episode-1" in data
+    assert "token" not in data and "secret" not in data
+
+
+def test_once_records_only_what_is_missing(site, path):
+    record(site, path)
+    site.requests.clear()
+
+    cassette = Cassette(path, ONCE)
+    session = cassette_session(cassette)
+    session.get(f"{site.url}/show-episode-1")
+    session.get(f"{site.url}/show-episode-2")
+    session.get(f"{site.url}/show-episode-2")
+    assert site.requests == [("GET", "/show-episode-2")]
+    assert (cassette.hits, cassette.misses, cassette.recorded) == (2, 1, 1)
+
+    cassette.save()
+    assert len(Cassette(path, REPLAY).interactions) == 4
+
+
+def test_replaying_a_missing_cassette_fails(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        Cassette(str(tmp_path / "missing.json"), REPLAY)
+    with pytest.raises(ValueError):
+        Cassette(str(tmp_path / "missing.json"), "rewind")
+
+
+def test_aiohttp_session_replays_what_requests_recorded(site, path):
+    record(site, path)
+    site.requests.clear()
+    cassette = Cassette(path, REPLAY)
+
+    async def replay():
+        async with aiohttp.ClientSession() as client:
+            session = CassetteClientSession(client, cassette)
+            async with session.get(f"{site.url}/show-episode-1?captcha_v3=other") as response:
+                response.raise_for_status()
+                text = await response.text()
+            async with session.head(f"{site.url}/video/1080.mp4") as response:
+                length = response.content_length
+            async with session.post(f"{site.url}/download", data="id=1") as response:
+                chunks = [chunk async for chunk in response.content.iter_chunked(4)]
+            with pytest.raises(CassetteMiss):
+                async with session.get(f"{site.url}/video/1080.mp4"):
+                    pass
+            return text, length, b"".join(chunks)
+
+    assert asyncio.run(replay()) == (PAGE, len(VIDEO), b"posted id=1")
+    assert site.requests == []
+
+
+def test_aiohttp_session_records_text_pages(site, path):
+    cassette = Cassette(path, ONCE)
+
+    async def fetch():
+        async with aiohttp.ClientSession() as client:
+            session = CassetteClientSession(client, cassette)
+            async with session.get(f"{site.url}/show-episode-1") as response:
+                first = await response.text()
+            async with session.get(f"{site.url}/show-episode-1") as response:
+                second = await response.text()
+            return first, second
+
+    assert asyncio.run(fetch()) == (PAGE, PAGE)
+    assert site.requests == [("GET", "/show-episode-1")]
+    assert cassette.recorded == 1
@@ -0,0 +1,68 @@
+import pytest
+
+from catalog import AnimeCatalog, normalize, trigrams
+
+TITLES = [["Naruto", "/category/naruto"], ["Naruto Shippuden", "/category/naruto-shippuden"],
+          ["Boruto: Naruto Next Generations", "/category/boruto"], ["Re:Zero kara Hajimeru Isekai Seikatsu",
+                                                                     "/category/re-zero"],
+          ["Shingeki no Kyojin", "/category/shingeki-no-kyojin"], ["One Piece", "/category/one-piece"],
+          ["Jujutsu Kaisen", "/category/jujutsu-kaisen"], ["Bleach", "/category/bleach"]]
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = AnimeCatalog("http://127.0.0.1:9", str(tmp_path / "catalog.db"))
+    catalog.add(TITLES)
+    return catalog
+
+
+def test_normalize_and_trigrams_ignore_case_and_punctuation():
+    assert normalize("Re:Zero  kara!") == "re zero kara"
+    assert trigrams("Re:Zero") == trigrams("re zero")
+    assert trigrams("ab") == {"  a", " ab", "ab "}
+
+
+def test_substring_matches_rank_shortest_title_first(catalog):
+    results, strong = catalog.match("naruto")
+    assert strong
+    assert [name for name, _ in results] == ["Naruto", "Naruto Shippuden", "Boruto: Naruto Next Generations"]
+    assert catalog.search("re zero") == [["Re:Zero kara Hajimeru Isekai Seikatsu", "/category/re-zero"]]
+
+
+@pytest.mark.parametrize("query, title", [("narutto", "Naruto"), ("shingeki no kyojn", "Shingeki no Kyojin"),
+                                          ("one pice", "One Piece"), ("jujutsu kaisn", "Jujutsu Kaisen")])
+def test_typos_are_strong_matches(catalog, query, title):
+    results, strong = catalog.match(query)
+    assert strong
+    assert results[0][0] == title
+
+
+def test_weak_fuzzy_match_is_not_a_hit(catalog):
+    results, strong = catalog.match("boruta")  # not a substring of anything, and a poor trigram match
+    assert not strong
+    assert catalog.match("frieren") == ([], False)
+    assert catalog.match("  ") == ([], False)
+
+
+def test_catalog_is_reloaded_from_disk(catalog, tmp_path):
+    catalog.add([["Naruto (Dub)", "/category/naruto"]])  # renamed in place
+    reloaded = AnimeCatalog("http://127.0.0.1:9", str(tmp_path / "catalog.db"))
+    assert len(reloaded) == len(TITLES)
+    assert reloaded.search("naruto dub") == [["Naruto (Dub)", "/category/naruto"]]
+    assert ["Naruto", "/category/naruto"] not in reloaded.search("naruto")
+
+
+def test_search_anime_falls_back_to_the_site_without_a_strong_match(webui, tmp_path, monkeypatch):
+    catalog = AnimeCatalog("http://127.0.0.1:9", str(tmp_path / "catalog.db"))
+    catalog.add(TITLES)
+    catalog.refresh_in_background = lambda: None
+    live = [["Frieren: Beyond Journey's End", "/category/frieren"]]
+    searched = []
+    monkeypatch.setattr(webui, "get_catalog", lambda: catalog)
+    monkeypatch.setattr(webui, "search_live", lambda name: searched.append(name) or live)
+
+    assert webui.search_anime("narutto")[0][0] == "Naruto"
+    assert searched == []
+    assert webui.search_anime("frieren") == live
+    assert searched == ["frieren"]
+    assert catalog.match("frieren")[1]  # found locally next time
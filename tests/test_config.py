@@ -0,0 +1,164 @@
+import json
+import os
+import asyncio
+import subprocess
+import sys
+import time
+
+import pytest
+
+from core.config import Config, ConfigError, ConfigWatcher, load_config, parse_quality
+from core.politeness import HostPolicy, HostScheduler
+
+SETUP = {"gogoanime_main": "https://example.test", "downloads": "/tmp/anime", "captcha_v3": "token",
+         "download_quality": "720p", "max_threads": 2}
+
+
+def write(path, data):
+    path.write_text(json.dumps(data))
+    return str(path)
+
+
+@pytest.mark.parametrize("value, quality", [(1080, 1080), ("1080", 1080), ("720p", 720), ("480P", 480)])
+def test_quality_accepts_numbers_and_labels(value, quality):
+    assert parse_quality(value) == quality
+
+
+@pytest.mark.parametrize("value", ["best", 1440, "0"])
+def test_unknown_quality_is_rejected(value):
+    with pytest.raises(ConfigError, match="download_quality"):
+        parse_quality(value)
+
+
+def test_settings_are_typed_and_still_a_dict():
+    setup = Config({**SETUP, "min_quality": "480", "max_download_kbps": 500, "min_speed_kbps": 100})
+    assert (setup.base_url, setup.download_folder, setup.download_quality) == ("https://example.test", "/tmp/anime", 720)
+    assert (setup.min_quality, setup.max_quality) == (480, None)
+    assert setup.bandwidth_cap == 500 * 1024 and setup.min_speed == 100 * 1024
+    assert setup["captcha_v3"] == "token" and setup.get("queue_policy", "fifo") == "fifo"
+    assert Config(SETUP).bandwidth_cap is None
+
+
+@pytest.mark.parametrize("changes, error", [
+    ({"captcha_v3": None}, "missing captcha_v3"),
+    ({"max_threads": 0}, "max_threads"),
+    ({"max_threads": 1.5}, "max_threads"),
+    ({"cdn_concurrency": -1}, "cdn_concurrency"),
+    ({"max_retries": "3"}, "max_retries"),
+    ({"metrics_port": True}, "metrics_port"),
+    ({"max_quality": "4k"}, "quality"),
+    ({"parse_mode": "fiber"}, "parse_mode"),
+])
+def test_invalid_setup_is_rejected(changes, error):
+    data = {**SETUP, **changes}
+    data = {key: value for key, value in data.items() if value is not None}
+    with pytest.raises(ConfigError, match=error):
+        Config(data, "setup.json")
+
+
+def test_file_is_parsed_again_only_after_it_changes(tmp_path):
+    path = write(tmp_path / "setup.json", SETUP)
+    first = load_config(path)
+    assert load_config(path) is first
+    assert load_config(path, force=True) is not first
+
+    write(tmp_path / "setup.json", {**SETUP, "max_threads": 4})
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert load_config(path).max_threads == 4
+
+
+@pytest.mark.parametrize("folder, module", [("CommandLineUI", "main"), ("WebUI", "webUI"),
+                                            ("DesktopGUI", "gui"), ("DesktopGUI", "gui2")])
+def test_importing_a_ui_loads_no_heavy_modules(folder, module, tmp_path):
+    heavy = ("aiohttp", "aiofiles", "bs4", "requests", "psutil", "PIL", "core.cassettes", "core.faults", "hls")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = f"import sys; import {module}; print(' '.join(name for name in {heavy!r} if name in sys.modules))"
+    # Imported from an empty folder, so reading setup.json at import would fail
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([os.path.join(root, folder), root]),
+           "QT_QPA_PLATFORM": "offscreen"}
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.split() == []
+
+
+@pytest.fixture
+def watcher(tmp_path):
+    watcher = ConfigWatcher(write(tmp_path / "setup.json", SETUP), interval=0.05)
+    yield watcher
+    watcher.stop()
+
+
+def test_saved_settings_reach_only_interested_listeners(watcher):
+    calls = []
+    watcher.subscribe(lambda old, new, changed: calls.append(("threads", old.max_threads, new.max_threads)),
+                      {"max_threads"})
+    watcher.subscribe(lambda old, new, changed: calls.append(("any", changed)))
+
+    assert watcher.save({**SETUP, "captcha_v3": "fresh"}) == {"captcha_v3"}
+    assert watcher.save({**SETUP, "captcha_v3": "fresh", "max_threads": 3}) == {"max_threads"}
+    assert calls == [("any", {"captcha_v3"}), ("threads", 2, 3), ("any", {"max_threads"})]
+    assert watcher.current.max_threads == 3
+
+
+def test_unsubscribed_and_failing_listeners_do_not_stop_others(watcher):
+    calls = []
+    unsubscribe = watcher.subscribe(lambda old, new, changed: calls.append("removed"))
+    watcher.subscribe(lambda old, new, changed: 1 / 0)
+    watcher.subscribe(lambda old, new, changed: calls.append("kept"))
+    unsubscribe()
+
+    watcher.save({**SETUP, "max_threads": 5})
+    assert calls == ["kept"]
+
+
+def test_invalid_settings_keep_the_last_good_config(watcher):
+    with pytest.raises(ConfigError):
+        watcher.save({**SETUP, "max_threads": 0})
+    assert json.loads(open(watcher.path).read()) == SETUP
+
+    with open(watcher.path, "w") as f:
+        f.write("{broken")
+    assert watcher.check(force=True) == set()
+    assert watcher.error and watcher.current.max_threads == 2
+
+
+def test_edits_to_the_file_are_picked_up_by_polling(watcher):
+    changes = []
+    watcher.subscribe(lambda old, new, changed: changes.append(changed))
+    watcher.start()
+    with open(watcher.path, "w") as f:
+        json.dump({**SETUP, "max_download_kbps": 256}, f)
+    stat = os.stat(watcher.path)
+    os.utime(watcher.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    deadline = time.monotonic() + 5
+    while not changes and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert changes == [{"max_download_kbps"}]
+    assert watcher.current.bandwidth_cap == 256 * 1024
+
+
+def test_host_limits_change_for_hosts_already_in_use():
+    polite = HostScheduler({"scrape": HostPolicy(4), "cdn": HostPolicy(1)})
+    url = "https://cdn.test/video.mp4"
+    with polite.slot("cdn", url):
+        assert polite.try_acquire("cdn", url) > 0
+        polite.set_policy("cdn", HostPolicy(2))
+        assert polite.try_acquire("cdn", url) == 0
+
+
+def test_download_workers_follow_max_threads(webui):
+    async def run():
+        manager = webui.DownloadManager(max_concurrent=1)
+        await manager.start()
+        try:
+            manager.resize(3)
+            assert len(manager.worker_tasks) == 3
+            manager.resize(1)  # idle surplus workers stop at their next check
+            await asyncio.sleep(1.5)
+            return len([worker for worker in manager.worker_tasks if not worker.done()])
+        finally:
+            await manager.stop()
+
+    assert asyncio.run(run()) == 1
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from core.politeness import BandwidthLimiter, HostPolicy, HostScheduler
+from downloads import DownloadEngine, get_episodes
+from workers import SearchWorker
+from mock_site import RESULTS_PER_PAGE, MockSite
+
+
+class CountingScheduler(HostScheduler):
+    """Records how many slots of one kind were taken, and the most held at once."""
+
+    def __init__(self, policies, kind="cdn"):
+        super().__init__(policies)
+        self.kind = kind
+        self.active = self.peak = self.acquired = 0
+        self.counter = threading.Lock()
+
+    def try_acquire(self, kind, url):
+        wait = super().try_acquire(kind, url)
+        if kind == self.kind and not wait:
+            with self.counter:
+                self.acquired += 1
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+        return wait
+
+    def release(self, kind, url):
+        if kind == self.kind:
+            with self.counter:
+                self.active -= 1
+        super().release(kind, url)
+
+
+@pytest.fixture
+def site():
+    site = MockSite(1, 3, episode_mb=0.5)
+    site.start()
+    yield site
+    site.stop()
+
+
+def test_engine_downloads_within_host_limits_and_bandwidth_cap(site, tmp_path):
+    polite = CountingScheduler({"scrape": HostPolicy(4), "cdn": HostPolicy(1)})
+    episodes = get_episodes(site.base_url, f"/category/{site.slugs()[0]}", polite)
+    assert [episode["episode"] for episode in episodes] == ["1", "2", "3"]
+
+    engine = DownloadEngine(str(tmp_path), "test", 1080, max_threads=3, polite=polite,
+                            bandwidth=BandwidthLimiter(1024 * 1024))
+    started = time.monotonic()
+    engine.add_jobs("Bench", episodes)
+    engine.task_queue.join()
+    elapsed = time.monotonic() - started
+    engine.stop()
+
+    files = sorted((tmp_path / "Bench").glob("*.mp4"))
+    assert [path.name for path in files] == [f"Bench Anime 1 Episode {n}.mp4" for n in (1, 2, 3)]
+    assert all(path.stat().st_size == site.file_size(1080) for path in files)
+    assert polite.peak == 1  # three workers, one cdn slot
+    assert elapsed >= 1.4  # 1.5 MB at 1 MB/s
+    assert site.requests["cdn"] == 3
+
+
+def test_search_pages_are_fetched_inside_the_scrape_limits():
+    site = MockSite(animes=RESULTS_PER_PAGE * 2 + 5, episodes=1, episode_mb=0.01)
+    site.start()
+    try:
+        polite = CountingScheduler({"scrape": HostPolicy(2), "cdn": HostPolicy(1)}, kind="scrape")
+        worker = SearchWorker(site.base_url, "bench anime", polite, page_workers=4)
+        batches, finished = [], []
+        worker.signals.batch.connect(batches.append)
+        worker.signals.finished.connect(finished.append)
+        worker.run()
+    finally:
+        site.stop()
+
+    assert finished == [RESULTS_PER_PAGE * 2 + 5]
+    assert [len(batch) for batch in batches] == [RESULTS_PER_PAGE, RESULTS_PER_PAGE, 5]
+    # The first page, then every pagination link, all through the scheduler
+    assert polite.acquired == site.requests["search"] == 4
+    assert polite.peak <= 2
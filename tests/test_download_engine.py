@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def engine(webui):
+    engine = webui.DownloadEngine(max_concurrent=2)
+    yield engine
+    engine.stop()
+
+
+def wait(webui, tasks):
+    deadline = time.monotonic() + 30
+    while any(task.state not in webui.FINISHED for task in tasks) and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+
+def queue(engine, owner, folder, episode_urls, **kwargs):
+    """Queue episodes the way download_episodes does, from a session's own event loop."""
+    async def add():
+        return [await engine.add_download(owner, url=None, filename=f"Episode {number}_episode_{number}.mp4",
+                                          folder=folder, episode=number, episode_url=url,
+                                          title=f"Episode {number}", **kwargs)
+                for number, url in enumerate(episode_urls, 1)]
+    return asyncio.run(add())
+
+
+def test_sessions_share_one_engine_loop(webui, engine, mock_site, tmp_path):
+    episode_urls = mock_site.episode_urls("bench-anime-1")
+    queued = {}
+
+    def session(owner):
+        queued[owner] = queue(engine, owner, str(tmp_path / owner), episode_urls)
+
+    threads = [threading.Thread(target=session, args=(owner,)) for owner in ("alice", "bob")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wait(webui, queued["alice"] + queued["bob"])
+
+    assert engine.tasks("alice") == queued["alice"] and engine.tasks("bob") == queued["bob"]
+    assert all(worker.get_loop() is engine.loop for worker in engine.manager.worker_tasks)
+    for owner in ("alice", "bob"):
+        assert [task.state for task in queued[owner]] == [webui.DownloadState.COMPLETED] * 2
+        assert sorted(path.name for path in (tmp_path / owner).iterdir() if not path.name.startswith(".")) == [
+            "Bench Anime 1 Episode 1_episode_1.mp4", "Bench Anime 1 Episode 2_episode_2.mp4"]
+
+    assert engine.summary() == {}
+    engine.release("alice")
+    assert engine.tasks("alice") == []
+
+
+def test_episodes_are_resolved_when_they_start(webui, engine, mock_site, tmp_path):
+    before = mock_site.requests.get("captcha_post", 0)
+    tasks = queue(engine, "alice", str(tmp_path), mock_site.episode_urls("bench-anime-1"))
+    wait(webui, tasks)
+
+    assert mock_site.requests.get("captcha_post", 0) - before == len(tasks)
+    for task in tasks:
+        assert task.state == webui.DownloadState.COMPLETED
+        assert task.resolved_at >= task.start_time.timestamp()  # not while the episode waited in the queue
+        assert task.quality == 1080 and "expires=" in task.url
+
+
+def test_partial_file_is_continued_when_its_quality_is_offered(webui, engine, mock_site, tmp_path):
+    episode_url = mock_site.episode_urls("bench-anime-1")[0]
+    partial = tmp_path / "Episode 1_episode_1.mp4"
+    partial.write_bytes(b"x" * 1000)
+    webui.get_manifest(str(tmp_path)).started(episode_url, str(partial), 720)
+
+    task, = queue(engine, "alice", str(tmp_path), [episode_url], resume=True)
+    wait(webui, [task])
+
+    assert (task.state, task.quality, task.file_path) == (webui.DownloadState.COMPLETED, 720, str(partial))
+    assert partial.stat().st_size == mock_site.file_size(720)
+    assert partial.read_bytes()[:1000] == b"x" * 1000  # continued after the bytes already there
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import time
+
+import aiohttp
+import pytest
+import requests
+
+from core.faults import FaultInjectingClientSession, FaultPlan, FaultRule, faulty_session, load_fault_plan
+from core.politeness import HostPolicy, HostScheduler
+
+
+def video(site):
+    return f"{site.base_url}/cdn/bench-anime-1/1/1080.mp4?expires={int(time.time()) + 3600}"
+
+
+class RequestsClient:
+    reset_error = requests.exceptions.ChunkedEncodingError
+
+    def fetch(self, plan, url):
+        """(status, headers, body) of a GET sent through `plan`."""
+        with faulty_session(plan) as session:
+            response = session.get(url, stream=True)
+            return response.status_code, response.headers, b"".join(response.iter_content(64 * 1024))
+
+    def fetch_politely(self, plan, url):
+        polite = HostScheduler({"scrape": HostPolicy(2), "cdn": HostPolicy(2)}, session=faulty_session(plan))
+        with polite.open("GET", url, "cdn") as response:
+            return response.status_code
+
+
+class AiohttpClient:
+    reset_error = aiohttp.ClientPayloadError
+
+    def fetch(self, plan, url):
+        async def fetch():
+            async with aiohttp.ClientSession() as client:
+                session = FaultInjectingClientSession(client, plan)
+                async with session.get(url) as response:
+                    body = b"".join([chunk async for chunk in response.content.iter_chunked(64 * 1024)])
+                    return response.status, response.headers, body
+        return asyncio.run(fetch())
+
+    def fetch_politely(self, plan, url):
+        polite = HostScheduler({"scrape": HostPolicy(2), "cdn": HostPolicy(2)})
+
+        async def fetch():
+            async with aiohttp.ClientSession() as client:
+                async with polite.async_open(FaultInjectingClientSession(client, plan), "GET", url, "cdn") as response:
+                    return response.status
+        return asyncio.run(fetch())
+
+
+@pytest.fixture(params=[RequestsClient, AiohttpClient], ids=["requests", "aiohttp"])
+def client(request):
+    return request.param()
+
+
+def test_unmatched_requests_reach_the_server(client, mock_site):
+    status, headers, body = client.fetch(FaultPlan([FaultRule(url="/elsewhere/", status=500)]), video(mock_site))
+    assert (status, len(body)) == (200, mock_site.file_size(1080))
+    assert headers["Content-Type"] == "video/mp4"
+
+
+def test_connection_reset_mid_body(client, mock_site):
+    plan = FaultPlan([FaultRule(url="/cdn/", reset_at=100_000)])
+    with pytest.raises(client.reset_error):
+        client.fetch(plan, video(mock_site))
+    assert plan.summary() == {"0: /cdn/": (1, 1)}
+
+
+def test_truncated_body_ends_without_an_error(client, mock_site):
+    status, _, body = client.fetch(FaultPlan([FaultRule(url="/cdn/", truncate_at=100_000)]), video(mock_site))
+    assert (status, len(body)) == (200, 100_000)
+
+
+def test_injected_status_carries_its_headers_and_body(client, mock_site):
+    plan = FaultPlan([FaultRule(url="/cdn/", status=429, headers={"Retry-After": "7"}, body="slow down")])
+    status, headers, body = client.fetch(plan, video(mock_site))
+    assert (status, headers["Retry-After"], body) == (429, "7", b"slow down")
+
+
+def test_throttled_request_is_retried_after_retry_after(client, mock_site):
+    plan = FaultPlan([FaultRule(url="/cdn/", status=429, headers={"Retry-After": "0.3"}, times=1)])
+    started = time.monotonic()
+    assert client.fetch_politely(plan, video(mock_site)) == 200
+    assert time.monotonic() - started >= 0.3
+    assert plan.summary() == {"0: /cdn/": (2, 1)}
+
+
+def test_bandwidth_cap_slows_the_body(client, mock_site):
+    plan = FaultPlan([FaultRule(url="/cdn/", bandwidth=1024 * 1024)])
+    started = time.monotonic()
+    _, _, body = client.fetch(plan, video(mock_site))
+    assert len(body) == mock_site.file_size(1080)
+    assert time.monotonic() - started >= 0.2  # 256 KB at 1 MB/s
+
+
+def test_refused_connection(mock_site):
+    plan = FaultPlan([FaultRule(url="/cdn/", connect_error=True)])
+    with pytest.raises(requests.ConnectionError):
+        RequestsClient().fetch(plan, video(mock_site))
+    with pytest.raises(aiohttp.ClientConnectionError):
+        AiohttpClient().fetch(plan, video(mock_site))
+
+
+def test_rules_skip_fire_and_run_out_in_order():
+    plan = FaultPlan([FaultRule(url="/cdn/", method="GET", after=1, times=2, name="cdn"), FaultRule(url=".")])
+    picks = [plan.pick("GET", "https://cdn.test/cdn/1.mp4") for _ in range(5)]
+    assert [rule.label if rule else None for rule in picks] == [".", "cdn", "cdn", ".", "."]
+    assert plan.pick("HEAD", "https://cdn.test/cdn/1.mp4").label == "."
+    assert plan.summary() == {"0: cdn": (5, 2), "1: .": (4, 4)}
+
+
+def test_probability_draws_repeat_with_the_seed():
+    def fired(seed):
+        plan = FaultPlan([FaultRule(probability=0.5)], seed=seed)
+        return [plan.pick("GET", "https://mock_site.test/") is not None for _ in range(20)]
+
+    assert fired(3) == fired(3)
+    assert 0 < sum(fired(3)) < 20
+
+
+def test_plan_file_uses_friendly_units(tmp_path):
+    path = tmp_path / "faults.json"
+    path.write_text(json.dumps({"seed": 1, "rules": [{"url": "/cdn/", "latency_ms": 250, "bandwidth_kbps": 512}]}))
+    rule, = load_fault_plan(str(path)).rules
+    assert (rule.latency, rule.bandwidth, rule.shapes_body) == (0.25, 512 * 1024, True)
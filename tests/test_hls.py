@@ -0,0 +1,104 @@
+import pytest
+
+from hls import HLSDownloader, HLSError, download_from_episode, parse_master, parse_media, pick_variant
+
+MASTER = """#EXTM3U
+#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=854x480
+480/index.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=2400000,RESOLUTION=1920x1080,CODECS="avc1.640028,mp4a.40.2"
+1080/index.m3u8
+"""
+
+SEGMENTS = [bytes([index]) * 1000 for index in range(5)]
+
+
+def media_playlist(names, init=None):
+    lines = ["#EXTM3U", "#EXT-X-TARGETDURATION:10"]
+    if init:
+        lines.append(f'#EXT-X-MAP:URI="{init}"')
+    for name in names:
+        lines += ["#EXTINF:10.0,", name]
+    return "\n".join(lines + ["#EXT-X-ENDLIST", ""])
+
+
+@pytest.fixture
+def site(serve):
+    """The playlists and segments; paths added to `failing` answer 500 while they are listed."""
+    pages = {f"/1080/seg{index}.ts": data for index, data in enumerate(SEGMENTS)}
+    pages["/master.m3u8"] = MASTER
+    pages["/1080/index.m3u8"] = media_playlist([f"seg{index}.ts" for index in range(len(SEGMENTS))])
+    pages["/480/index.m3u8"] = media_playlist(["seg0.ts"])
+    return serve(pages)
+
+
+def test_master_playlist_variants_resolve_against_the_playlist_url():
+    variants = parse_master(MASTER, "https://cdn.test/show/master.m3u8")
+    assert [(variant.url, variant.height) for variant in variants] == [
+        ("https://cdn.test/show/480/index.m3u8", 480), ("https://cdn.test/show/1080/index.m3u8", 1080)]
+    assert pick_variant(variants, 1080).height == 1080
+    assert pick_variant(variants, 720).height == 480
+    assert pick_variant(variants, 360).height == 480
+
+
+def test_media_playlist_keeps_the_init_section_first():
+    segments = parse_media(media_playlist(["a.m4s", "b.m4s"], init="init.mp4"), "https://cdn.test/v/index.m3u8")
+    assert [segment.url for segment in segments] == [
+        "https://cdn.test/v/init.mp4", "https://cdn.test/v/a.m4s", "https://cdn.test/v/b.m4s"]
+    assert [segment.init for segment in segments] == [True, False, False]
+
+
+@pytest.mark.parametrize("line, error", [
+    ('#EXT-X-KEY:METHOD=AES-128,URI="key"', "Encrypted"),
+    ("#EXT-X-BYTERANGE:1000@0", "Byte-range"),
+])
+def test_unsupported_media_playlists_are_rejected(line, error):
+    with pytest.raises(HLSError, match=error):
+        parse_media(f"#EXTM3U\n{line}\n#EXTINF:10,\na.ts\n#EXT-X-ENDLIST\n", "https://cdn.test/")
+
+
+def test_transport_stream_is_joined_in_order_into_a_ts_file(site, tmp_path):
+    downloader = HLSDownloader(workers=3)
+    file_path, height = downloader.download(f"{site.url}/master.m3u8", tmp_path / "Show Episode 1.mp4", 1080)
+
+    assert (file_path, height) == (tmp_path / "Show Episode 1.ts", 1080)
+    assert file_path.read_bytes() == b"".join(SEGMENTS)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["Show Episode 1.ts"]
+
+
+def test_fragmented_mp4_keeps_the_mp4_suffix(site, tmp_path):
+    site.pages["/fmp4/init.mp4"] = b"init"
+    site.pages["/fmp4/a.m4s"] = b"a" * 10
+    site.pages["/fmp4/index.m3u8"] = media_playlist(["a.m4s"], init="init.mp4")
+
+    file_path, height = HLSDownloader().download(f"{site.url}/fmp4/index.m3u8", tmp_path / "Show Episode 1.mp4", 1080)
+
+    assert (file_path, height) == (tmp_path / "Show Episode 1.mp4", None)
+    assert file_path.read_bytes() == b"init" + b"a" * 10
+
+
+def test_interrupted_download_only_fetches_missing_segments(site, tmp_path):
+    site.failing.add("/1080/seg3.ts")
+    with pytest.raises(Exception):
+        HLSDownloader(workers=1).download(f"{site.url}/1080/index.m3u8", tmp_path / "episode.mp4", 1080)
+    assert not (tmp_path / "episode.ts").exists()
+
+    site.failing.clear()
+    site.requests.clear()
+    file_path, _ = HLSDownloader(workers=1).download(f"{site.url}/1080/index.m3u8", tmp_path / "episode.mp4", 1080)
+
+    assert file_path.read_bytes() == b"".join(SEGMENTS)
+    assert [path for path in site.paths() if path.endswith(".ts")] == ["/1080/seg3.ts"]
+
+
+def test_episode_page_falls_through_to_a_server_with_a_playlist(site, tmp_path):
+    site.pages["/episode-1"] = (
+        '<div class="anime_muti_link"><ul>'
+        f'<li><a data-video="{site.url}/embed/broken">Broken</a></li>'
+        f'<li><a data-video="{site.url}/embed/ok">Ok</a></li>'
+        "</ul></div>")
+    site.pages["/embed/ok"] = f"<script>var file = '{site.url}/master.m3u8';</script>"
+
+    file_path, height = download_from_episode(f"{site.url}/episode-1", tmp_path / "Show Episode 1.mp4", 1080)
+
+    assert (file_path.name, height) == ("Show Episode 1.ts", 1080)
+    assert file_path.read_bytes() == b"".join(SEGMENTS)
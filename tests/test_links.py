@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+import pytest
+
+from core.links import LinkExpired, check_expired, link_expires_at, link_is_stale
+from core.sources import Source
+
+
+def test_signed_expiry_is_read_from_the_query():
+    assert link_expires_at("https://cdn.test/1.mp4?token=a&expires=1900000000") == 1900000000
+    assert link_expires_at("https://cdn.test/1.mp4?Expiry=1900000000") == 1900000000
+    assert link_expires_at("https://cdn.test/1.mp4?expires=3600") is None  # a lifetime, not a time
+    assert link_expires_at("https://cdn.test/1.mp4") is None
+
+
+def test_signed_links_are_stale_just_before_they_expire():
+    soon = f"https://cdn.test/1.mp4?expires={int(time.time()) + 10}"
+    later = f"https://cdn.test/1.mp4?expires={int(time.time()) + 3600}"
+    assert link_is_stale(soon, resolved_at=time.time(), max_age=600)
+    assert not link_is_stale(later, resolved_at=0, max_age=600)  # the signature wins over the age
+
+
+def test_unsigned_links_are_stale_after_max_age():
+    assert not link_is_stale("https://cdn.test/1.mp4", resolved_at=time.time() - 60, max_age=600)
+    assert link_is_stale("https://cdn.test/1.mp4", resolved_at=time.time() - 600, max_age=600)
+
+
+@pytest.mark.parametrize("status", [403, 410])
+def test_expired_statuses_raise(status):
+    with pytest.raises(LinkExpired, match=f"HTTP {status}"):
+        check_expired(status, "https://cdn.test/1.mp4")
+    check_expired(200, "https://cdn.test/1.mp4")
+    check_expired(404, "https://cdn.test/1.mp4")
+
+
+def unsigned_link(site):
+    """A link without its signature, which the mock CDN answers with 403."""
+    return f"{site.base_url}/cdn/bench-anime-1/1/1080.mp4"
+
+
+class Requests:
+    """Requests the mock site received since it was created."""
+
+    def __init__(self, site):
+        self.site = site
+        self.before = dict(site.requests)
+
+    def __getitem__(self, route):
+        return self.site.requests.get(route, 0) - self.before.get(route, 0)
+
+
+def test_cli_resolves_an_expired_link_again(configure_cli, mock_site, tmp_path):
+    cli = configure_cli(gogoanime_main=mock_site.base_url)
+    item = {"episode": 1, "url": mock_site.episode_urls("bench-anime-1")[0], "quality": 1080}
+    file_path = tmp_path / "Bench Anime 1 Episode 1.mp4"
+    requests = Requests(mock_site)
+
+    source = cli.download_sources(item, [Source(1080, unsigned_link(mock_site))], file_path)
+
+    assert source.quality == 1080 and "expires=" in source.url
+    assert file_path.stat().st_size == mock_site.file_size(1080)
+    assert (requests["captcha_post"], requests["cdn"]) == (1, 2)
+
+
+def test_cli_gives_up_after_max_link_refreshes(configure_cli, mock_site, monkeypatch, tmp_path):
+    monkeypatch.setattr("mock_site.LINK_LIFETIME", -60)  # every resolved link is already expired
+    cli = configure_cli(gogoanime_main=mock_site.base_url, max_link_refreshes=2)
+    item = {"episode": 1, "url": mock_site.episode_urls("bench-anime-1")[0], "quality": 1080}
+    requests = Requests(mock_site)
+
+    with pytest.raises(Exception, match="1080p: link kept expiring"):
+        cli.download_sources(item, [Source(1080, unsigned_link(mock_site))], tmp_path / "episode.mp4")
+    assert (requests["captcha_post"], requests["cdn"]) == (2, 3)
+
+
+def download(webui, site, folder):
+    async def run():
+        manager = webui.DownloadManager(max_concurrent=1)
+        await manager.start()
+        try:
+            task = await manager.add_download(url=unsigned_link(site), filename="Bench Anime 1 Episode 1.mp4",
+                                              folder=folder, episode=1,
+                                              episode_url=site.episode_urls("bench-anime-1")[0],
+                                              sources=[Source(1080, unsigned_link(site))])
+            while task.state not in webui.FINISHED:
+                await asyncio.sleep(0.02)
+            return task
+        finally:
+            await manager.stop()
+    return asyncio.run(run())
+
+
+def test_webui_resolves_an_expired_link_again(webui, mock_site, tmp_path):
+    requests = Requests(mock_site)
+
+    task = download(webui, mock_site, str(tmp_path))
+
+    assert task.state == webui.DownloadState.COMPLETED
+    assert "expires=" in task.url
+    assert (tmp_path / "Bench Anime 1 Episode 1.mp4").stat().st_size == mock_site.file_size(1080)
+    assert (requests["captcha_post"], requests["cdn"]) == (1, 2)
+
+
+def test_webui_gives_up_after_max_link_refreshes(webui, mock_site, monkeypatch, tmp_path):
+    monkeypatch.setattr("mock_site.LINK_LIFETIME", -60)
+    refreshes = webui.settings().max_link_refreshes
+    requests = Requests(mock_site)
+
+    task = download(webui, mock_site, str(tmp_path))
+
+    assert task.state == webui.DownloadState.ERROR
+    # Each of the four qualities the refreshed page offers is tried and refreshed in turn
+    for quality in (1080, 720, 480, 360):
+        assert f"{quality}p: link kept expiring" in task.message[1]
+    assert (requests["captcha_post"], requests["cdn"]) == (4 * refreshes, 4 * (refreshes + 1))
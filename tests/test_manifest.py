@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from core.manifest import COMPLETE, CORRUPT, MISSING, PARTIAL, FolderManifest, file_digest
+
+EPISODE = "https://example.test/show-episode-1"
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    return FolderManifest(str(tmp_path))
+
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_started_download_is_partial_until_completed(manifest, tmp_path):
+    file_path = write(tmp_path / "Episode 1.mp4", b"half")
+    assert manifest.check(EPISODE) == (MISSING, None)
+
+    manifest.started(EPISODE, file_path, 1080, expected=8)
+    state, entry = manifest.check(EPISODE)
+    assert (state, entry["file"], entry["quality"]) == (PARTIAL, "Episode 1.mp4", 1080)
+
+    write(tmp_path / "Episode 1.mp4", b"complete")
+    manifest.completed(EPISODE, file_path, 1080)
+    state, entry = manifest.check(EPISODE)
+    assert (state, entry["size"], entry["digest"]) == (COMPLETE, 8, file_digest(file_path))
+
+
+def test_entries_survive_a_reload(manifest, tmp_path):
+    manifest.completed(EPISODE, write(tmp_path / "Episode 1.mp4", b"complete"), 720)
+    assert FolderManifest(str(tmp_path)).check(EPISODE)[0] == COMPLETE
+
+
+def test_touched_file_is_hashed_again_and_stays_complete(manifest, tmp_path):
+    file_path = write(tmp_path / "Episode 1.mp4", b"complete")
+    manifest.completed(EPISODE, file_path)
+    os.utime(file_path, (0, 0))
+
+    state, entry = manifest.check(EPISODE)
+    assert state == COMPLETE
+    assert entry["mtime"] == os.stat(file_path).st_mtime
+
+
+def test_changed_content_is_corrupt_and_shorter_file_partial(manifest, tmp_path):
+    file_path = write(tmp_path / "Episode 1.mp4", b"complete")
+    manifest.completed(EPISODE, file_path)
+
+    write(tmp_path / "Episode 1.mp4", b"garbled!")
+    assert manifest.check(EPISODE)[0] == CORRUPT
+    write(tmp_path / "Episode 1.mp4", b"comp")
+    assert manifest.check(EPISODE)[0] == PARTIAL
+
+
+def test_deleted_file_is_missing_and_dropped_on_refresh(manifest, tmp_path):
+    file_path = write(tmp_path / "Episode 1.mp4", b"complete")
+    manifest.completed(EPISODE, file_path)
+    os.remove(file_path)
+
+    assert manifest.check(EPISODE)[0] == MISSING
+    assert manifest.refresh() == 1
+    assert manifest.entries == {}
+
+
+def test_scan_reports_only_new_or_changed_files(manifest, tmp_path):
+    write(tmp_path / "Episode 1.mp4", b"one")
+    write(tmp_path / "Episode 2.mp4", b"two")
+    assert sorted(manifest.scan()) == ["Episode 1.mp4", "Episode 2.mp4"]
+    assert manifest.scan() == []
+
+    write(tmp_path / "Episode 2.mp4", b"two, longer")
+    write(tmp_path / "Episode 3.mp4", b"three")
+    assert sorted(manifest.scan()) == ["Episode 2.mp4", "Episode 3.mp4"]
+    assert ".manifest.json" not in manifest.files
+
+
+def test_file_copied_in_is_adopted_by_size(manifest, tmp_path):
+    manifest.scan()
+    file_path = write(tmp_path / "Episode 1.mp4", b"complete")
+
+    assert not manifest.adopt(EPISODE, file_path, 100)
+    assert manifest.adopt(EPISODE, file_path, 8, 1080)
+    state, entry = manifest.check(EPISODE)
+    assert (state, entry["quality"]) == (COMPLETE, 1080)
+
+
+def test_file_of_a_failed_download_is_not_adopted(manifest, tmp_path):
+    # A sequential download pre-sizes its file, so a failed one already has the full size
+    file_path = write(tmp_path / "Episode 1.mp4", bytes(8))
+    manifest.started(EPISODE, file_path, 1080, expected=8)
+
+    assert not manifest.adopt(EPISODE, file_path, 8)
+    assert not manifest.adopt("https://example.test/show-episode-2", file_path, 8)
+    assert manifest.check(EPISODE)[0] == PARTIAL
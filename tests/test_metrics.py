@@ -0,0 +1,87 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from core.metrics import MetricsServer, Registry
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+
+@pytest.fixture
+def server(registry):
+    server = MetricsServer(port=0, registry=registry)
+    yield server
+    server.stop()
+
+
+def get(url):
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return response.headers["Content-Type"], response.read().decode()
+
+
+def test_counters_and_gauges_in_the_text_format(registry):
+    downloads = registry.counter("downloads_total", "Finished episodes by result", ("result",))
+    downloads.inc(result="ok")
+    downloads.inc(2, result="ok")
+    downloads.inc(result="error")
+    depth = registry.gauge("queue_depth", "Episodes waiting")
+    depth.set_function(lambda: 7)
+
+    assert registry.prometheus() == (
+        "# HELP downloads_total Finished episodes by result\n"
+        "# TYPE downloads_total counter\n"
+        'downloads_total{result="ok"} 3\n'
+        'downloads_total{result="error"} 1\n'
+        "# HELP queue_depth Episodes waiting\n"
+        "# TYPE queue_depth gauge\n"
+        "queue_depth 7\n")
+
+
+def test_histogram_buckets_are_cumulative_with_sum_and_count(registry):
+    latency = registry.histogram("resolve_seconds", "Resolve latency", ("stage",), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.observe(value, stage="captcha")
+
+    lines = registry.prometheus().splitlines()
+    assert lines[1] == "# TYPE resolve_seconds histogram"
+    assert lines[2:] == [
+        'resolve_seconds_bucket{stage="captcha",le="0.1"} 2',  # a value on a bound falls in that bucket
+        'resolve_seconds_bucket{stage="captcha",le="1"} 3',
+        'resolve_seconds_bucket{stage="captcha",le="+Inf"} 4',
+        'resolve_seconds_sum{stage="captcha"} 3.65',
+        'resolve_seconds_count{stage="captcha"} 4']
+    assert registry.snapshot()["resolve_seconds"] == {
+        "captcha": {"count": 4, "sum": 3.65, "buckets": {"0.1": 2, "1": 1}}}
+
+
+def test_label_values_are_escaped(registry):
+    registry.counter("retries_total", "Retries by error", ("error",)).inc(error='say "no"\\\n')
+    assert registry.prometheus().splitlines()[-1] == 'retries_total{error="say \\"no\\"\\\\\\n"} 1'
+
+
+def test_registering_a_name_again_returns_the_same_metric(registry):
+    assert registry.counter("bytes_total", "Bytes") is registry.counter("bytes_total", "Bytes")
+
+
+def test_server_exposes_text_and_json(registry, server):
+    registry.counter("bytes_total", "Bytes written").inc(1024)
+    registry.histogram("throughput", "Throughput", buckets=(100,)).observe(50)
+
+    content_type, text = get(server.url)
+    assert content_type == "text/plain; version=0.0.4; charset=utf-8"
+    assert text.endswith("\n")
+    assert "bytes_total 1024\n" in text and 'throughput_bucket{le="+Inf"} 1\n' in text
+
+    content_type, body = get(server.url + ".json")
+    assert content_type == "application/json"
+    assert json.loads(body) == {"bytes_total": {"": 1024},
+                                "throughput": {"": {"count": 1, "sum": 50, "buckets": {"100": 1}}}}
+
+    with pytest.raises(urllib.error.HTTPError) as error:
+        get(server.url.replace("/metrics", "/other"))
+    assert error.value.code == 404
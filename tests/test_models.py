@@ -0,0 +1,32 @@
+from models import DownloadTableModel
+
+
+def make_model(rows):
+    model = DownloadTableModel()
+    model.add_jobs([{"anime": "Show", "episode": n} for n in range(1, rows + 1)])
+    emitted = []
+    model.dataChanged.connect(
+        lambda top, bottom, roles: emitted.append((top.row(), top.column(), bottom.row(), bottom.column())))
+    return model, emitted
+
+
+def test_apply_progress_merges_neighbouring_rows_into_one_signal_per_run():
+    model, emitted = make_model(10)
+    last_column = len(DownloadTableModel.COLUMNS) - 1
+
+    model.apply_progress({row: {"state": "Downloading", "downloaded": row} for row in (7, 0, 1, 2, 5, 8)})
+
+    assert emitted == [(0, 0, 2, last_column), (5, 0, 5, last_column), (7, 0, 8, last_column)]
+    assert [row["downloaded"] for row in model.rows] == [0, 1, 2, 0, 0, 5, 0, 7, 8, 0]
+    assert model.rows[3]["state"] == "Queued"
+
+
+def test_apply_progress_ignores_rows_the_model_does_not_have():
+    model, emitted = make_model(3)
+
+    model.apply_progress({5: {"state": "Done"}, -1: {"state": "Done"}})
+    assert emitted == []
+
+    model.apply_progress({2: {"state": "Done"}, 3: {"state": "Done"}})
+    assert emitted == [(2, 0, 2, len(DownloadTableModel.COLUMNS) - 1)]
+    assert model.rows[2]["state"] == "Done"
@@ -0,0 +1,42 @@
+import pytest
+
+from planner import Option, fill_sizes, plan_qualities
+
+MB = 1024 * 1024
+
+
+def test_missing_sizes_are_scaled_from_another_quality_of_the_episode():
+    episode, = fill_sizes([{360: None, 720: None, 1080: 1000 * MB}])
+    assert [(option.quality, option.estimated) for option in episode] == [(360, True), (720, True), (1080, False)]
+    assert episode[0].size == round(1000 * MB * 0.162)
+    assert episode[1].size == round(1000 * MB * 0.526)
+
+
+def test_episode_without_sizes_borrows_the_batch_median():
+    options = fill_sizes([{720: 100}, {720: 300}, {720: 200}, {720: None}])
+    assert options[3] == [Option(720, 200, True)]
+
+
+def test_quality_that_cannot_be_estimated_is_left_out():
+    assert fill_sizes([{0: None, 720: None}]) == [[]]
+    assert fill_sizes([{0: None, 720: 500}]) == [[Option(720, 500, False)]]
+
+
+def batch(count):
+    return [[Option(480, 250, False), Option(720, 500, False), Option(1080, 1000, False)] for _ in range(count)]
+
+
+def test_budget_is_spread_evenly_across_the_batch():
+    assert [option.quality for option in plan_qualities(batch(3), 1999)] == [720, 720, 720]
+    assert [option.quality for option in plan_qualities(batch(3), 2000)] == [1080, 720, 720]
+
+
+@pytest.mark.parametrize("budget, expected", [(10 ** 9, [1080, 1080]), (500, [480, 480]), (100, [480, 480])])
+def test_plan_never_goes_below_the_lowest_quality(budget, expected):
+    assert [option.quality for option in plan_qualities(batch(2), budget)] == expected
+
+
+def test_episode_without_options_is_skipped():
+    chosen = plan_qualities([[], *batch(1)], 1000)
+    assert chosen[0] is None
+    assert chosen[1].quality == 1080
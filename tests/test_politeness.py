@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from core.politeness import BandwidthLimiter, HostPolicy, HostScheduler, parse_retry_after
+from core.scheduler import async_probe_size, probe_size, probe_sizes
+
+
+class Server:
+    """Answers every request after `delay` seconds and records how many were in flight at once."""
+
+    def __init__(self, delay=0.1, size=1234):
+        self.delay = delay
+        self.size = size
+        self.throttle = []  # Retry-After values of the next 429 responses
+        self.active = self.peak = self.requests = 0
+        self.lock = threading.Lock()
+
+    def respond(self, request):
+        with self.lock:
+            self.requests += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            retry_after = self.throttle.pop(0) if self.throttle else None
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        if retry_after is not None:
+            return 429, "", {"Retry-After": retry_after}
+        return 200, b"x" * self.size, {}
+
+
+@pytest.fixture
+def server(serve):
+    server = Server()
+    server.url = serve(respond=server.respond).url
+    return server
+
+
+def scheduler(cdn=2, scrape=4):
+    return HostScheduler({"scrape": HostPolicy(scrape), "cdn": HostPolicy(cdn)}, session=requests.Session())
+
+
+def test_requests_of_one_kind_share_the_host_cap(server):
+    polite = scheduler(cdn=2)
+
+    def get(number):
+        with polite.open("GET", f"{server.url}/video/{number}", "cdn") as response:
+            return len(response.content)
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        assert list(pool.map(get, range(6))) == [server.size] * 6
+    assert server.peak == 2
+
+
+def test_throttled_response_is_retried_after_its_cooldown(server):
+    server.throttle = ["0.3"]
+    polite = scheduler()
+
+    started = time.monotonic()
+    assert polite.get_text(f"{server.url}/page") == "x" * server.size
+    assert time.monotonic() - started >= 0.3
+    assert server.requests == 2
+
+
+def test_retry_after_accepts_seconds_and_dates():
+    assert parse_retry_after("7") == 7
+    assert parse_retry_after("-3") == 0
+    assert 0 < parse_retry_after(time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 30))) <= 30
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_size_probes_take_cdn_slots(server):
+    polite = scheduler(cdn=2)
+    urls = [f"{server.url}/video/{number}" for number in range(6)]
+
+    assert probe_sizes(urls, max_workers=6, scheduler=polite) == {url: server.size for url in urls}
+    assert server.peak == 2
+
+
+def test_size_probe_waits_for_a_running_download(server):
+    polite = scheduler(cdn=1)
+    url = f"{server.url}/video/1"
+
+    with polite.slot("cdn", url):
+        probe = ThreadPoolExecutor(max_workers=1).submit(probe_size, url, polite)
+        time.sleep(0.3)
+        assert not probe.done()
+    assert probe.result(timeout=5) == server.size
+
+
+def test_async_size_probes_take_cdn_slots(server):
+    import aiohttp
+
+    polite = scheduler(cdn=2)
+
+    async def probe_all():
+        async with aiohttp.ClientSession() as session:
+            return await asyncio.gather(*(async_probe_size(session, f"{server.url}/video/{number}", polite)
+                                          for number in range(6)))
+
+    assert asyncio.run(probe_all()) == [server.size] * 6
+    assert server.peak == 2
+
+
+def test_bandwidth_limiter_spreads_bytes_over_time():
+    limiter = BandwidthLimiter(1000)
+    assert limiter.reserve(500) == pytest.approx(0.5, abs=0.05)
+    assert limiter.reserve(500) == pytest.approx(1.0, abs=0.05)
+    limiter.set_rate(None)
+    assert limiter.reserve(10 ** 9) == 0
@@ -0,0 +1,50 @@
+import io
+from urllib.parse import urlsplit
+
+import pytest
+from PIL import Image
+
+from core.politeness import HostPolicy, HostScheduler
+from prefetch import PreviewPrefetcher, ThumbnailCache
+
+
+def poster(size=(600, 840)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 40, 40)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def images(serve):
+    """The same poster under several paths; anything else answers 404."""
+    return serve(dict.fromkeys(("/a.png", "/b.png", "/one.png"), poster()))
+
+
+def test_posters_are_downscaled_once_and_shared(images, tmp_path):
+    base_url = images.url
+    cache = ThumbnailCache(str(tmp_path))
+    polite = HostScheduler({"scrape": HostPolicy(2), "cdn": HostPolicy(2)})
+
+    first = cache.fetch(f"{base_url}/a.png", polite)
+    second = cache.fetch(f"{base_url}/b.png", polite)
+    assert first == second  # the same image under two URLs is stored once
+    assert Image.open(first).size[0] <= 300
+    assert cache.fetch(f"{base_url}/a.png", polite) == first
+    assert images.paths() == ["/a.png", "/b.png"]
+    assert ("scrape", urlsplit(base_url).netloc) in polite.hosts
+    assert ThumbnailCache(str(tmp_path)).get(f"{base_url}/b.png") == first
+
+
+def test_prefetcher_fetches_posters_through_the_scheduler(images, tmp_path):
+    base_url = images.url
+    polite = HostScheduler({"scrape": HostPolicy(2), "cdn": HostPolicy(2)})
+
+    def fetch_preview(link):
+        return {"name": link, "image_link": f"{base_url}{link}.png"}
+
+    prefetcher = PreviewPrefetcher(fetch_preview, ThumbnailCache(str(tmp_path)), polite)
+    prefetcher.prefetch(["/one", "/missing"])
+
+    assert prefetcher.get("/one", timeout=10)["image_path"].startswith(str(tmp_path))
+    assert prefetcher.get("/missing", timeout=10)["image_path"] is None  # falls back to the remote poster
+    assert ("scrape", urlsplit(base_url).netloc) in polite.hosts
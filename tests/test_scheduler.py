@@ -0,0 +1,32 @@
+from core.scheduler import PriorityTaskQueue
+
+
+def episodes(queue):
+    return [item["episode"] for item in queue.snapshot()]
+
+
+def test_promote_moves_queued_episodes_to_the_front():
+    queue = PriorityTaskQueue()
+    for episode in ["1", "2", "3", "4"]:
+        queue.put({"episode": episode})
+    queue.put(None)
+
+    assert queue.promote(lambda item: item["episode"] in ("3", "4")) == 2
+    assert episodes(queue) == ["3", "4", "1", "2"]
+    assert [queue.get()["episode"] for _ in range(4)] == ["3", "4", "1", "2"]
+    assert queue.get() is None
+
+
+def test_sjf_runs_known_sizes_first_and_ignores_items_already_taken():
+    queue = PriorityTaskQueue("sjf")
+    items = [{"episode": str(number)} for number in range(1, 4)]
+    for item in items:
+        queue.put(item)
+    taken = queue.get()
+
+    assert not queue.queued(lambda item: item is taken)
+    assert queue.update(lambda item: item is taken, size=1) == 0
+    assert "size" not in taken
+    assert queue.set_size(lambda item: item is items[2], 10) == 1
+    assert queue.queued(lambda item: item is items[2])
+    assert episodes(queue) == ["3", "2"]
@@ -0,0 +1,83 @@
+import asyncio
+import os
+import re
+
+from aiohttp import web
+
+PIECE = 2 * 1024 * 1024
+
+
+class RangeServer:
+    """Serves one file with Range support; ranges starting at `fail_from` or later fail while it is set."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.fail_from = None
+        self.runner = None
+        self.url = None
+
+    async def episode(self, request: web.Request) -> web.Response:
+        match = re.match(r"bytes=(\d+)-(\d*)", request.headers.get("Range", ""))
+        if not match:
+            return web.Response(body=self.data)
+        start = int(match.group(1))
+        end = min(int(match.group(2) or len(self.data) - 1), len(self.data) - 1)
+        if self.fail_from is not None and start >= self.fail_from:
+            return web.Response(status=500)
+        return web.Response(status=206, body=self.data[start:end + 1],
+                            headers={"Content-Range": f"bytes {start}-{end}/{len(self.data)}"})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/episode.mp4", self.episode)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/episode.mp4"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+async def run_once(webui, server: RangeServer, folder: str):
+    manager = webui.DownloadManager(max_concurrent=1, sequential=True)
+    await manager.start()
+    try:
+        task = await manager.add_download(url=server.url, filename="Episode 1.mp4", folder=folder, episode=1,
+                                          episode_url="https://example.test/show-episode-1")
+        while task.state not in webui.FINISHED:
+            await asyncio.sleep(0.02)
+        return task
+    finally:
+        await manager.stop()
+
+
+def test_interrupted_sequential_download_is_downloaded_again(webui, tmp_path):
+    data = os.urandom(PIECE * 2 + 12345)
+    folder = str(tmp_path / "downloads")
+    skipped_before = webui.DOWNLOADS.snapshot().get("skipped", 0)
+
+    async def scenario():
+        server = RangeServer(data)
+        await server.start()
+        try:
+            server.fail_from = PIECE * 2
+            first = await run_once(webui, server, folder)
+            assert first.state == webui.DownloadState.ERROR
+            # The failed run leaves a pre-sized file with a hole at the end
+            assert os.path.getsize(first.file_path) == len(data)
+            assert webui.get_manifest(folder).check(first.identity)[0] == webui.PARTIAL
+
+            server.fail_from = None
+            return await run_once(webui, server, folder)
+        finally:
+            await server.stop()
+
+    second = asyncio.run(scenario())
+    assert second.state == webui.DownloadState.COMPLETED
+    assert webui.DOWNLOADS.snapshot().get("skipped", 0) == skipped_before
+    with open(second.file_path, "rb") as file:
+        assert file.read() == data
+    assert webui.get_manifest(folder).check(second.identity)[0] == webui.COMPLETE
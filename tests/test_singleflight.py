@@ -0,0 +1,107 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from singleflight import SingleFlight, link_or_copy
+
+
+def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    calls = []
+
+    def resolve(episode):
+        calls.append(episode)
+        time.sleep(0.2)
+        return f"https://cdn.test/{episode}.mp4"
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        results = list(pool.map(lambda _: flight.do("show-episode-1", resolve, 1), range(5)))
+
+    assert calls == [1]
+    assert {result for result, _ in results} == {"https://cdn.test/1.mp4"}
+    assert sorted(joined for _, joined in results) == [False, True, True, True, True]
+    assert not flight.in_flight("show-episode-1")
+
+
+def test_finished_calls_are_not_cached():
+    flight = SingleFlight()
+    assert flight.do("key", lambda: 1) == (1, False)
+    assert flight.do("key", lambda: 2) == (2, False)
+
+
+def test_waiting_callers_get_the_same_exception():
+    flight = SingleFlight()
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        time.sleep(0.2)
+        raise ValueError("captcha rejected")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, "key", fail)
+        started.wait()
+        follower = pool.submit(flight.do, "key", fail)
+        for future in (leader, follower):
+            with pytest.raises(ValueError, match="captcha rejected"):
+                future.result()
+
+
+def test_callers_on_different_event_loops_share_one_run():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(threading.current_thread().name)
+        await asyncio.sleep(0.2)
+        return b"page"
+
+    def session():  # every Streamlit session runs its own loop
+        return asyncio.run(flight.do_async("page", fetch))
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        results = list(pool.map(lambda _: session(), range(3)))
+
+    assert len(calls) == 1
+    assert sorted(results) == [(b"page", False), (b"page", True), (b"page", True)]
+
+
+def test_waiter_takes_over_when_the_running_caller_is_cancelled():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch(name):
+        calls.append(name)
+        await asyncio.sleep(0.2)
+        return name
+
+    async def run():
+        leader = asyncio.create_task(flight.do_async("page", fetch, "leader"))
+        await asyncio.sleep(0.05)
+        waiter = asyncio.create_task(flight.do_async("page", fetch, "waiter"))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(run()) == ("waiter", False)
+    assert calls == ["leader", "waiter"]
+
+
+def test_link_or_copy_replaces_the_destination(tmp_path):
+    source = tmp_path / "Show Episode 1.mp4"
+    source.write_bytes(b"episode")
+    destination = tmp_path / "other" / "Show Episode 1.mp4"
+    destination.parent.mkdir()
+    destination.write_bytes(b"stale")
+
+    link_or_copy(str(source), str(destination))
+
+    assert destination.read_bytes() == b"episode"
+    assert os.path.samefile(source, destination)  # same filesystem: a hard link, no extra space
+    assert sorted(path.name for path in destination.parent.iterdir()) == ["Show Episode 1.mp4"]
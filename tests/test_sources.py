@@ -0,0 +1,130 @@
+import pytest
+
+from core.sources import ParsePool, SlowSource, Source, ThroughputMonitor, parse_download_page, rank_sources
+
+SOURCES = [Source(360, "a"), Source(1080, "b"), Source(480, "c"), Source(720, "d"), Source(2160, "e")]
+
+DOWNLOAD_PAGE = """
+<span id="title">Show Episode 1</span>
+<div class="dowload"><a href="https://cdn.test/360.mp4" download="">Download\n (360P - mp4)</a></div>
+<div class="dowload"><a href="https://cdn.test/1080.mp4" download="">Download\n (1080P - mp4)</a></div>
+<div class="dowload"><a href="https://mirror.test/episode">Download Mirror</a></div>
+<div class="dowload"><a href="https://cdn.test/hd.mp4" download="">Download\n (HDP - mp4)</a></div>
+"""
+
+
+def qualities(sources):
+    return [source.quality for source in sources]
+
+
+def test_preferred_quality_comes_first_then_lower_then_higher():
+    assert qualities(rank_sources(SOURCES, 720)) == [720, 480, 360, 1080, 2160]
+    assert qualities(rank_sources(SOURCES, 600)) == [480, 360, 720, 1080, 2160]
+
+
+def test_sources_outside_the_quality_bounds_are_dropped():
+    assert qualities(rank_sources(SOURCES, 1080, min_quality=480, max_quality=1080)) == [1080, 720, 480]
+    assert rank_sources(SOURCES, 1080, min_quality=4320) == []
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr("core.sources.time.monotonic", clock)
+    return clock
+
+
+def test_slow_source_is_reported_only_after_a_full_window(clock):
+    monitor = ThroughputMonitor(min_speed=1000, window=10)
+    clock.now += 5
+    monitor.update(100)  # slow, but the window has not passed yet
+    clock.now += 5
+    with pytest.raises(SlowSource):
+        monitor.update(200)
+
+
+def test_speed_is_measured_over_the_last_window_only(clock):
+    monitor = ThroughputMonitor(min_speed=1000, window=10)
+    for _ in range(10):
+        clock.now += 1
+        monitor.update(int((clock.now - 1000) * 5000))  # 5000 B/s
+    for second in range(1, 8):
+        clock.now += 1
+        monitor.update(50_000 + second * 100)  # stalls, but the window still averages above the minimum
+    clock.now += 5
+    with pytest.raises(SlowSource):
+        monitor.update(50_800)
+
+
+def test_zero_min_speed_never_switches(clock):
+    monitor = ThroughputMonitor(min_speed=0, window=1)
+    clock.now += 60
+    monitor.update(0)
+
+
+@pytest.mark.parametrize("mode", ["off", "thread"])
+def test_download_page_is_parsed_in_page_order(mode):
+    pool = ParsePool(mode)
+    try:
+        sources, title = pool.run(parse_download_page, DOWNLOAD_PAGE)
+    finally:
+        pool.shutdown()
+    assert title == "Show Episode 1"
+    assert [(source.quality, source.url) for source in sources] == [
+        (360, "https://cdn.test/360.mp4"), (1080, "https://cdn.test/1080.mp4"), (0, "https://cdn.test/hd.mp4")]
+
+
+def test_unknown_parse_mode_is_rejected():
+    with pytest.raises(ValueError):
+        ParsePool("fiber")
+
+
+@pytest.fixture
+def cdn(serve):
+    """One file per quality; paths added to `failing` answer 500."""
+    return serve({"/1080.mp4": b"1" * 4000, "/720.mp4": b"7" * 2000})
+
+
+def test_failing_source_is_abandoned_for_the_next_quality(cli, cdn, tmp_path):
+    cdn.failing.add("/1080.mp4")
+    file_path = tmp_path / "Show Episode 1.mp4"
+    file_path.write_bytes(b"1" * 1000)  # a partial file of the failing quality
+    item = {"episode": 1, "url": "https://example.test/show-episode-1", "quality": 1080}
+    written, tried = [], []
+
+    sources = [Source(1080, f"{cdn.url}/1080.mp4"), Source(720, f"{cdn.url}/720.mp4")]
+    source = cli.download_sources(item, sources, file_path, on_chunk=written.append, on_source=tried.append)
+
+    assert source.quality == item["quality"] == 720
+    assert qualities(tried) == [1080, 720]
+    assert cdn.paths().count("/1080.mp4") == cli.source_error_limit
+    assert file_path.read_bytes() == b"7" * 2000
+    assert sum(written) == 2000 - 1000  # the discarded partial bytes are taken back
+
+
+def test_error_names_every_source_tried(cli, cdn, tmp_path):
+    cdn.failing.update({"/1080.mp4", "/720.mp4"})
+    file_path = tmp_path / "Show Episode 1.mp4"
+    file_path.write_bytes(b"")
+    item = {"episode": 1, "url": "https://example.test/show-episode-1", "quality": 1080}
+
+    with pytest.raises(Exception, match=r"No usable source: 1080p: .*; 720p: "):
+        cli.download_sources(item, [Source(1080, f"{cdn.url}/1080.mp4"), Source(720, f"{cdn.url}/720.mp4")],
+                             file_path)
+
+
+def test_quality_bounds_accept_the_labels_setup_json_allows(configure_cli, mock_site):
+    cli = configure_cli(gogoanime_main=mock_site.base_url, min_quality="480p", max_quality="720p")
+
+    sources, title = cli.resolve_sources(f"{mock_site.base_url}/bench-anime-1-episode-1")
+
+    assert qualities(sources) == [720, 480]
+    assert title == "Bench Anime 1 Episode 1"
@@ -0,0 +1,108 @@
+import struct
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from streaming import RangeMap, StreamServer, find_moov_offset, parse_content_range
+
+
+def box(kind: bytes, size: int) -> bytes:
+    """The header of an MP4 box; the payload is not needed to walk the boxes."""
+    return struct.pack(">I4s", size, kind)
+
+
+def test_range_map_merges_touching_and_overlapping_ranges():
+    ranges = RangeMap()
+    ranges.add(10, 20)
+    ranges.add(30, 40)
+    assert ranges.ranges == [[10, 20], [30, 40]]
+    ranges.add(20, 30)
+    assert ranges.ranges == [[10, 40]]
+    ranges.add(0, 5)
+    ranges.add(3, 12)
+    assert ranges.ranges == [[0, 40]]
+    assert ranges.covered() == 40
+    assert ranges.contiguous_prefix() == 40
+    assert ranges.has(5, 40) and not ranges.has(5, 41)
+
+
+def test_contiguous_prefix_needs_the_first_byte():
+    ranges = RangeMap()
+    ranges.add(5, 10)
+    assert ranges.contiguous_prefix() == 0
+    ranges.reset()
+    assert (ranges.ranges, ranges.total) == ([], None)
+
+
+def test_wait_for_returns_once_the_range_arrives_or_fails():
+    ranges = RangeMap()
+    threading.Timer(0.1, ranges.add, (0, 100)).start()
+    assert ranges.wait_for(0, 50, timeout=5)
+    assert not ranges.wait_for(100, 200, timeout=0.05)
+
+    threading.Timer(0.1, ranges.fail, ("link expired",)).start()
+    started = time.monotonic()
+    assert not ranges.wait_for(100, 200, timeout=5)
+    assert time.monotonic() - started < 4
+    assert ranges.failed == "link expired"
+
+
+def test_moov_after_mdat_is_found():
+    head = box(b"ftyp", 24) + bytes(16) + box(b"mdat", 1000)
+    assert find_moov_offset(head, 1024 + 500) == 1024
+
+
+def test_moov_before_mdat_needs_nothing_extra():
+    head = box(b"ftyp", 24) + bytes(16) + box(b"moov", 300)
+    assert find_moov_offset(head, 10 ** 6) is None
+
+
+def test_large_mdat_size_and_mdat_to_end_of_file():
+    large = box(b"ftyp", 16) + bytes(8) + struct.pack(">I4sQ", 1, b"mdat", 5000)
+    assert find_moov_offset(large, 6000) == 5016
+    to_end = box(b"ftyp", 16) + bytes(8) + box(b"mdat", 0)
+    assert find_moov_offset(to_end, 6000) is None
+
+
+def test_content_range_total():
+    assert parse_content_range("bytes 0-1023/4096") == 4096
+    assert parse_content_range("bytes */4096") is None
+    assert parse_content_range(None) is None
+
+
+@pytest.fixture
+def server():
+    server = StreamServer(wait_timeout=5)
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
+
+
+def test_stream_server_serves_ranges_as_they_arrive(server, tmp_path):
+    data = bytes(range(256)) * 64
+    path = tmp_path / "episode.mp4"
+    path.write_bytes(bytes(len(data)))
+    ranges = RangeMap()
+    ranges.set_total(len(data))
+    url = server.register(str(path), ranges)
+
+    def arrive():
+        with open(path, "r+b") as file:
+            file.seek(1000)
+            file.write(data[1000:3000])
+        ranges.add(1000, 3000)
+
+    threading.Timer(0.1, arrive).start()
+    request = urllib.request.Request(url, headers={"Range": "bytes=1000-2999"})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        assert response.status == 206
+        assert response.headers["Content-Range"] == f"bytes 1000-2999/{len(data)}"
+        assert response.read() == data[1000:3000]
+
+    server.unregister(str(path))
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(url, timeout=10)
+    assert error.value.code == 404
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from core.tracing import TRACER, Tracer
+
+
+@pytest.fixture
+def tracer():
+    tracer = Tracer()
+    tracer.enable()
+    return tracer
+
+
+def test_disabled_tracer_records_nothing(tmp_path):
+    tracer = Tracer()
+    with tracer.span("resolve") as stage:
+        stage.set(bytes=10)
+    tracer.instant("expired")
+    tracer.complete("queued", 0, 1)
+    tracer.save(str(tmp_path / "trace.json"))
+
+    assert tracer.events == []
+    assert not (tmp_path / "trace.json").exists()
+
+
+def test_span_records_a_complete_event_with_its_arguments(tracer):
+    with tracer.span("transfer", cat="network", episode=3) as transfer:
+        transfer.set(bytes=1024)
+    with pytest.raises(ValueError):
+        with tracer.span("resolve", episode=4):
+            raise ValueError
+
+    transfer, resolve = tracer.events
+    assert (transfer["name"], transfer["cat"], transfer["ph"]) == ("transfer", "network", "X")
+    assert transfer["args"] == {"episode": 3, "bytes": 1024}
+    assert transfer["dur"] >= 0 and resolve["ts"] >= transfer["ts"]
+    assert resolve["args"] == {"episode": 4, "error": "ValueError"}
+
+
+def test_complete_span_measured_elsewhere_keeps_its_times(tracer):
+    start = tracer.origin + 1.0
+    tracer.complete("queued", start, start + 0.25, episode=1)
+    event, = tracer.events
+    assert event["ts"] == pytest.approx(1e6)
+    assert event["dur"] == pytest.approx(0.25e6)
+
+
+def test_each_thread_and_task_gets_its_own_named_lane(tracer):
+    def work():
+        tracer.instant("thread")
+
+    thread = threading.Thread(target=work, name="download-1")
+    thread.start()
+    thread.join()
+
+    async def download():
+        tracer.instant("task")
+
+    async def run():
+        await asyncio.create_task(download(), name="episode-2")
+
+    asyncio.run(run())
+
+    assert sorted(tracer.lanes.values()) == ["download-1", "episode-2"]
+    assert len({event["tid"] for event in tracer.events}) == 2
+
+
+def test_saved_trace_is_chrome_trace_json(tracer, tmp_path):
+    with tracer.span("resolve"):
+        pass
+    path = tmp_path / "trace.json"
+    tracer.save(str(path))
+
+    trace = json.loads(path.read_text())
+    assert trace["displayTimeUnit"] == "ms"
+    metadata, event = trace["traceEvents"]
+    assert (metadata["ph"], metadata["name"]) == ("M", "thread_name")
+    assert metadata["tid"] == event["tid"] and metadata["args"]["name"] == threading.current_thread().name
+    assert event["name"] == "resolve"
+
+    tracer.clear()
+    assert tracer.export()["traceEvents"] == []
+
+
+@pytest.fixture
+def global_tracer():
+    TRACER.enable()
+    yield TRACER
+    TRACER.disable()
+    TRACER.clear()
+
+
+def test_episode_transfer_is_traced_with_its_byte_count(cli, global_tracer, serve, tmp_path):
+    cdn = serve({"/1080.mp4": b"x" * 5000})
+
+    cli.fetch_to_file(f"{cdn.url}/1080.mp4", tmp_path / "episode.mp4")
+
+    transfer, = [event for event in global_tracer.events if event["name"] == "transfer"]
+    assert transfer["cat"] == "network"
+    assert (transfer["args"]["bytes"], transfer["args"]["status"], transfer["args"]["offset"]) == (5000, 200, 0)
+    assert "disk_write_ms" in transfer["args"]
+
+
+def test_trace_is_saved_when_the_cli_menu_is_left_with_ctrl_c(cli, configure_cli, global_tracer, monkeypatch,
+                                                              tmp_path):
+    trace_file = tmp_path / "trace.json"
+    configure_cli(trace_file=str(trace_file))
+    configure = cli.configure
+    monkeypatch.setattr(cli, "configure", lambda: configure(cli.setup.path))
+    monkeypatch.setattr(cli, "init", lambda **kwargs: None)
+
+    def interrupt(prompt):
+        global_tracer.instant("menu")
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr("builtins.input", interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        cli.main()
+
+    assert "menu" in [event["name"] for event in json.loads(trace_file.read_text())["traceEvents"]]